@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException
+
+from ux_feedback_crew.analytics import BUCKETS, get_analytics, get_indexer
+
+router = APIRouter()
+
+
+@router.get("/analytics")
+def analytics_report(
+    since: str = None,
+    until: str = None,
+    screen_type: str = None,
+    bucket: str = "week",
+    limit: int = 10
+):
+    """Most violated heuristics, score trend and recurring components across past evaluations"""
+    if bucket not in BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(BUCKETS)}")
+    # The background indexer keeps the tables current; reports only read them
+    report = get_analytics().report(since, until, screen_type, bucket, max(1, min(limit, 100)))
+    return {**report, "indexed_at": get_indexer().last_indexed_at}
@@ -1,22 +1,284 @@
-from fastapi import Path
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from typing import List
+from fastapi.responses import StreamingResponse
+from pathlib import Path
+import asyncio
+import json
+import os
 
+from app.jobs import QueueFullError, UploadClaimedError, crew_pool, job_queue
+from app.uploads import save_upload
+from ux_feedback_crew.analytics import get_indexer
+from ux_feedback_crew.coalesce import coalesce_key, coalescing_enabled, pipeline_config
+from ux_feedback_crew.store import get_store, record_evaluation, recording_run
+from ux_feedback_crew.telemetry import traced_kickoff
 
-@app.post("/evaluate-ui/")
-async def evaluate_ui(file: UploadFile = File(...)):
-    # 1. Save upload
-    filename = f"{uuid.uuid4()}.png"
-    upload_path = Path("uploads") / filename
+router = APIRouter()
 
-    with open(upload_path, "wb") as f:
-        f.write(await file.read())
-    # Run Phase 1 Crew
-    crew_instance = UxFeedbackCrew()
-    result = crew_instance.evaluation_crew().kickoff(inputs={'image_path': str(upload_path)})
+EVALUATION_STEPS = ["analyze_ui", "evaluate_heuristics", "generate_feedback"]
+PIPELINE_MODES = ("crew", "fast", "incremental")
 
-    # Save evaluation result (result.raw contains the feedback report)
-    output_path = Path("outputs") / f"{upload_path.stem}_evaluation.json"
-    with open(output_path, "w") as f:
-        json.dump({"report": result.raw}, f)
 
-    return {"evaluation_id": upload_path.stem, "evaluation": result.raw}
+def _save_report(report: str) -> dict:
+    # Save evaluation result (the feedback report) under the job's run
+    run = record_evaluation(report)
+    get_indexer().notify()
+    return {"evaluation_id": run.run_id, "image_hash": run.image_hash, "evaluation": report}
 
+
+def run_evaluation(update, upload_path: Path, mode: str = "crew", screen_key: str = None) -> dict:
+    """Run Phase 1 for an uploaded screenshot on a worker thread"""
+    if mode == "incremental":
+        from ux_feedback_crew.incremental import run_incremental
+
+        update(EVALUATION_STEPS[0], 0.0)
+        with recording_run(screenshot_path=str(upload_path), screen_key=screen_key):
+            result = run_incremental(str(upload_path), screen_key)
+            return {**_save_report(result.raw), **result.summary(), "changes": result.changes, "usage": result.usage}
+
+    if mode == "fast":
+        from ux_feedback_crew.pipeline import run_fast_pipeline
+
+        update(EVALUATION_STEPS[0], 0.0)
+        with recording_run(screenshot_path=str(upload_path), screen_key=screen_key):
+            result = run_fast_pipeline(str(upload_path))
+            return {**_save_report(result.raw), "timings": result.timings(), "usage": result.usage}
+
+    completed = []
+
+    def on_task_done(output):
+        completed.append(output)
+        next_step = EVALUATION_STEPS[len(completed)] if len(completed) < len(EVALUATION_STEPS) else None
+        update(next_step, len(completed) / len(EVALUATION_STEPS))
+
+    update(EVALUATION_STEPS[0], 0.0)
+    with crew_pool.checkout() as pooled, recording_run(screenshot_path=str(upload_path), screen_key=screen_key):
+        crew = pooled.evaluation_crew
+        crew.task_callback = on_task_done
+        result = traced_kickoff(crew, "evaluation", inputs={'screenshot_path': str(upload_path)})
+        return _save_report(result.raw)
+
+
+@router.post("/evaluate-ui/", status_code=202)
+async def evaluate_ui(file: UploadFile = File(...), mode: str = None, screen_key: str = None):
+    mode = mode or os.getenv("PIPELINE_MODE", "crew")
+    if mode not in PIPELINE_MODES:
+        raise HTTPException(status_code=422, detail=f"mode must be one of {PIPELINE_MODES}")
+
+    # 1. Stream the upload to disk, hashing it on the way
+    upload = await save_upload(file)
+
+    # 2. Queue Phase 1 Crew; the client polls /jobs/{job_id}. An identical
+    #    screenshot already in flight, or just evaluated, is shared instead
+    extra = {"content_hash": upload.content_hash}
+    try:
+        if coalescing_enabled():
+            key = coalesce_key(upload.content_hash, pipeline_config(mode, screen_key=screen_key))
+            job_id, coalesced = job_queue.submit_once(
+                "evaluation", key, run_evaluation, upload.path, mode, screen_key, extra=extra
+            )
+        else:
+            job_id, coalesced = job_queue.submit(
+                "evaluation", run_evaluation, upload.path, mode, screen_key, extra=extra
+            ), None
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    status = job_queue.get(job_id)["status"] if coalesced else "queued"
+    return {
+        "job_id": job_id,
+        "evaluation_id": job_id,
+        "status": status,
+        "content_hash": upload.content_hash,
+        "coalesced": coalesced,
+    }
+
+
+@router.post("/uploads/{job_id}/evaluate", status_code=202)
+async def evaluate_upload(job_id: str, mode: str = None, screen_key: str = None):
+    """
+    Evaluate a screenshot stored earlier by POST /upload.
+
+    The evaluation runs under the upload's job id, so it is also the
+    evaluation id. Each upload can be evaluated once.
+    """
+    mode = mode or os.getenv("PIPELINE_MODE", "crew")
+    if mode not in PIPELINE_MODES:
+        raise HTTPException(status_code=422, detail=f"mode must be one of {PIPELINE_MODES}")
+
+    upload = job_queue.get(job_id)
+    if upload is None or "path" not in upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if not Path(upload["path"]).exists():
+        raise HTTPException(status_code=410, detail="The uploaded screenshot is no longer stored")
+
+    try:
+        job_queue.submit("evaluation", run_evaluation, Path(upload["path"]), mode, screen_key, job_id=job_id)
+    except UploadClaimedError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return {
+        "job_id": job_id,
+        "evaluation_id": job_id,
+        "status": "queued",
+        "content_hash": upload["content_hash"],
+        "coalesced": None,
+    }
+
+
+def run_flow_evaluation(update, upload_paths: list) -> dict:
+    """Evaluate uploaded screenshots as one user flow on a worker thread"""
+    from ux_feedback_crew.flow import run_flow
+
+    stages = ["vision", "heuristics"]
+
+    def on_event(event, payload):
+        if event == "stage_start":
+            update(f"flow_{payload['stage']}", stages.index(payload["stage"]) / len(stages))
+
+    with recording_run(screenshot_path=str(upload_paths[0])):
+        result = run_flow([str(p) for p in upload_paths], on_event=on_event)
+        return {**_save_report(result.raw), "screens": len(upload_paths), "timings": result.timings, "usage": result.usage}
+
+
+def flow_max_screens() -> int:
+    """Most screens accepted by /evaluate-flow/"""
+    return int(os.getenv("FLOW_MAX_SCREENS", 12))
+
+
+@router.post("/evaluate-flow/", status_code=202)
+async def evaluate_flow(files: List[UploadFile] = File(...)):
+    """
+    Evaluate several screenshots, in upload order, as one user flow.
+
+    The result holds findings per screen and cross-screen violations.
+    """
+    max_screens = flow_max_screens()
+    if len(files) > max_screens:
+        raise HTTPException(status_code=422, detail=f"A flow can have at most {max_screens} screens")
+
+    uploads = [await save_upload(file) for file in files]
+    paths = [upload.path for upload in uploads]
+    extra = {"content_hashes": [upload.content_hash for upload in uploads]}
+    try:
+        if coalescing_enabled():
+            from ux_feedback_crew.flow import flow_batch_size
+
+            # The flow is identified by its screens in order
+            config = pipeline_config("flow", batch_size=flow_batch_size())
+            key = coalesce_key(",".join(extra["content_hashes"]), config)
+            job_id, coalesced = job_queue.submit_once("flow", key, run_flow_evaluation, paths, extra=extra)
+        else:
+            job_id, coalesced = job_queue.submit("flow", run_flow_evaluation, paths, extra=extra), None
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    status = job_queue.get(job_id)["status"] if coalesced else "queued"
+    return {"job_id": job_id, "evaluation_id": job_id, "status": status, "screens": len(uploads), "coalesced": coalesced}
+
+
+@router.get("/evaluations/{evaluation_id}")
+async def get_evaluation(evaluation_id: str):
+    """A stored evaluation with the output of each stage that produced it"""
+    store = get_store()
+    evaluation = store.get_evaluation(evaluation_id)
+    if evaluation is None:
+        raise HTTPException(status_code=404, detail="Evaluation not found")
+    return {**evaluation, "stages": store.stage_outputs(evaluation_id)}
+
+
+@router.get("/screens/{image_hash}/evaluation")
+async def latest_screen_evaluation(image_hash: str):
+    """The most recent evaluation of a screen, identified by its image hash"""
+    evaluation = get_store().latest_evaluation(image_hash)
+    if evaluation is None:
+        raise HTTPException(status_code=404, detail="No evaluation for this screen")
+    return evaluation
+
+
+def stream_poll_seconds() -> float:
+    """How long the event stream waits for an event before checking the job"""
+    return float(os.getenv("STREAM_POLL_SECONDS", 5))
+
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+
+def run_streaming_evaluation(update, upload_path: Path, emit) -> dict:
+    """Run the fast pipeline on a worker thread, forwarding its events to emit"""
+    from ux_feedback_crew.pipeline import run_fast_pipeline
+
+    stages = ["vision", "heuristics", "feedback"]
+
+    def on_event(event, payload):
+        if event == "stage_start":
+            update(payload["stage"], stages.index(payload["stage"]) / len(stages))
+        emit(event, payload)
+
+    try:
+        result = run_fast_pipeline(str(upload_path), on_event=on_event)
+        report = {**_save_report(result.raw), "timings": result.timings(), "usage": result.usage}
+    except Exception as e:
+        emit("error", {"detail": str(e)})
+        raise
+
+    emit("complete", report)
+    return report
+
+
+@router.post("/evaluate-ui/stream")
+async def evaluate_ui_stream(request: Request, file: UploadFile = File(...)):
+    """
+    Evaluate a screenshot and stream progress as server-sent events:
+    stage_start, token and stage_complete per stage, then complete or error.
+
+    The stream stops when the client disconnects; the job runs on and its
+    result is kept. If no event arrives for a while the stored job status is
+    checked, so a job that failed without emitting error still ends the stream.
+    """
+    upload = await save_upload(file)
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+
+    def emit(event, payload):
+        loop.call_soon_threadsafe(events.put_nowait, (event, payload))
+
+    try:
+        job_id = job_queue.submit(
+            "evaluation", run_streaming_evaluation, upload.path, emit,
+            extra={"content_hash": upload.content_hash}
+        )
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    async def stream():
+        yield _sse("queued", {"job_id": job_id, "evaluation_id": job_id, "content_hash": upload.content_hash})
+        poll = stream_poll_seconds()
+        while not await request.is_disconnected():
+            try:
+                event, payload = await asyncio.wait_for(events.get(), timeout=poll)
+            except asyncio.TimeoutError:
+                job = job_queue.get(job_id)
+                if job is not None and job["status"] in ("queued", "running"):
+                    # Comment line: keeps proxies from timing out the idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                if not events.empty():
+                    continue
+                if job is not None and job["status"] == "completed":
+                    event, payload = "complete", job["result"]
+                else:
+                    event, payload = "error", {"detail": (job or {}).get("error") or "Job was lost"}
+            yield _sse(event, payload)
+            if event in ("complete", "error"):
+                break
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
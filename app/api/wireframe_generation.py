@@ -1,13 +1,147 @@
-@app.post("/generate-wireframe/")
-async def generate_wireframe(evaluation_id: str):
-    evaluation_path = Path("outputs") / f"{evaluation_id}_evaluation.json"
-    
-    with open(evaluation_path) as f:
-        evaluation_data = json.load(f)
-
-    # Run Phase 2 Crew
-    crew_instance = UxFeedbackCrew()
-    # Pass the previous feedback report into the wireframe designer
-    result = crew_instance.wireframe_crew().kickoff(inputs={'feedback': evaluation_data['report']})
-
-    return {"wireframe_output": result.raw}
+from fastapi import APIRouter, HTTPException, Request, Response
+from collections import OrderedDict
+import gzip
+import hashlib
+import os
+import threading
+
+from app.jobs import QueueFullError, crew_pool, job_queue
+from ux_feedback_crew.store import get_store, recording_run
+from ux_feedback_crew.telemetry import traced_kickoff
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+router = APIRouter()
+
+WIREFRAME_MAX_AGE = int(os.getenv("WIREFRAME_CACHE_MAX_AGE", 300))
+
+# Compressed bodies by (etag, encoding), so repeat downloads skip recompression
+_compressed = OrderedDict()
+_compressed_lock = threading.Lock()
+_COMPRESSED_MAX_ENTRIES = 64
+
+
+def _wireframe_url(evaluation_id: str) -> str:
+    return f"/wireframes/{evaluation_id}"
+
+
+def _etag(html: str) -> str:
+    return '"' + hashlib.sha256(html.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def _choose_encoding(accept_encoding: str) -> str:
+    accepted = {part.split(";")[0].strip() for part in accept_encoding.lower().split(",")}
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return "identity"
+
+
+def _encode(html: str, etag: str, encoding: str) -> bytes:
+    body = html.encode("utf-8")
+    if encoding == "identity":
+        return body
+
+    key = (etag, encoding)
+    with _compressed_lock:
+        if key in _compressed:
+            _compressed.move_to_end(key)
+            return _compressed[key]
+
+    data = brotli.compress(body) if encoding == "br" else gzip.compress(body, compresslevel=6)
+    with _compressed_lock:
+        _compressed[key] = data
+        while len(_compressed) > _COMPRESSED_MAX_ENTRIES:
+            _compressed.popitem(last=False)
+    return data
+
+
+def run_wireframe(update, evaluation: dict) -> dict:
+    """Run the Phase 2 crew on a worker thread"""
+    update("create_wireframe", 0.0)
+    store = get_store()
+    # On a regenerate the previous wireframe is still stored; only a newer one counts
+    previous = store.latest_wireframe(evaluation["evaluation_id"])
+
+    # Pass the stored vision analysis and feedback report into the wireframe
+    # designer; the wireframe is stored against the evaluation, not the job
+    inputs = {
+        'vision_analysis': store.stage_outputs(evaluation["evaluation_id"]).get("vision", ""),
+        'feedback': evaluation['report'],
+    }
+    with crew_pool.checkout() as pooled, recording_run(evaluation["evaluation_id"]):
+        traced_kickoff(pooled.wireframe_crew, "wireframe", inputs=inputs)
+
+    wireframe = store.latest_wireframe(evaluation["evaluation_id"])
+    if wireframe is None or (previous is not None and wireframe["id"] <= previous["id"]):
+        raise RuntimeError("The wireframe designer finished without generating a wireframe")
+
+    return {
+        "evaluation_id": evaluation["evaluation_id"],
+        "wireframe_url": _wireframe_url(evaluation["evaluation_id"]),
+        "etag": _etag(wireframe["html"]),
+    }
+
+
+@router.post("/generate-wireframe/", status_code=202)
+async def generate_wireframe(evaluation_id: str, response: Response, regenerate: bool = False):
+    store = get_store()
+    evaluation = store.get_evaluation(evaluation_id)
+    if evaluation is None:
+        raise HTTPException(status_code=404, detail="Evaluation not found")
+
+    # Serve the stored wireframe instead of another preview-model run
+    existing = store.latest_wireframe(evaluation_id)
+    if existing is not None and not regenerate:
+        response.status_code = 200
+        return {
+            "job_id": None,
+            "status": "completed",
+            "evaluation_id": evaluation_id,
+            "wireframe_url": _wireframe_url(evaluation_id),
+            "etag": _etag(existing["html"]),
+        }
+
+    # Queue Phase 2 Crew; the client polls /jobs/{job_id}
+    try:
+        job_id = job_queue.submit("wireframe", run_wireframe, evaluation)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return {"job_id": job_id, "status": "queued", "evaluation_id": evaluation_id}
+
+
+@router.get("/wireframes/{evaluation_id}")
+async def get_wireframe(evaluation_id: str, request: Request, download: bool = False):
+    """
+    Serve the latest wireframe of an evaluation as HTML.
+
+    Responses carry an ETag and are gzip or brotli compressed when the client
+    accepts it; a matching If-None-Match gets 304 Not Modified.
+    """
+    wireframe = get_store().latest_wireframe(evaluation_id)
+    if wireframe is None:
+        raise HTTPException(status_code=404, detail="Wireframe not found")
+
+    etag = _etag(wireframe["html"])
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={WIREFRAME_MAX_AGE}, must-revalidate",
+        "Vary": "Accept-Encoding",
+    }
+    if download:
+        headers["Content-Disposition"] = f'attachment; filename="wireframe_{evaluation_id}.html"'
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}:
+        return Response(status_code=304, headers=headers)
+
+    encoding = _choose_encoding(request.headers.get("accept-encoding", ""))
+    body = _encode(wireframe["html"], etag, encoding)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="text/html; charset=utf-8", headers=headers)
@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from ux_feedback_crew.coalesce import JOINED, REUSED, coalesce_window, record_coalesced
+from ux_feedback_crew.crew_pool import CrewPool
+from ux_feedback_crew.store import WORKER_ID, ResultStore, get_store, recording_run, worker_alive
+from ux_feedback_crew.telemetry import metrics, span
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room for another job"""
+
+
+class UploadClaimedError(Exception):
+    """Raised when an upload job is unknown or has already been queued"""
+
+
+class JobQueue:
+    """
+    Persistent job records backed by a bounded worker pool.
+
+    Crew kickoffs are synchronous and spend most of their time waiting on
+    Gemini, so they run on worker threads while the event loop keeps
+    serving requests. Job records live in the result store, so their
+    status/progress/step/result survive restarts and are visible to every
+    API worker sharing the database.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, store: ResultStore = None):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.store = store or get_store()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="crew-worker")
+
+        failed = self.store.fail_orphaned_jobs(worker_alive, "Worker exited before the job finished")
+        if failed:
+            print(f"⚠ Marked {failed} orphaned jobs as failed")
+
+    def create(self, kind: str, status: str = "queued", job_id: str = None, **extra) -> str:
+        """Register a job record without scheduling any work"""
+        job_id = job_id or str(uuid.uuid4())
+        self.store.insert_job(job_id, kind, status, worker=WORKER_ID, **extra)
+        return job_id
+
+    def submit(self, kind: str, fn, *args, job_id: str = None, extra: dict = None, **kwargs) -> str:
+        """
+        Enqueue fn to run on a worker thread.
+
+        fn is called as fn(update, *args, **kwargs), where update(step, progress)
+        lets it report progress. Its return value becomes the job result.
+        Stage outputs saved while it runs are grouped under the job id.
+        extra fields, such as the upload's content hash, are kept on a new
+        job record. Passing the job_id of an uploaded screenshot's record
+        runs fn under that record instead, once.
+
+        Raises:
+            QueueFullError: If max_pending jobs are already waiting or running
+            UploadClaimedError: If job_id is not an upload waiting to be queued
+        """
+        with self._lock:
+            self._check_capacity()
+
+            if job_id is None:
+                job_id = str(uuid.uuid4())
+                self.store.insert_job(job_id, kind, "queued", worker=WORKER_ID, **(extra or {}))
+            elif not self.store.claim_uploaded_job(job_id, kind, worker=WORKER_ID):
+                raise UploadClaimedError(f"Upload {job_id} is unknown or already queued")
+
+        self._executor.submit(self._run, job_id, kind, fn, args, kwargs, time.perf_counter())
+        return job_id
+
+    def submit_once(self, kind: str, coalesce_key: str, fn, *args, extra: dict = None, **kwargs) -> tuple:
+        """
+        Like submit, unless an identical job is in flight or recently completed.
+
+        A queued or running job with the same coalesce key is shared, and so
+        is one that completed within COALESCE_WINDOW seconds. Its job id is
+        returned and no work is scheduled, so every caller polls the same job
+        and receives its result.
+
+        Returns:
+            (job_id, outcome) where outcome is None for a new job, "joined"
+            for a shared in-flight job and "reused" for a completed one
+
+        Raises:
+            QueueFullError: If a new job is needed and max_pending jobs are
+                already waiting or running
+        """
+        with self._lock:
+            existing = self.store.find_coalesced_job(coalesce_key, coalesce_window())
+            if existing is None:
+                self._check_capacity()
+                job_id = str(uuid.uuid4())
+                # Another API worker may have claimed the key since the lookup
+                existing = self.store.claim_job(
+                    job_id, kind, coalesce_key, coalesce_window(), worker=WORKER_ID, **(extra or {})
+                )
+
+        if existing is not None:
+            outcome = REUSED if existing["status"] == "completed" else JOINED
+            record_coalesced("api", outcome, existing["job_id"])
+            return existing["job_id"], outcome
+
+        self._executor.submit(self._run, job_id, kind, fn, args, kwargs, time.perf_counter())
+        return job_id, None
+
+    def _check_capacity(self) -> None:
+        pending = sum(self.store.count_jobs(("queued", "running")).values())
+        if pending >= self.max_pending:
+            raise QueueFullError(f"{pending} jobs already pending")
+
+    def _run(self, job_id: str, kind: str, fn, args, kwargs, submitted: float) -> None:
+        self.update(job_id, status="running")
+        queue_wait = time.perf_counter() - submitted
+        metrics.observe("ux_job_queue_wait_seconds", queue_wait, kind=kind)
+
+        def update(step: str, progress: float = None):
+            fields = {"step": step}
+            if progress is not None:
+                fields["progress"] = progress
+            self.update(job_id, **fields)
+
+        try:
+            with span(f"job.{kind}", job_id=job_id, queue_wait=round(queue_wait, 6)), recording_run(job_id):
+                result = fn(update, *args, **kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            self.update(job_id, status="failed", error=str(e))
+        else:
+            self.update(job_id, status="completed", progress=1.0, step=None, result=result)
+
+    def update(self, job_id: str, **fields) -> None:
+        self.store.update_job(job_id, **fields)
+
+    def get(self, job_id: str):
+        """Return the job record, or None if unknown"""
+        return self.store.get_job(job_id)
+
+    def counts(self) -> dict:
+        """Number of jobs in each status"""
+        return self.store.count_jobs()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+job_queue = JobQueue(
+    max_workers=int(os.getenv("EVAL_WORKERS", 2)),
+    max_pending=int(os.getenv("EVAL_MAX_PENDING", 100)),
+)
+
+# One crew per worker thread, so a job only waits for a crew if the pool is misconfigured
+crew_pool = CrewPool(size=job_queue.max_workers)
+
+metrics.describe("ux_job_queue_wait_seconds", "Time jobs spend queued before a worker picks them up")
+metrics.describe("ux_jobs", "Jobs currently known to the queue by status")
+metrics.register_collector(
+    lambda: [("ux_jobs", {"status": status}, count) for status, count in job_queue.counts().items()]
+)
+metrics.describe("ux_crew_pool", "Crews in the API's pool by state")
+metrics.register_collector(
+    lambda: [("ux_crew_pool", {"state": state}, count) for state, count in crew_pool.stats().items()]
+)
@@ -1,8 +1,22 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-import uuid
+from pathlib import Path
 import os
-from crew_pipeline import run_crew_pipeline
+import sys
+import threading
+
+# Make the ux_feedback_crew package importable when served from the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from app.jobs import crew_pool, job_queue
+from app.api.analytics import router as analytics_router
+from app.api.evaluation_results import flow_max_screens, router as evaluation_router
+from app.api.wireframe_generation import router as wireframe_router
+from app.uploads import UploadLimitMiddleware, save_upload
+from ux_feedback_crew.analytics import get_indexer
+from ux_feedback_crew.cache import get_vision_cache
+from ux_feedback_crew.telemetry import metrics
 
 app = FastAPI()
 
@@ -13,27 +27,71 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Refuse oversized uploads before the form parser spools them
+app.add_middleware(UploadLimitMiddleware, max_files={"/evaluate-flow/": flow_max_screens()})
 
-jobs = {}  # in-memory job store
+app.include_router(evaluation_router)
+app.include_router(wireframe_router)
+app.include_router(analytics_router)
+
+metrics.describe("ux_vision_cache", "Vision cache lookups and evictions since start")
+metrics.register_collector(lambda: [
+    ("ux_vision_cache", {"counter": name}, value)
+    for name, value in get_vision_cache().stats().items() if name != "hit_rate"
+])
 
-UPLOAD_DIR = "uploads"
-OUTPUT_DIR = "outputs"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 @app.post("/upload")
 async def upload_screenshot(file: UploadFile = File(...)):
-    job_id = str(uuid.uuid4())
-    path = f"{UPLOAD_DIR}/{job_id}_{file.filename}"
+    upload = await save_upload(file)
+    job_id = job_queue.create(
+        "upload", status="uploaded", path=str(upload.path),
+        content_hash=upload.content_hash, media_type=upload.media_type
+    )
+
+    return {"job_id": job_id, "content_hash": upload.content_hash, "duplicate": not upload.created}
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    job.pop("result")
+    return job
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return job["result"]
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Prometheus scrape endpoint for pipeline, Gemini and job queue metrics"""
+    return metrics.render()
+
+
+@app.on_event("startup")
+def prewarm_crews():
+    # Build the pooled crews in the background so the first requests skip it
+    if os.getenv("CREW_POOL_PREWARM", "true").lower() == "true":
+        threading.Thread(target=crew_pool.warm, name="crew-pool-warm", daemon=True).start()
+
 
-    with open(path, "wb") as f:
-        f.write(await file.read())
+@app.on_event("startup")
+def start_analytics_indexer():
+    get_indexer().start()
 
-    jobs[job_id] = {
-        "status": "uploaded",
-        "progress": 0.0,
-        "step": None,
-        "result": None,
-    }
 
-    return {"job_id": job_id}
+@app.on_event("shutdown")
+def shutdown_workers():
+    job_queue.shutdown()
+    get_indexer().stop()
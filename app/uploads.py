@@ -0,0 +1,199 @@
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import HTTPException, UploadFile
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+from ux_feedback_crew.telemetry import metrics
+
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "uploads"))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", 1024 * 1024))
+# Allowance per upload for multipart boundaries, part headers and form fields
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+
+metrics.describe("ux_upload_bytes_total", "Bytes received in screenshot uploads")
+metrics.describe("ux_uploads_total", "Screenshot uploads by outcome (stored, duplicate, rejected)")
+
+# Leading bytes of the accepted screenshot formats: (signature, offset, media type, extension)
+SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", 0, "image/png", ".png"),
+    (b"\xff\xd8\xff", 0, "image/jpeg", ".jpg"),
+    (b"WEBP", 8, "image/webp", ".webp"),
+    (b"GIF87a", 0, "image/gif", ".gif"),
+    (b"GIF89a", 0, "image/gif", ".gif"),
+]
+
+
+@dataclass
+class StoredUpload:
+    """
+    A screenshot written to the upload directory.
+
+    The file is shared by every request that uploads the same content, so it
+    is never removed on behalf of one of them, e.g. when its job cannot be
+    queued; a retry then reuses it.
+    """
+
+    path: Path
+    content_hash: str
+    size: int
+    media_type: str
+    # False if an identical file was already stored and has been reused
+    created: bool
+
+
+def sniff_media_type(head: bytes):
+    """
+    Identify a screenshot format from its first bytes.
+
+    Returns:
+        (media type, file extension), or None for unsupported content
+    """
+    for signature, offset, media_type, extension in SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            if media_type == "image/webp" and not head.startswith(b"RIFF"):
+                continue
+            return media_type, extension
+    return None
+
+
+def _reject(status_code: int, detail: str):
+    metrics.inc("ux_uploads_total", outcome="rejected")
+    raise HTTPException(status_code=status_code, detail=detail)
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class UploadLimitMiddleware:
+    """
+    Reject multipart request bodies over the upload limit before they are spooled.
+
+    Form parsing reads the whole body before an endpoint runs, so save_upload's
+    own check comes too late to spare the server an oversized request. A
+    declared Content-Length over the limit is answered with 413 without reading
+    the body; otherwise the body is counted as it arrives and the request is cut
+    off with 413 once it passes the limit.
+
+    Args:
+        app: The ASGI app to wrap
+        max_bytes: Per-upload limit; defaults to MAX_UPLOAD_BYTES
+        max_files: Uploads a request may carry, by path; other paths take one
+    """
+
+    def __init__(self, app, max_bytes: int = None, max_files: dict = None):
+        self.app = app
+        self.max_bytes = max_bytes or MAX_UPLOAD_BYTES
+        self.max_files = max_files or {}
+
+    def limit(self, path: str) -> int:
+        return self.max_files.get(path, 1) * (self.max_bytes + FORM_OVERHEAD_BYTES)
+
+    async def __call__(self, scope, receive, send):
+        headers = dict(scope.get("headers", [])) if scope["type"] == "http" else {}
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limit(scope["path"])
+        declared = headers.get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            await self._too_large(scope, receive, send)
+            return
+
+        received = 0
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    rejected = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            # Drop whatever the app makes of the interrupted body
+            if not rejected:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            pass
+        if rejected:
+            await self._too_large(scope, receive, send)
+
+    async def _too_large(self, scope, receive, send):
+        metrics.inc("ux_uploads_total", outcome="rejected")
+        response = JSONResponse(
+            {"detail": f"Upload exceeds the limit of {self.max_bytes} bytes"}, status_code=413
+        )
+        await response(scope, receive, send)
+
+
+async def save_upload(file: UploadFile, max_bytes: int = None) -> StoredUpload:
+    """
+    Stream an upload to disk in chunks, hashing it as it is written.
+
+    The format is sniffed from the content, not the file name or declared
+    content type. Files are stored under their SHA-256 content hash, so a
+    screenshot uploaded twice is kept once.
+
+    Args:
+        file: The uploaded file
+        max_bytes: Size limit; defaults to MAX_UPLOAD_BYTES
+
+    Returns:
+        StoredUpload with the final path and content hash
+
+    Raises:
+        HTTPException: 413 if the upload exceeds the limit, 415 if it is not
+            a supported image format
+    """
+    max_bytes = max_bytes or MAX_UPLOAD_BYTES
+    partial = UPLOAD_DIR / f".{uuid.uuid4()}.part"
+    digest = hashlib.sha256()
+    size = 0
+    sniffed = None
+
+    try:
+        with open(partial, "wb") as f:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                if sniffed is None:
+                    sniffed = sniff_media_type(chunk[:16])
+                    if sniffed is None:
+                        _reject(415, "Upload must be a PNG, JPEG, WebP or GIF image")
+                size += len(chunk)
+                if size > max_bytes:
+                    _reject(413, f"Upload exceeds the limit of {max_bytes} bytes")
+                digest.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+        if sniffed is None:
+            _reject(400, "Upload is empty")
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+
+    media_type, extension = sniffed
+    content_hash = digest.hexdigest()
+    path = UPLOAD_DIR / f"{content_hash}{extension}"
+    created = not path.exists()
+    if created:
+        os.replace(partial, path)
+    else:
+        partial.unlink(missing_ok=True)
+
+    metrics.inc("ux_upload_bytes_total", size)
+    metrics.inc("ux_uploads_total", outcome="stored" if created else "duplicate")
+    return StoredUpload(path=path, content_hash=content_hash, size=size, media_type=media_type, created=created)
@@ -0,0 +1,354 @@
+"""
+Local stand-in for the Gemini generateContent REST API.
+
+Serves both the google-genai SDK used by the tools and the LiteLLM client
+behind the CrewAI agents, with configurable latency, jitter and error rate.
+Responses are canned outputs shaped like data/outputs/*.json. Agent prompts
+are answered in CrewAI's Thought/Action/Final Answer format so crews run end
+to end without spending API quota.
+"""
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+DEFAULT_OUTPUTS_DIR = Path(__file__).resolve().parent.parent / "data" / "outputs"
+
+TOOL_STAGES = {
+    "analyze_ui_screenshot": "vision",
+    "evaluate_heuristics": "heuristics",
+    "generate_feedback": "feedback",
+    "create_wireframe": "wireframe",
+}
+
+
+@dataclass
+class FakeGeminiConfig:
+    """Behaviour of the fake server"""
+
+    latency: float = 0.5
+    jitter: float = 0.2
+    error_rate: float = 0.0
+    error_status: int = 503
+    # Share of tool responses that come back fenced or truncated
+    malformed_rate: float = 0.0
+    # Share of JSON replies from non-pro models that report low confidence
+    low_confidence_rate: float = 0.0
+    chunk_size: int = 200
+    outputs_dir: Path = DEFAULT_OUTPUTS_DIR
+
+
+# Used when data/outputs has no parsable example for a stage
+FALLBACK_OUTPUTS = {
+    "vision": {
+        "screen_type": "home",
+        "components": [
+            {"type": "label", "text": "Welcome", "position": "top", "color": "dark gray", "size": "large"},
+            {"type": "button", "text": "Continue", "position": "bottom", "color": "orange", "size": "medium"},
+        ],
+        "layout_structure": "Single column with a header and a primary action at the bottom",
+        "color_scheme": {"primary_colors": ["orange"], "background": "white", "text_colors": ["dark gray"]},
+        "typography": {"heading_sizes": "large", "body_text_size": "small"},
+        "spacing_and_density": {"overall_density": "comfortable", "element_spacing": "even"},
+        "accessibility_observations": ["Light gray body text may have low contrast"],
+        "notable_patterns": ["Bottom primary action"],
+    },
+    "heuristics": {"violations": [], "strengths": [], "overall_score": 7.5},
+    "feedback": {"feedback_items": [], "quick_wins": [], "summary": {"total_issues": 0, "high": 0, "medium": 0, "low": 0}},
+}
+
+
+def load_canned_outputs(outputs_dir: Path) -> dict:
+    """Pick the newest valid example of each stage output from outputs_dir"""
+
+    def latest_json(pattern, stage):
+        for path in sorted(Path(outputs_dir).glob(pattern), reverse=True):
+            text = path.read_text(encoding="utf-8")
+            try:
+                json.loads(text)
+                return text
+            except json.JSONDecodeError:
+                continue
+        return json.dumps(FALLBACK_OUTPUTS[stage], indent=2)
+
+    wireframes = sorted(Path(outputs_dir).glob("wireframe_*.html"))
+    wireframe = wireframes[-1].read_text(encoding="utf-8") if wireframes else "<html><body>Wireframe</body></html>"
+
+    return {
+        "vision": latest_json("vision_analysis_*.json", "vision"),
+        "heuristics": latest_json("heuristic_evaluation_*.json", "heuristics"),
+        "feedback": latest_json("feedback_*.json", "feedback"),
+        "wireframe": f"```html\n{wireframe}\n```",
+    }
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeGemini:
+    """Threaded HTTP server answering :generateContent and :streamGenerateContent"""
+
+    def __init__(self, config: FakeGeminiConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeGeminiConfig()
+        self.canned = load_canned_outputs(self.config.outputs_dir)
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeGemini":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def respond(self, system: str, conversation: str, tool_called: bool = False) -> str:
+        """
+        Choose the canned reply for a request.
+
+        Args:
+            system: Text of the system instruction
+            conversation: Text of all conversation turns
+            tool_called: Whether the conversation already holds a model turn,
+                i.e. the agent has used its tool and seen the observation
+        """
+        prompt = f"{system}\n{conversation}"
+
+        # CrewAI agent turn: call the agent's tool once, then give a final answer
+        tool_names = re.search(r"only one name of \[([^\]]+)\]", prompt)
+        if tool_names:
+            tool_name = tool_names.group(1).split(",")[0].strip()
+            stage = TOOL_STAGES.get(tool_name, "feedback")
+            if tool_called:
+                answer = self.canned[stage] if stage != "wireframe" else "Wireframe generated."
+                return f"Thought: I now know the final answer\nFinal Answer: {answer}"
+            return (
+                f"Thought: I should use the {tool_name} tool\n"
+                f"Action: {tool_name}\n"
+                f"Action Input: {json.dumps(self._tool_args(tool_name, prompt))}"
+            )
+
+        # Direct tool calls made through the google-genai SDK
+        if "Analyze this mobile UI screenshot" in prompt:
+            return self._maybe_malformed(self.canned["vision"])
+        if "screens of a mobile app user flow" in prompt:
+            return self._maybe_malformed(self._flow_analysis_reply(prompt))
+        if "Evaluate this mobile user flow" in prompt:
+            return self._maybe_malformed(self._flow_evaluation_reply(prompt))
+        if "changed regions of a mobile UI screenshot" in prompt:
+            return self._maybe_malformed(self._region_reply())
+        if "Evaluate this mobile UI against" in prompt:
+            return self._maybe_malformed(self.canned["heuristics"])
+        if "Transform these UX violations" in prompt:
+            return self._maybe_malformed(self.canned["feedback"])
+        if "wireframe" in prompt.lower():
+            return self.canned["wireframe"]
+        return "Thought: I now can give a great answer\nFinal Answer: Done."
+
+    def with_confidence(self, model: str, text: str) -> str:
+        """Stamp a confidence on JSON replies so the model cascade can be exercised"""
+        if not self.config.low_confidence_rate:
+            return text
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            return text
+        if not isinstance(data, dict):
+            return text
+        low = "pro" not in model and random.random() < self.config.low_confidence_rate
+        data["confidence"] = 0.3 if low else 0.9
+        return json.dumps(data, indent=2)
+
+    def _flow_analysis_reply(self, prompt: str) -> str:
+        # One canned vision analysis per "Screen N of M:" marker in the request
+        indexes = [int(i) for i in re.findall(r"Screen (\d+) of \d+:", prompt)]
+        vision = json.loads(self.canned["vision"])
+        screens = [{**vision, "screen_index": i} for i in indexes]
+        return json.dumps({"screens": screens, "navigation_patterns": ["Bottom primary action on every step"]}, indent=2)
+
+    def _flow_evaluation_reply(self, prompt: str) -> str:
+        count = int(re.search(r"user flow of (\d+) screens", prompt).group(1))
+        heuristics = json.loads(self.canned["heuristics"])
+        return json.dumps({
+            "screens": [{**heuristics, "screen_index": i} for i in range(1, count + 1)],
+            "cross_screen_violations": [{
+                "heuristic_id": 4,
+                "heuristic_name": "Consistency and standards",
+                "severity": "medium",
+                "issue": "The primary action moves between steps",
+                "screens": list(range(1, count + 1)),
+                "affected_components": ["Continue button"],
+                "improvement_suggestion": "Keep the primary action in the same place on every step",
+            }],
+            "overall_score": heuristics.get("overall_score"),
+        }, indent=2)
+
+    def _region_reply(self) -> str:
+        # The canned vision components, as if they all sat in the changed regions
+        vision = json.loads(self.canned["vision"])
+        return json.dumps({"components": vision.get("components", []), "accessibility_observations": []}, indent=2)
+
+    def _maybe_malformed(self, text: str) -> str:
+        # Fenced output can be repaired locally; truncated output needs a retry
+        if random.random() >= self.config.malformed_rate:
+            return text
+        if random.random() < 0.5:
+            return f"Here is the analysis:\n```json\n{text}\n```"
+        return text[:len(text) // 2]
+
+    def _tool_args(self, tool_name: str, prompt: str) -> dict:
+        if tool_name == "analyze_ui_screenshot":
+            match = re.search(r"screenshot at (\S+?)\.?\s", prompt)
+            return {"image_path": match.group(1) if match else "data/screenshots/test_image.png"}
+        if tool_name == "evaluate_heuristics":
+            return {"vision_analysis": self.canned["vision"]}
+        if tool_name == "generate_feedback":
+            return {"vision_analysis": self.canned["vision"], "heuristic_evaluation": self.canned["heuristics"]}
+        return {"vision_analysis": self.canned["vision"], "feedback_result": self.canned["feedback"]}
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                request = json.loads(body or b"{}")
+                match = re.search(r"/models/([^/:]+):(\w+)", self.path)
+                if not match:
+                    self._send_json(404, {"error": {"code": 404, "message": "Not found", "status": "NOT_FOUND"}})
+                    return
+                model, method = match.groups()
+
+                config = fake.config
+                time.sleep(max(0.0, config.latency + random.uniform(-config.jitter, config.jitter)))
+
+                with fake._lock:
+                    fake.requests += 1
+                    failed = random.random() < config.error_rate
+                    if failed:
+                        fake.errors += 1
+                if failed:
+                    self._send_json(config.error_status, {"error": {
+                        "code": config.error_status,
+                        "message": "Injected failure from fake Gemini",
+                        "status": "RESOURCE_EXHAUSTED" if config.error_status == 429 else "UNAVAILABLE",
+                    }})
+                    return
+
+                system, conversation = _flatten_prompt(request)
+                prompt = f"{system}\n{conversation}"
+                tool_called = any(c.get("role") == "model" for c in request.get("contents", []))
+                text = fake.with_confidence(model, fake.respond(system, conversation, tool_called))
+                usage = {
+                    "promptTokenCount": _estimate_tokens(prompt),
+                    "candidatesTokenCount": _estimate_tokens(text),
+                    "totalTokenCount": _estimate_tokens(prompt) + _estimate_tokens(text),
+                }
+
+                if method == "streamGenerateContent":
+                    self._send_stream(model, text, usage, config.chunk_size)
+                else:
+                    self._send_json(200, _response(model, text, usage))
+
+            def _send_json(self, status: int, payload: dict):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, model: str, text: str, usage: dict, chunk_size: int):
+                chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)] or [""]
+                events = []
+                for i, chunk in enumerate(chunks):
+                    payload = _response(model, chunk, usage if i == len(chunks) - 1 else None)
+                    events.append(f"data: {json.dumps(payload)}\r\n\r\n")
+                data = "".join(events).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+
+def _flatten_prompt(request: dict) -> tuple:
+    """Return the text of the system instruction and of the conversation"""
+
+    def text_of(contents):
+        return "\n".join(part["text"] for content in contents for part in content.get("parts", []) if "text" in part)
+
+    system = request.get("systemInstruction") or request.get("system_instruction") or {}
+    return text_of([system]), text_of(request.get("contents", []))
+
+
+def _response(model: str, text: str, usage: dict = None) -> dict:
+    payload = {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": text}]},
+            "finishReason": "STOP",
+            "index": 0,
+        }],
+        "modelVersion": model,
+    }
+    if usage:
+        payload["usageMetadata"] = usage
+    return payload
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a local fake Gemini API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--low-confidence-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = FakeGemini(
+        FakeGeminiConfig(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            malformed_rate=args.malformed_rate,
+            low_confidence_rate=args.low_confidence_rate
+        ),
+        port=args.port
+    )
+    print(f"Fake Gemini listening on {server.base_url} (set GEMINI_BASE_URL to this)")
+    server.start()
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
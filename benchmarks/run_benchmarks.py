@@ -0,0 +1,262 @@
+"""
+Offline benchmark harness for the UX feedback pipeline.
+
+Runs the fast pipeline, both crews and the FastAPI endpoints against the
+local fake Gemini (benchmarks/fake_gemini.py) under concurrent load, and
+reports p50/p95/p99 latency, throughput, CPU time and peak RSS per scenario.
+
+    python benchmarks/run_benchmarks.py --scenarios fast,evaluation_crew,api \\
+        --iterations 20 --concurrency 4 --latency 0.3 --output bench.json
+
+Request coalescing is turned off so every API iteration does its full work.
+The api_coalesced scenario turns it back on, posting the same screenshot to
+show how many pipeline runs the duplicates share.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "src"))
+
+from benchmarks.fake_gemini import FakeGemini, FakeGeminiConfig  # noqa: E402
+
+DEFAULT_SCREENSHOT = REPO_ROOT / "data" / "screenshots" / "test_image.png"
+SCENARIOS = ("fast", "evaluation_crew", "wireframe_crew", "api", "api_coalesced")
+
+
+def percentile(values: list, pct: float) -> float:
+    """Linear-interpolated percentile of values"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(name: str, latencies: list, errors: int, wall: float, cpu: float, fake: FakeGemini, requests_before: int) -> dict:
+    completed = len(latencies)
+    return {
+        "scenario": name,
+        "completed": completed,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_per_s": round(completed / wall, 3) if wall else 0.0,
+        "p50_s": round(percentile(latencies, 50), 3),
+        "p95_s": round(percentile(latencies, 95), 3),
+        "p99_s": round(percentile(latencies, 99), 3),
+        "cpu_s": round(cpu, 3),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "gemini_requests": fake.requests - requests_before,
+    }
+
+
+def run_threaded(name: str, fn, iterations: int, concurrency: int, fake: FakeGemini) -> dict:
+    """Call fn() iterations times on a thread pool and summarize the latencies"""
+
+    def timed(_):
+        started = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            print(f"⚠ {name} iteration failed: {e}", file=sys.__stderr__)
+            return None
+        return time.perf_counter() - started
+
+    requests_before = fake.requests
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed, range(iterations)))
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+
+    latencies = [r for r in results if r is not None]
+    return summarize(name, latencies, iterations - len(latencies), wall, cpu, fake, requests_before)
+
+
+async def _run_api(iterations: int, concurrency: int, screenshot: Path, mode: str, poll_interval: float):
+    import httpx
+    from app.main import app
+
+    image = screenshot.read_bytes()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(client):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post(
+                "/evaluate-ui/",
+                params={"mode": mode},
+                files={"file": (screenshot.name, image)}
+            )
+            if response.status_code != 202:
+                return None, None
+            submitted = response.json()
+            job_id, coalesced = submitted["job_id"], submitted.get("coalesced")
+            while True:
+                status = (await client.get(f"/jobs/{job_id}")).json()["status"]
+                if status == "completed":
+                    return time.perf_counter() - started, coalesced
+                if status == "failed":
+                    return None, coalesced
+                await asyncio.sleep(poll_interval)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        return await asyncio.gather(*(one(client) for _ in range(iterations)))
+
+
+def run_api(
+    iterations: int,
+    concurrency: int,
+    screenshot: Path,
+    mode: str,
+    fake: FakeGemini,
+    coalesce: bool = False
+) -> dict:
+    """
+    Drive /evaluate-ui/ and /jobs/{id} concurrently and time submit-to-completed.
+
+    With coalesce, identical uploads share jobs as in production, and the
+    result counts how many submissions joined or reused another job.
+    """
+    os.environ["COALESCE_ENABLED"] = "true" if coalesce else "false"
+    requests_before = fake.requests
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    try:
+        results = asyncio.run(_run_api(iterations, concurrency, screenshot, mode, poll_interval=0.05))
+    finally:
+        os.environ["COALESCE_ENABLED"] = "false"
+    wall = time.perf_counter() - wall_started
+    cpu = time.process_time() - cpu_started
+
+    latencies = [latency for latency, _ in results if latency is not None]
+    name = f"api_{mode}_coalesced" if coalesce else f"api_{mode}"
+    result = summarize(name, latencies, iterations - len(latencies), wall, cpu, fake, requests_before)
+    if coalesce:
+        outcomes = [coalesced for _, coalesced in results]
+        result["coalesced"] = {outcome: outcomes.count(outcome) for outcome in ("joined", "reused")}
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against a local fake Gemini")
+    parser.add_argument("--scenarios", default="fast,evaluation_crew,wireframe_crew,api,api_coalesced",
+                        help=f"Comma-separated subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.3, help="Fake Gemini base latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="Share of tool responses the fake returns fenced or truncated")
+    parser.add_argument("--api-mode", choices=["crew", "fast"], default="fast")
+    parser.add_argument("--screenshot", type=Path, default=DEFAULT_SCREENSHOT)
+    parser.add_argument("--output", type=Path, help="Write the JSON report here as well")
+    parser.add_argument("--verbose", action="store_true", help="Show crew and tool output")
+    args = parser.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    config = FakeGeminiConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        malformed_rate=args.malformed_rate
+    )
+    screenshot = args.screenshot.resolve()
+    output = args.output.resolve() if args.output else None
+
+    with FakeGemini(config) as fake:
+        # Point every Gemini client at the fake and keep runs hermetic
+        os.environ.update({
+            "GEMINI_BASE_URL": fake.base_url,
+            "GEMINI_API_KEY": "fake-key",
+            "VISION_CACHE_ENABLED": "false",
+            "EVAL_WORKERS": str(args.concurrency),
+            # Identical uploads would otherwise share one pipeline run
+            "COALESCE_ENABLED": "false",
+            "CREWAI_TESTING": "true",
+            "CREWAI_DISABLE_TELEMETRY": "true",
+            "OTEL_SDK_DISABLED": "true",
+        })
+        workdir = tempfile.mkdtemp(prefix="ux-bench-")
+        os.chdir(workdir)
+
+        from ux_feedback_crew.crew import UxFeedbackCrew
+        from ux_feedback_crew.pipeline import run_fast_pipeline
+
+        runners = {
+            "fast": lambda: run_threaded(
+                "fast", lambda: run_fast_pipeline(str(screenshot)), args.iterations, args.concurrency, fake
+            ),
+            "evaluation_crew": lambda: run_threaded(
+                "evaluation_crew",
+                lambda: UxFeedbackCrew().evaluation_crew().kickoff(inputs={'screenshot_path': str(screenshot)}),
+                args.iterations, args.concurrency, fake
+            ),
+            "wireframe_crew": lambda: run_threaded(
+                "wireframe_crew",
+                lambda: UxFeedbackCrew().wireframe_crew().kickoff(
+                    inputs={'vision_analysis': fake.canned["vision"], 'feedback': fake.canned["feedback"]}
+                ),
+                args.iterations, args.concurrency, fake
+            ),
+            "api": lambda: run_api(args.iterations, args.concurrency, screenshot, args.api_mode, fake),
+            "api_coalesced": lambda: run_api(
+                args.iterations, args.concurrency, screenshot, args.api_mode, fake, coalesce=True
+            ),
+        }
+
+        report = {"config": {
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "malformed_rate": args.malformed_rate,
+        }, "results": []}
+
+        for name in scenarios:
+            sink = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+            with sink:
+                result = runners[name]()
+            report["results"].append(result)
+            coalesced = result.get("coalesced")
+            print(
+                f"{result['scenario']:<20} p50 {result['p50_s']:>7.3f}s  p95 {result['p95_s']:>7.3f}s  "
+                f"p99 {result['p99_s']:>7.3f}s  {result['throughput_per_s']:>6.2f}/s  "
+                f"cpu {result['cpu_s']:>6.2f}s  rss {result['peak_rss_mb']:>7.1f}MB  "
+                f"gemini {result['gemini_requests']:>4}  errors {result['errors']}"
+                + (f"  joined {coalesced['joined']} reused {coalesced['reused']}" if coalesced else "")
+            )
+
+    if output:
+        output.write_text(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,514 @@
+#!/usr/bin/env python
+"""
+Aggregated analytics over past evaluations.
+
+The result store keeps each stage output as a JSON document. That suits
+fetching one evaluation, but a question like "which heuristics are violated
+most" would have to parse every document again. The indexer extracts the
+few fields such questions need into small indexed tables in a separate
+SQLite file:
+
+    analytics_runs        one row per run: screen type, score, feedback counts
+    analytics_violations  one row per violation: heuristic and severity
+    analytics_components  one row per component affected by a violation
+
+Indexing is incremental. Stage outputs are read from the result store after
+the last row already indexed. JSON files left in data/outputs by earlier
+versions are read again only when they change. A pass with nothing new only
+reads. Deleting the file rebuilds the tables from scratch on the next run.
+The API indexes from a background thread, woken when an evaluation is stored.
+
+Usage:
+    python -m ux_feedback_crew.analytics index
+    python -m ux_feedback_crew.analytics report --since 2026-01-01 --bucket week
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from .store import ResultStore, get_store
+from .telemetry import metrics
+
+load_dotenv()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analytics_runs (
+    run_id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    screen_type TEXT,
+    overall_score REAL,
+    violations INTEGER NOT NULL DEFAULT 0,
+    feedback_critical INTEGER NOT NULL DEFAULT 0,
+    feedback_high INTEGER NOT NULL DEFAULT 0,
+    feedback_medium INTEGER NOT NULL DEFAULT 0,
+    feedback_low INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS analytics_runs_created ON analytics_runs (created_at);
+CREATE INDEX IF NOT EXISTS analytics_runs_screen ON analytics_runs (screen_type, created_at);
+
+CREATE TABLE IF NOT EXISTS analytics_violations (
+    run_id TEXT NOT NULL,
+    heuristic_id INTEGER,
+    heuristic_name TEXT,
+    severity TEXT
+);
+CREATE INDEX IF NOT EXISTS analytics_violations_run ON analytics_violations (run_id);
+CREATE INDEX IF NOT EXISTS analytics_violations_heuristic ON analytics_violations (heuristic_id, severity);
+
+CREATE TABLE IF NOT EXISTS analytics_components (
+    run_id TEXT NOT NULL,
+    component TEXT NOT NULL,
+    severity TEXT
+);
+CREATE INDEX IF NOT EXISTS analytics_components_run ON analytics_components (run_id);
+CREATE INDEX IF NOT EXISTS analytics_components_severity ON analytics_components (severity, component);
+
+CREATE TABLE IF NOT EXISTS analytics_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS analytics_files (
+    path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL
+);
+"""
+
+STAGES = ("vision", "heuristics", "feedback")
+LEVELS = ("critical", "high", "medium", "low")
+
+# Stage output files written to data/outputs by earlier versions
+OUTPUT_FILE = re.compile(r"^(vision_analysis|heuristic_evaluation|feedback)_(\d{8}_\d{6})\.json$")
+FILE_STAGES = {"vision_analysis": "vision", "heuristic_evaluation": "heuristics", "feedback": "feedback"}
+
+# Strftime format of each trend bucket
+BUCKETS = {"day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m"}
+
+metrics.describe("ux_analytics_indexed_total", "Stage outputs and output files added to the analytics index")
+metrics.describe("ux_analytics_query_seconds", "Duration of analytics reports")
+
+
+def _text(value) -> str:
+    return " ".join(str(value or "").lower().split())
+
+
+class AnalyticsStore:
+    """
+    SQLite tables of per-run facts extracted from evaluation outputs.
+
+    Uses the same connection handling as ResultStore: WAL mode and one
+    connection per thread.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 30.0):
+        self.path = Path(path)
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    # Indexing
+
+    @staticmethod
+    def _ingest(conn: sqlite3.Connection, run_id: str, source: str, created_at: str, stage: str, document: dict):
+        # Later outputs of a stage replace earlier ones of the same run
+        conn.execute(
+            "INSERT OR IGNORE INTO analytics_runs (run_id, source, created_at) VALUES (?, ?, ?)",
+            (run_id, source, created_at)
+        )
+        if stage == "vision":
+            conn.execute(
+                "UPDATE analytics_runs SET screen_type = ? WHERE run_id = ?",
+                (_text(document.get("screen_type")) or None, run_id)
+            )
+        elif stage == "heuristics":
+            violations = [v for v in document.get("violations", []) if isinstance(v, dict)]
+            conn.execute("DELETE FROM analytics_violations WHERE run_id = ?", (run_id,))
+            conn.execute("DELETE FROM analytics_components WHERE run_id = ?", (run_id,))
+            conn.executemany(
+                "INSERT INTO analytics_violations (run_id, heuristic_id, heuristic_name, severity) VALUES (?, ?, ?, ?)",
+                [(run_id, v.get("heuristic_id"), v.get("heuristic_name"), _text(v.get("severity"))) for v in violations]
+            )
+            conn.executemany(
+                "INSERT INTO analytics_components (run_id, component, severity) VALUES (?, ?, ?)",
+                [
+                    (run_id, component, _text(v.get("severity")))
+                    for v in violations
+                    for component in dict.fromkeys(_text(c) for c in v.get("affected_components", []))
+                    if component
+                ]
+            )
+            score = document.get("overall_score")
+            conn.execute(
+                "UPDATE analytics_runs SET overall_score = ?, violations = ? WHERE run_id = ?",
+                (score if isinstance(score, (int, float)) else None, len(violations), run_id)
+            )
+        elif stage == "feedback":
+            priorities = [_text(item.get("priority")) for item in document.get("feedback_items", [])
+                          if isinstance(item, dict)]
+            conn.execute(
+                "UPDATE analytics_runs SET feedback_critical = ?, feedback_high = ?, feedback_medium = ?, "
+                "feedback_low = ? WHERE run_id = ?",
+                (*(priorities.count(level) for level in LEVELS), run_id)
+            )
+
+    def _cursor(self, conn: sqlite3.Connection) -> int:
+        row = conn.execute("SELECT value FROM analytics_state WHERE key = 'stage_outputs'").fetchone()
+        return int(row["value"]) if row else 0
+
+    def index_store(self, store: ResultStore, batch_size: int = 500) -> int:
+        """Index the stage outputs saved since the last call; returns how many"""
+        indexed = 0
+        while True:
+            # Check before taking the write lock, so an idle pass only reads
+            if not store.stage_outputs_after(self._cursor(self._connect()), STAGES, 1):
+                break
+            with self._transaction() as conn:
+                # Another indexer may have moved the cursor since the check
+                rows = store.stage_outputs_after(self._cursor(conn), STAGES, batch_size)
+                for output in rows:
+                    try:
+                        document = json.loads(output["content"])
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(document, dict):
+                        self._ingest(conn, output["run_id"], "store", output["created_at"], output["stage"], document)
+                if rows:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO analytics_state (key, value) VALUES ('stage_outputs', ?)",
+                        (str(rows[-1]["id"]),)
+                    )
+            indexed += len(rows)
+            if len(rows) < batch_size:
+                break
+        if indexed:
+            metrics.inc("ux_analytics_indexed_total", indexed, source="store")
+        return indexed
+
+    def index_files(self, outputs_dir: str) -> int:
+        """
+        Index stage output files from data/outputs that are new or changed.
+
+        A run's files share no id, so heuristic and feedback files are
+        attributed to the latest vision file written before them.
+        """
+        directory = Path(outputs_dir)
+        if not directory.is_dir():
+            return 0
+        files = sorted(
+            (match.group(2), match.group(1), path)
+            for path in directory.iterdir()
+            if (match := OUTPUT_FILE.match(path.name))
+        )
+
+        seen = {row["path"]: row["mtime"] for row in self._connect().execute("SELECT path, mtime FROM analytics_files")}
+        changed = []
+        run_stamp = None
+        for stamp, kind, path in files:
+            if kind == "vision_analysis" or run_stamp is None:
+                run_stamp = stamp
+            mtime = path.stat().st_mtime
+            if seen.get(str(path)) != mtime:
+                changed.append((run_stamp, kind, path, mtime))
+        if not changed:
+            return 0
+
+        indexed = 0
+        with self._transaction() as conn:
+            for run_stamp, kind, path, mtime in changed:
+                try:
+                    document = json.loads(path.read_text(encoding="utf-8"))
+                except (OSError, ValueError):
+                    document = None
+                if isinstance(document, dict):
+                    # File names carry local time; the result store uses UTC
+                    created_at = datetime.strptime(run_stamp, "%Y%m%d_%H%M%S").astimezone(timezone.utc).isoformat()
+                    self._ingest(conn, f"file:{run_stamp}", "files", created_at, FILE_STAGES[kind], document)
+                    indexed += 1
+                conn.execute("INSERT OR REPLACE INTO analytics_files (path, mtime) VALUES (?, ?)", (str(path), mtime))
+        if indexed:
+            metrics.inc("ux_analytics_indexed_total", indexed, source="files")
+        return indexed
+
+    # Queries
+
+    @staticmethod
+    def _where(since: str = None, until: str = None, screen_type: str = None) -> tuple:
+        clauses, params = [], []
+        if since:
+            clauses.append("r.created_at >= ?")
+            params.append(since)
+        if until:
+            clauses.append("r.created_at < ?")
+            params.append(until)
+        if screen_type:
+            clauses.append("r.screen_type = ?")
+            params.append(_text(screen_type))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def summary(self, since: str = None, until: str = None, screen_type: str = None) -> dict:
+        """Run count, date range, mean score and totals"""
+        where, params = self._where(since, until, screen_type)
+        row = self._connect().execute(
+            "SELECT COUNT(*) AS runs, MIN(created_at) AS first, MAX(created_at) AS last, "
+            "ROUND(AVG(overall_score), 2) AS mean_score, COALESCE(SUM(violations), 0) AS violations, "
+            "COALESCE(SUM(feedback_critical + feedback_high), 0) AS high_priority_items "
+            f"FROM analytics_runs r{where}",
+            params
+        ).fetchone()
+        screens = self._connect().execute(
+            f"SELECT screen_type, COUNT(*) AS runs FROM analytics_runs r{where} "
+            "GROUP BY screen_type ORDER BY runs DESC",
+            params
+        ).fetchall()
+        return {**dict(row), "screen_types": {s["screen_type"] or "unknown": s["runs"] for s in screens}}
+
+    def top_heuristics(self, since: str = None, until: str = None, screen_type: str = None, limit: int = 10) -> list:
+        """Heuristics by number of violations, with a severity breakdown"""
+        where, params = self._where(since, until, screen_type)
+        rows = self._connect().execute(
+            "SELECT v.heuristic_id, MAX(v.heuristic_name) AS heuristic_name, COUNT(*) AS violations, "
+            "COUNT(DISTINCT v.run_id) AS runs, "
+            + ", ".join(f"SUM(v.severity = '{level}') AS {level}" for level in LEVELS) +
+            f" FROM analytics_violations v JOIN analytics_runs r ON r.run_id = v.run_id{where} "
+            "GROUP BY v.heuristic_id ORDER BY violations DESC, v.heuristic_id LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def score_trend(self, bucket: str = "week", since: str = None, until: str = None, screen_type: str = None) -> list:
+        """Mean, lowest and highest overall_score per day, week or month"""
+        if bucket not in BUCKETS:
+            raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+        where, params = self._where(since, until, screen_type)
+        rows = self._connect().execute(
+            f"SELECT strftime('{BUCKETS[bucket]}', r.created_at) AS period, COUNT(*) AS runs, "
+            "ROUND(AVG(r.overall_score), 2) AS mean_score, ROUND(MIN(r.overall_score), 2) AS min_score, "
+            f"ROUND(MAX(r.overall_score), 2) AS max_score FROM analytics_runs r{where} "
+            "GROUP BY period ORDER BY period",
+            params
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def recurring_components(
+        self,
+        severities: tuple = ("critical", "high"),
+        since: str = None,
+        until: str = None,
+        screen_type: str = None,
+        limit: int = 10
+    ) -> list:
+        """Components named most often in violations of the given severities"""
+        where, params = self._where(since, until, screen_type)
+        severity_clause = f"c.severity IN ({', '.join('?' for _ in severities)})"
+        where = f"{where} AND {severity_clause}" if where else f" WHERE {severity_clause}"
+        rows = self._connect().execute(
+            "SELECT c.component, COUNT(*) AS occurrences, COUNT(DISTINCT c.run_id) AS runs "
+            f"FROM analytics_components c JOIN analytics_runs r ON r.run_id = c.run_id{where} "
+            "GROUP BY c.component ORDER BY occurrences DESC, c.component LIMIT ?",
+            (*params, *severities, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def report(
+        self,
+        since: str = None,
+        until: str = None,
+        screen_type: str = None,
+        bucket: str = "week",
+        limit: int = 10
+    ) -> dict:
+        """All of the above in one document"""
+        started = time.perf_counter()
+        filters = {"since": since, "until": until, "screen_type": screen_type}
+        report = {
+            "filters": filters,
+            "summary": self.summary(**filters),
+            "heuristics": self.top_heuristics(**filters, limit=limit),
+            "score_trend": self.score_trend(bucket, **filters),
+            "components": self.recurring_components(**filters, limit=limit),
+        }
+        duration = time.perf_counter() - started
+        metrics.observe("ux_analytics_query_seconds", duration)
+        report["query_ms"] = round(duration * 1000, 2)
+        return report
+
+
+_analytics = None
+_analytics_lock = threading.Lock()
+
+
+def get_analytics() -> AnalyticsStore:
+    """Return the process-wide analytics store, configured from the environment"""
+    global _analytics
+    with _analytics_lock:
+        if _analytics is None:
+            _analytics = AnalyticsStore(os.getenv("ANALYTICS_DB_PATH", "data/analytics.db"))
+        return _analytics
+
+
+def index(outputs_dir: Optional[str] = None) -> dict:
+    """
+    Bring the analytics tables up to date with the result store and output files.
+
+    Returns:
+        Number of stage outputs and files indexed by this call
+    """
+    analytics = get_analytics()
+    outputs_dir = outputs_dir or os.getenv("ANALYTICS_OUTPUTS_DIR", "data/outputs")
+    return {
+        "stage_outputs": analytics.index_store(get_store()),
+        "files": analytics.index_files(outputs_dir),
+    }
+
+
+class BackgroundIndexer:
+    """
+    Keeps the analytics tables current from a daemon thread.
+
+    The legacy output files are indexed once at start; they are no longer
+    written. The result store is then indexed every interval, or as soon as
+    notify() reports a newly stored evaluation, so reports never index on
+    the request path.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.last_indexed_at = None
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, outputs_dir: Optional[str] = None) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(outputs_dir,), name="analytics-indexer", daemon=True
+            )
+            self._thread.start()
+
+    def notify(self) -> None:
+        """Index soon: an evaluation has been stored"""
+        self._wake.set()
+
+    def stop(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stopped.set()
+        self._wake.set()
+        if thread is not None:
+            thread.join()
+
+    def _run(self, outputs_dir: Optional[str]) -> None:
+        analytics = get_analytics()
+        try:
+            analytics.index_files(outputs_dir or os.getenv("ANALYTICS_OUTPUTS_DIR", "data/outputs"))
+        except Exception as e:
+            print(f"⚠ Indexing output files failed: {e}")
+        while not self._stopped.is_set():
+            self._wake.clear()
+            try:
+                analytics.index_store(get_store())
+                self.last_indexed_at = datetime.now(timezone.utc).isoformat()
+            except Exception as e:
+                print(f"⚠ Analytics indexing failed: {e}")
+            self._wake.wait(self.interval)
+
+
+_indexer = None
+
+
+def get_indexer() -> BackgroundIndexer:
+    """Return the process-wide background indexer, configured from the environment"""
+    global _indexer
+    with _analytics_lock:
+        if _indexer is None:
+            _indexer = BackgroundIndexer(float(os.getenv("ANALYTICS_INDEX_INTERVAL", 60)))
+        return _indexer
+
+
+def format_report(report: dict) -> str:
+    """Plain-text rendering of report() for the terminal"""
+    summary = report["summary"]
+    lines = [
+        f"Runs: {summary['runs']} ({summary['first'] or '-'} .. {summary['last'] or '-'}), "
+        f"mean score {summary['mean_score']}, {summary['violations']} violations, "
+        f"{summary['high_priority_items']} high-priority feedback items",
+        "Screen types: " + ", ".join(f"{name} {runs}" for name, runs in summary["screen_types"].items()),
+        "",
+        "Most violated heuristics:",
+    ]
+    for h in report["heuristics"]:
+        severities = ", ".join(f"{level} {h[level]}" for level in LEVELS if h[level])
+        lines.append(f"  {h['violations']:5}  #{h['heuristic_id']} {h['heuristic_name']} "
+                     f"({h['runs']} runs; {severities})")
+    lines += ["", "Score trend:"]
+    for period in report["score_trend"]:
+        lines.append(f"  {period['period']}  {period['runs']:5} runs  mean {period['mean_score']} "
+                     f"(min {period['min_score']}, max {period['max_score']})")
+    lines += ["", "Components in critical and high violations:"]
+    for component in report["components"]:
+        lines.append(f"  {component['occurrences']:5}  {component['component']} ({component['runs']} runs)")
+    lines += ["", f"Query took {report['query_ms']} ms"]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index past evaluations and report on them")
+    parser.add_argument("command", choices=["index", "report"])
+    parser.add_argument("--outputs-dir", help="Directory of stage output files (ANALYTICS_OUTPUTS_DIR)")
+    parser.add_argument("--since", help="Only runs created at or after this ISO date")
+    parser.add_argument("--until", help="Only runs created before this ISO date")
+    parser.add_argument("--screen-type", help="Only runs of this screen type, e.g. login")
+    parser.add_argument("--bucket", choices=list(BUCKETS), default="week", help="Score trend period")
+    parser.add_argument("--limit", type=int, default=10, help="Rows per ranking")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    counts = index(args.outputs_dir)
+    if args.command == "index":
+        print(f"✓ Indexed {counts['stage_outputs']} stage outputs and {counts['files']} output files")
+        return
+
+    report = get_analytics().report(args.since, args.until, args.screen_type, args.bucket, args.limit)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+import argparse
+import glob
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from .coalesce import coalesce_key, coalescing_enabled, file_sha256, pipeline_config, run_once
+from .scheduler import priority_lane
+from .store import record_evaluation, recording_run
+from .telemetry import metrics, span, traced_kickoff
+
+load_dotenv()
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp"}
+
+
+def collect_screenshots(target: str) -> list:
+    """
+    Expand a directory or glob pattern into a sorted list of screenshots.
+
+    Args:
+        target: Directory containing screenshots, or a glob such as "shots/**/*.png"
+
+    Returns:
+        List of screenshot paths
+    """
+    path = Path(target)
+    if path.is_dir():
+        candidates = path.rglob("*")
+    else:
+        candidates = (Path(p) for p in glob.glob(target, recursive=True))
+    return sorted(str(p) for p in candidates if p.is_file() and p.suffix.lower() in IMAGE_EXTENSIONS)
+
+
+def evaluate_screenshot(screenshot_path: str) -> str:
+    """Run the evaluation crew for a single screenshot and return its report"""
+    from .crew import UxFeedbackCrew
+
+    with recording_run(screenshot_path=screenshot_path):
+        result = traced_kickoff(UxFeedbackCrew().evaluation_crew(), "evaluation", inputs={'screenshot_path': screenshot_path})
+        record_evaluation(result.raw)
+    return result.raw
+
+
+def evaluate_screenshot_fast(screenshot_path: str) -> str:
+    """Run the direct vision -> heuristics -> feedback pipeline and return its report"""
+    from .pipeline import run_fast_pipeline
+
+    with recording_run(screenshot_path=screenshot_path):
+        report = run_fast_pipeline(screenshot_path).raw
+        record_evaluation(report)
+    return report
+
+
+def coalesced(evaluate, mode: str):
+    """
+    Wrap evaluate so identical screenshots are evaluated once.
+
+    Duplicates in this batch, in a concurrent batch or in the API share one
+    job through the result store; see coalesce.run_once.
+
+    Args:
+        evaluate: Callable that evaluates one screenshot and returns its report
+        mode: Pipeline mode evaluate runs, part of the coalesce key
+    """
+    def evaluate_once(screenshot_path: str) -> str:
+        key = coalesce_key(file_sha256(screenshot_path), pipeline_config(mode))
+        report, _ = run_once(key, "batch", lambda: evaluate(screenshot_path))
+        return report
+
+    return evaluate_once
+
+
+class BatchManifest:
+    """Consolidated results file, rewritten after every finished screen"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+        else:
+            self.data = {"created": datetime.now().isoformat(), "screens": {}}
+
+    def completed(self) -> set:
+        return {p for p, entry in self.data["screens"].items() if entry["status"] == "completed"}
+
+    def record(self, screenshot_path: str, entry: dict) -> None:
+        with self._lock:
+            self.data["screens"][screenshot_path] = entry
+            self.data["updated"] = datetime.now().isoformat()
+            self.path.parent.mkdir(exist_ok=True, parents=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+
+def _evaluate_with_retries(screenshot_path: str, retries: int, backoff: float, evaluate) -> dict:
+    started = time.perf_counter()
+    last_error = None
+    for attempt in range(1, retries + 2):
+        try:
+            # Batch audits yield Gemini quota to interactive API requests
+            with span("batch.screen", screenshot=screenshot_path, attempt=attempt, retries=1 if attempt > 1 else 0), \
+                    priority_lane("batch"):
+                report = evaluate(screenshot_path)
+            return {
+                "status": "completed",
+                "attempts": attempt,
+                "duration": round(time.perf_counter() - started, 3),
+                "finished": datetime.now().isoformat(),
+                "report": report,
+            }
+        except Exception as e:
+            last_error = e
+            print(f"⚠ {screenshot_path} failed (attempt {attempt}): {e}")
+            if attempt <= retries:
+                metrics.inc("ux_retries_total", operation="batch_screen")
+                time.sleep(backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+    return {
+        "status": "failed",
+        "attempts": retries + 1,
+        "duration": round(time.perf_counter() - started, 3),
+        "finished": datetime.now().isoformat(),
+        "error": str(last_error),
+    }
+
+
+def run_batch(
+    screenshots: list,
+    manifest_path: str,
+    concurrency: int = 4,
+    retries: int = 2,
+    backoff: float = 2.0,
+    evaluate=evaluate_screenshot
+) -> dict:
+    """
+    Evaluate many screenshots with bounded concurrency.
+
+    Screens already marked completed in the manifest are skipped, so an
+    interrupted batch resumes where it stopped.
+
+    Args:
+        screenshots: Screenshot paths to evaluate
+        manifest_path: Where the consolidated results manifest is kept
+        concurrency: Number of evaluations running at once
+        retries: Extra attempts per screen after a failure
+        backoff: Base delay in seconds between attempts, doubled each retry
+        evaluate: Callable that evaluates one screenshot and returns its report
+
+    Returns:
+        The manifest data
+    """
+    manifest = BatchManifest(manifest_path)
+    done = manifest.completed()
+    pending = [p for p in screenshots if p not in done]
+
+    print(f"📸 {len(screenshots)} screenshots, {len(done & set(screenshots))} already done, {len(pending)} to run")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {
+            executor.submit(_evaluate_with_retries, p, retries, backoff, evaluate): p
+            for p in pending
+        }
+        for i, future in enumerate(as_completed(futures), start=1):
+            screenshot_path = futures[future]
+            entry = future.result()
+            manifest.record(screenshot_path, entry)
+            mark = "✓" if entry["status"] == "completed" else "❌"
+            print(f"{mark} [{i}/{len(pending)}] {screenshot_path} ({entry['duration']}s)")
+
+    return manifest.data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate a directory or glob of screenshots")
+    parser.add_argument("target", help="Directory of screenshots or glob pattern")
+    parser.add_argument("--manifest", default="data/outputs/batch_manifest.json",
+                        help="Results manifest; reused to resume an interrupted batch")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", 4)))
+    parser.add_argument("--retries", type=int, default=int(os.getenv("BATCH_RETRIES", 2)))
+    parser.add_argument("--mode", choices=["crew", "fast"], default=os.getenv("PIPELINE_MODE", "crew"),
+                        help="Run the agent crew or the direct fast pipeline")
+    args = parser.parse_args(argv)
+
+    screenshots = collect_screenshots(args.target)
+    if not screenshots:
+        print(f"❌ Error: No screenshots found at {args.target}")
+        return
+
+    evaluate = evaluate_screenshot_fast if args.mode == "fast" else evaluate_screenshot
+    if coalescing_enabled():
+        evaluate = coalesced(evaluate, args.mode)
+    data = run_batch(
+        screenshots,
+        args.manifest,
+        concurrency=args.concurrency,
+        retries=args.retries,
+        evaluate=evaluate
+    )
+
+    statuses = [data["screens"][p]["status"] for p in screenshots if p in data["screens"]]
+    print("\n" + "=" * 70)
+    print(f"✅ BATCH COMPLETE: {statuses.count('completed')} completed, {statuses.count('failed')} failed")
+    print(f"Manifest: {args.manifest}")
+    print("=" * 70)
+
+
+if __name__ == "__main__":
+    main()
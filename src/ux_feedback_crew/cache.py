@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image
+
+
+def image_fingerprint(img: Image.Image) -> str:
+    """
+    Hash the decoded pixels of an image, so the same screenshot hits the
+    cache regardless of file name, metadata or container format.
+
+    Args:
+        img: Decoded PIL image
+
+    Returns:
+        Hex SHA-256 digest of mode, size and raw pixel data
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{img.mode}:{img.size[0]}x{img.size[1]}:".encode())
+    digest.update(img.tobytes())
+    return digest.hexdigest()
+
+
+class VisionCache:
+    """Persistent, content-addressed cache of vision analysis results"""
+
+    def __init__(self, cache_dir: str, max_bytes: int, max_age: float, enabled: bool = True):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(image_hash: str, prompt_version: str, model: str) -> str:
+        """Combine image hash, prompt version and model into a cache key"""
+        return hashlib.sha256(f"{image_hash}|{prompt_version}|{model}".encode()).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached result for key, or None on a miss"""
+        if not self.enabled:
+            return None
+        path = self._entry_path(key)
+        with self._lock:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+
+            if time.time() - stat.st_mtime > self.max_age:
+                path.unlink(missing_ok=True)
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    result_text = json.load(f)['result']
+            except (OSError, ValueError, KeyError):
+                # Corrupt or partially written entry
+                path.unlink(missing_ok=True)
+                self.misses += 1
+                return None
+
+            # Touch the entry so size-based eviction drops least recently used first
+            os.utime(path)
+            self.hits += 1
+            return result_text
+
+    def put(self, key: str, result_text: str) -> None:
+        """Store a result and evict entries beyond the age and size limits"""
+        if not self.enabled:
+            return
+        self.cache_dir.mkdir(exist_ok=True, parents=True)
+        path = self._entry_path(key)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"created": time.time(), "result": result_text}, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self._evict()
+
+    def _evict(self) -> None:
+        now = time.time()
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.max_age:
+                path.unlink(missing_ok=True)
+                self.evictions += 1
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        # Drop least recently used entries until we fit the size budget
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """Return hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_vision_cache = None
+_vision_cache_lock = threading.Lock()
+
+
+def get_vision_cache() -> VisionCache:
+    """Return the process-wide vision cache configured from the environment"""
+    global _vision_cache
+    with _vision_cache_lock:
+        if _vision_cache is None:
+            _vision_cache = VisionCache(
+                cache_dir=os.getenv("VISION_CACHE_DIR", "data/cache/vision"),
+                max_bytes=int(os.getenv("VISION_CACHE_MAX_BYTES", 50 * 1024 * 1024)),
+                max_age=float(os.getenv("VISION_CACHE_MAX_AGE", 7 * 24 * 3600)),
+                enabled=os.getenv("VISION_CACHE_ENABLED", "true").lower() != "false",
+            )
+        return _vision_cache
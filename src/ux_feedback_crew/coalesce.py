@@ -0,0 +1,158 @@
+"""
+Single-flight coalescing of identical evaluations.
+
+Retries, double taps and parallel CI jobs often submit the same screenshot
+several times at once. Each submission is keyed on the screenshot's content
+hash plus every setting that changes the result: pipeline mode, stage
+models, local analysis, preprocessing and so on. The first submission of a
+key runs. Later ones attach to it while it is queued or running, or reuse
+its result for COALESCE_WINDOW seconds after it completed.
+
+The in-flight record is the job row in the result store. API workers,
+batch threads and separate processes sharing the database therefore
+coalesce with each other. Whichever path runs the job, the job id is the
+evaluation id and the result has the API's shape, so a shared job can be
+fetched from /evaluations/{job_id} like any other.
+"""
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Callable, Optional, Tuple
+
+from .store import WORKER_ID, ResultStore, get_store, recording_run, worker_alive
+from .telemetry import current_span, metrics
+
+metrics.describe("ux_coalesced_total", "Evaluations served from an identical in-flight or recent job")
+
+# Outcomes of a coalesced submission
+JOINED = "joined"
+REUSED = "reused"
+
+
+def coalescing_enabled() -> bool:
+    return os.getenv("COALESCE_ENABLED", "true").lower() == "true"
+
+
+def coalesce_window() -> float:
+    """Seconds a completed result is reused, from COALESCE_WINDOW"""
+    return float(os.getenv("COALESCE_WINDOW", 300))
+
+
+def file_sha256(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Hash of a file's bytes, the same content hash uploads are stored under"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def pipeline_config(mode: str, **extra) -> dict:
+    """
+    Settings that change an evaluation's result.
+
+    Args:
+        mode: Pipeline mode, e.g. "crew" or "fast"
+        extra: Request options that matter as well, such as screen_key
+    """
+    from .knowledge import knowledge_budget
+    from .local_analysis import local_analysis_enabled
+    from .preprocess import PreprocessSettings
+    from .routing import cascade_enabled, stage_route
+
+    return {
+        "mode": mode,
+        "models": {stage: stage_route(stage).model for stage in ("vision", "heuristics", "feedback")},
+        "cascade": cascade_enabled(),
+        "fanout": os.getenv("HEURISTIC_FANOUT", "false").lower() == "true",
+        "local_analysis": local_analysis_enabled(),
+        "preprocess": PreprocessSettings.from_env().tag,
+        "knowledge_budget": knowledge_budget(),
+        **{name: value for name, value in extra.items() if value is not None},
+    }
+
+
+def coalesce_key(content_hash: str, config: dict) -> str:
+    """Key shared by evaluations of the same content under the same configuration"""
+    canonical = json.dumps({"content": content_hash, "config": config}, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def record_coalesced(path: str, outcome: Optional[str], job_id: str = None) -> None:
+    """Count a coalesced submission and note it on the current span"""
+    if outcome is None:
+        return
+    metrics.inc("ux_coalesced_total", path=path, outcome=outcome)
+    active = current_span()
+    if active is not None:
+        active.set(coalesced=outcome, coalesced_job=job_id)
+    print(f"✓ Coalesced with job {job_id} ({outcome})")
+
+
+def _wait_for(store: ResultStore, job_id: str, poll_interval: float, deadline: float) -> dict:
+    while True:
+        job = store.get_job(job_id)
+        if job is None or job["status"] not in ("queued", "running"):
+            return job
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Identical job {job_id} still running")
+        # A crashed owner would otherwise be waited on until the deadline
+        store.fail_orphaned_jobs(worker_alive, "Worker exited before the job finished")
+        time.sleep(poll_interval)
+
+
+def run_once(
+    key: str,
+    kind: str,
+    fn: Callable[[], str],
+    store: ResultStore = None,
+    path: str = "batch",
+    poll_interval: float = 0.5,
+    timeout: float = None
+) -> Tuple[str, Optional[str]]:
+    """
+    Run fn unless an identical job is in flight or recently completed.
+
+    Args:
+        key: coalesce_key() of the evaluation
+        kind: Job kind recorded when fn runs here
+        fn: Returns the report; runs under recording_run(job_id), so the
+            evaluation it records gets the job id
+        store: Result store holding the jobs, the process-wide one if omitted
+        path: Label of ux_coalesced_total, e.g. "batch"
+        poll_interval: Seconds between checks on an identical running job
+        timeout: Longest wait for an identical job, from COALESCE_WAIT_TIMEOUT
+
+    Returns:
+        (report, outcome) where outcome is None when fn ran, "joined" when the
+        report came from a job that was in flight and "reused" when it came
+        from a completed one
+
+    Raises:
+        RuntimeError: If the identical job failed; a retry then runs fn itself
+        TimeoutError: If the identical job did not finish in time
+    """
+    store = store or get_store()
+    timeout = float(os.getenv("COALESCE_WAIT_TIMEOUT", 900)) if timeout is None else timeout
+    job_id = str(uuid.uuid4())
+
+    existing = store.claim_job(job_id, kind, key, coalesce_window(), status="running", worker=WORKER_ID)
+    if existing is not None:
+        outcome = REUSED if existing["status"] == "completed" else JOINED
+        job = _wait_for(store, existing["job_id"], poll_interval, time.monotonic() + timeout)
+        if job is None or job["status"] != "completed":
+            raise RuntimeError(f"Identical job {existing['job_id']} failed: {job['error'] if job else 'not found'}")
+        record_coalesced(path, outcome, existing["job_id"])
+        return job["result"]["evaluation"], outcome
+
+    try:
+        with recording_run(job_id) as run:
+            report = fn()
+    except Exception as e:
+        store.update_job(job_id, status="failed", error=str(e))
+        raise
+    result = {"evaluation_id": job_id, "image_hash": run.image_hash, "evaluation": report}
+    store.update_job(job_id, status="completed", progress=1.0, result=result)
+    return report, None
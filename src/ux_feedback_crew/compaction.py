@@ -0,0 +1,228 @@
+"""
+Compaction of stage outputs before they are embedded in the next prompt.
+
+Each consumer stage declares which fields of which upstream output it
+reads. Compaction keeps only those fields, merges identical entries,
+minifies the JSON and, if the inputs still exceed the stage's token budget,
+drops the least severe list items and shortens long strings until they fit.
+"""
+import json
+import math
+import os
+from dataclasses import dataclass
+
+from .telemetry import current_span, metrics
+
+metrics.describe("ux_context_tokens_saved_total", "Estimated prompt tokens removed by context compaction")
+
+SEVERITY_RANK = {"critical": 3, "high": 2, "medium": 1, "low": 0}
+
+COMPONENT_FIELDS = {"type": True, "text": True, "position": True}
+
+# Fields each stage reads from each upstream output; True keeps a value whole
+STAGE_FIELDS = {
+    "heuristics": {
+        "vision": {
+            "screen_type": True,
+            "components": {**COMPONENT_FIELDS, "color": True, "size": True},
+            "layout_structure": True,
+            "color_scheme": True,
+            "typography": True,
+            "spacing_and_density": True,
+            "accessibility_observations": True,
+            "notable_patterns": True,
+        },
+    },
+    "feedback": {
+        "vision": {
+            "screen_type": True,
+            "components": COMPONENT_FIELDS,
+            "accessibility_observations": True,
+        },
+        "heuristics": {
+            "violations": {
+                "heuristic_id": True,
+                "heuristic_name": True,
+                "severity": True,
+                "issue": True,
+                "affected_components": True,
+                "improvement_suggestion": True,
+            },
+        },
+    },
+    "flow": {
+        "vision": {
+            "screens": {
+                "screen_index": True,
+                "screen_type": True,
+                "components": COMPONENT_FIELDS,
+                "layout_structure": True,
+                "accessibility_observations": True,
+                "notable_patterns": True,
+            },
+            "navigation_patterns": True,
+        },
+    },
+    "wireframe": {
+        "vision": {
+            "screen_type": True,
+            "components": {**COMPONENT_FIELDS, "color": True, "size": True},
+            "layout_structure": True,
+            "color_scheme": True,
+            "typography": True,
+            "spacing_and_density": True,
+        },
+        "feedback": {
+            "feedback_items": {"title": True, "priority": True, "what_to_do": True, "wireframe_changes": True},
+            "quick_wins": {"change": True},
+        },
+    },
+}
+
+DEFAULT_BUDGETS = {"heuristics": 3000, "feedback": 4000, "wireframe": 4000, "flow": 8000}
+
+# Successively tighter (max list items, max string length) passes used to fit a budget
+SHRINK_STEPS = ((40, 400), (20, 240), (12, 160), (8, 100), (5, 60))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, about four characters per token"""
+    return math.ceil(len(text) / 4)
+
+
+def minify(data) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def select_fields(data, spec):
+    """Keep only the fields named in spec, recursing into dicts and lists of dicts"""
+    if spec is True:
+        return data
+    if isinstance(data, list):
+        return [select_fields(item, spec) for item in data]
+    if isinstance(data, dict):
+        return {key: select_fields(data[key], sub) for key, sub in spec.items() if key in data}
+    return data
+
+
+def _is_empty(value) -> bool:
+    return value in ("", None, [], {})
+
+
+def dedupe(data):
+    """
+    Drop empty values and merge repeated list entries.
+
+    Identical dict entries, such as repeated components, collapse into one
+    entry with a "count"; identical strings are kept once.
+    """
+    if isinstance(data, dict):
+        return {key: dedupe(value) for key, value in data.items() if not _is_empty(value)}
+    if isinstance(data, list):
+        merged = []
+        index = {}
+        for item in (dedupe(i) for i in data):
+            key = minify(item)
+            if key in index:
+                entry = merged[index[key]]
+                if isinstance(entry, dict):
+                    entry["count"] = entry.get("count", 1) + 1
+                continue
+            index[key] = len(merged)
+            merged.append(dict(item) if isinstance(item, dict) else item)
+        return merged
+    return data
+
+
+def _rank(item) -> int:
+    if not isinstance(item, dict):
+        return 0
+    level = item.get("severity") or item.get("priority") or ""
+    return SEVERITY_RANK.get(str(level).lower(), 0)
+
+
+def shrink(data, max_items: int, max_chars: int):
+    """Keep the most severe max_items of each list and cut strings to max_chars"""
+    if isinstance(data, dict):
+        return {key: shrink(value, max_items, max_chars) for key, value in data.items()}
+    if isinstance(data, list):
+        ranked = sorted(data, key=_rank, reverse=True) if any(_rank(i) for i in data) else data
+        return [shrink(item, max_items, max_chars) for item in ranked[:max_items]]
+    if isinstance(data, str) and len(data) > max_chars:
+        return data[:max_chars - 1].rstrip() + "…"
+    return data
+
+
+@dataclass
+class CompactionResult:
+    """Compacted inputs of one prompt and the estimated tokens saved"""
+
+    texts: dict
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+def compaction_enabled() -> bool:
+    return os.getenv("CONTEXT_COMPACTION", "true").lower() == "true"
+
+
+def stage_budget(stage: str) -> int:
+    """Token budget for a stage's upstream context, from CONTEXT_BUDGET_<STAGE>"""
+    return int(os.getenv(f"CONTEXT_BUDGET_{stage.upper()}", DEFAULT_BUDGETS.get(stage, 4000)))
+
+
+def compact_context(stage: str, budget: int = None, **inputs) -> CompactionResult:
+    """
+    Compact the upstream outputs a stage embeds in its prompt.
+
+    Args:
+        stage: Consuming stage ("heuristics", "feedback", "wireframe" or "flow")
+        budget: Token budget for all inputs together; defaults to stage_budget(stage)
+        **inputs: Upstream outputs by name, e.g. vision="...", heuristics="..."
+
+    Returns:
+        CompactionResult with the compacted text of each input. Inputs that
+        are not JSON, such as prose from an agent, pass through unchanged.
+    """
+    tokens_before = sum(estimate_tokens(text) for text in inputs.values())
+    if not compaction_enabled():
+        return CompactionResult(dict(inputs), tokens_before, tokens_before)
+
+    budget = budget or stage_budget(stage)
+    fields = STAGE_FIELDS.get(stage, {})
+    parsed = {}
+    texts = {}
+    for name, text in inputs.items():
+        try:
+            data = json.loads(text)
+        except (json.JSONDecodeError, TypeError):
+            texts[name] = text
+            continue
+        if isinstance(data, dict) and name in fields:
+            data = select_fields(data, fields[name])
+        parsed[name] = dedupe(data)
+        texts[name] = minify(parsed[name])
+
+    def total():
+        return sum(estimate_tokens(text) for text in texts.values())
+
+    for max_items, max_chars in SHRINK_STEPS:
+        if total() <= budget:
+            break
+        for name, data in parsed.items():
+            texts[name] = minify(shrink(data, max_items, max_chars))
+
+    result = CompactionResult(texts, tokens_before, total())
+    if result.tokens_saved > 0:
+        metrics.inc("ux_context_tokens_saved_total", result.tokens_saved, stage=stage)
+        span = current_span()
+        if span is not None:
+            span.add("context_tokens_saved", result.tokens_saved)
+        print(f"✓ Context for {stage} compacted: ~{result.tokens_before} -> ~{result.tokens_after} tokens")
+    if result.tokens_after > budget:
+        print(f"⚠ Context for {stage} still exceeds its budget of {budget} tokens")
+    return result
@@ -1,14 +1,53 @@
 import os
 from crewai import Agent, Crew, Process, Task, LLM
 from crewai.project import CrewBase, agent, crew, task
+from .gemini_client import GeminiClientProvider, get_client_provider
+from .routing import stage_route
+from .scheduler import estimate_request_tokens, get_scheduler
+from .telemetry import record_agent_step
 from .tools import (
-    analyze_ui_screenshot,
-    evaluate_heuristics,
-    generate_feedback,
-    create_wireframe
+    build_vision_tool,
+    build_heuristic_tool,
+    build_feedback_tool,
+    build_wireframe_tool
 )
 
 
+class ScheduledLLM(LLM):
+    """
+    CrewAI LLM whose calls go through the quota scheduler, like the tools'
+    Gemini calls, so agent reasoning shares the per-model budgets and is
+    retried on 429 and 5xx responses.
+    """
+
+    def __init__(self, scheduled_model: str, **kwargs):
+        super().__init__(**kwargs)
+        self.scheduled_model = scheduled_model
+
+    def call(self, messages, *args, **kwargs):
+        if isinstance(messages, str):
+            prompt = messages
+        else:
+            prompt = [str(message.get("content", "")) for message in messages]
+        return get_scheduler().call(
+            self.scheduled_model,
+            estimate_request_tokens(prompt),
+            lambda: super(ScheduledLLM, self).call(messages, *args, **kwargs)
+        )
+
+
+def gemini_llm(model: str) -> LLM:
+    """Build a CrewAI LLM for a Gemini model, honouring GEMINI_BASE_URL"""
+    base_url = os.getenv("GEMINI_BASE_URL")
+    return ScheduledLLM(
+        scheduled_model=model,
+        model=f"gemini/{model}",
+        api_key=os.getenv("GEMINI_API_KEY"),
+        # LiteLLM appends ":generateContent" to api_base, so it has to name the model
+        api_base=f"{base_url.rstrip('/')}/v1beta/models/{model}" if base_url else None
+    )
+
+
 @CrewBase
 class UxFeedbackCrew():
     """UX Feedback Crew - Multi-agent system for UI evaluation"""
@@ -17,23 +56,26 @@ class UxFeedbackCrew():
     tasks_config = 'config/tasks.yaml'
 
     #  Define the Gemini LLM for the agents to use
-    def __init__(self):
-        self.gemini_llm = LLM(
-            model="gemini/gemini-2.5-flash", # Or gemini-2.0-flash-exp
-            api_key=os.getenv("GEMINI_API_KEY")
-        )
+    def __init__(self, client_provider: GeminiClientProvider = None):
+        # Gemini client shared by the tools; pooled across crews by default
+        self.client_provider = client_provider or get_client_provider()
 
-        self.gemini_preview_llm = LLM(
-            model="gemini/gemini-3-flash-preview", 
-            api_key=os.getenv("GEMINI_API_KEY")
-        )
+        # One LLM per model named in the routing blocks of agents.yaml
+        self._llms = {}
+
+    def stage_llm(self, stage: str) -> LLM:
+        """The agent LLM configured for a stage, shared by agents using the same model"""
+        model = stage_route(stage).agent_model
+        if model not in self._llms:
+            self._llms[model] = gemini_llm(model)
+        return self._llms[model]
 
     @agent
     def vision_analyst(self) -> Agent:
         return Agent(
             config=self.agents_config['vision_analyst'],
-            tools=[analyze_ui_screenshot],
-            llm=self.gemini_llm, 
+            tools=[build_vision_tool(self.client_provider)],
+            llm=self.stage_llm("vision"),
             verbose=True,   
             allow_delegation=False # Prevent it from asking other agents for help
         )
@@ -42,8 +84,8 @@ class UxFeedbackCrew():
     def heuristic_evaluator(self) -> Agent:
         return Agent(
             config=self.agents_config['heuristic_evaluator'],
-            tools=[evaluate_heuristics],
-            llm=self.gemini_llm, # 2. Assign the LLM here
+            tools=[build_heuristic_tool(self.client_provider)],
+            llm=self.stage_llm("heuristics"),
             verbose=True
         )
     
@@ -51,8 +93,8 @@ class UxFeedbackCrew():
     def feedback_specialist(self) -> Agent:
         return Agent(
             config=self.agents_config['feedback_specialist'],
-            llm=self.gemini_llm, # 2. Assign the LLM here
-            tools=[generate_feedback],
+            llm=self.stage_llm("feedback"),
+            tools=[build_feedback_tool(self.client_provider)],
             verbose=True
         )
     
@@ -60,8 +102,8 @@ class UxFeedbackCrew():
     def wireframe_designer(self) -> Agent:
         return Agent(
             config=self.agents_config['wireframe_designer'],
-            llm=self.gemini_preview_llm, # 2. Assign the LLM here
-            tools=[create_wireframe],
+            llm=self.stage_llm("wireframe"),
+            tools=[build_wireframe_tool(self.client_provider)],
             verbose=True
         )
     
@@ -108,6 +150,7 @@ class UxFeedbackCrew():
             agents=[self.vision_analyst(), self.heuristic_evaluator(), self.feedback_specialist()],
             tasks=[self.analyze_ui(), self.evaluate_heuristics(), self.generate_feedback()],
             process=Process.sequential,
+            step_callback=record_agent_step,
             verbose=True
         )
 
@@ -118,5 +161,6 @@ class UxFeedbackCrew():
             agents=[self.wireframe_designer()],
             tasks=[self.create_wireframe()],
             process=Process.sequential,
+            step_callback=record_agent_step,
             verbose=True
         )
\ No newline at end of file
@@ -0,0 +1,141 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+from .gemini_client import GeminiClientProvider
+from .telemetry import metrics
+
+metrics.describe("ux_crew_pool_wait_seconds", "Time spent waiting to check a crew out of the pool")
+metrics.describe("ux_crew_pool_created_total", "Crew instances built by the pool")
+
+
+def reset_crew(crew) -> None:
+    """
+    Clear the per-run state a crew keeps after kickoff.
+
+    Task callbacks stick once set, task outputs linger, and each agent's
+    token counter accumulates across kickoffs, which would inflate the usage
+    reported for the next run. The tool cache is replaced too: a cached tool
+    result skips the tool body, so a repeated call on the same input would
+    record no stage outputs for the new run.
+    """
+    from crewai.agents.cache import CacheHandler
+
+    crew.task_callback = None
+    for task in crew.tasks:
+        task.callback = None
+        task.output = None
+    crew._cache_handler = CacheHandler()
+    for agent in crew.agents:
+        agent._token_process = type(agent._token_process)()
+        if crew.cache:
+            agent.set_cache_handler(crew._cache_handler)
+
+
+class PooledCrew:
+    """A UxFeedbackCrew with its evaluation and wireframe crews built once"""
+
+    def __init__(self, client_provider: GeminiClientProvider = None):
+        from .crew import UxFeedbackCrew
+
+        self.crew_instance = UxFeedbackCrew(client_provider)
+        self.evaluation_crew = self.crew_instance.evaluation_crew()
+        self.wireframe_crew = self.crew_instance.wireframe_crew()
+        self.uses = 0
+
+    def reset(self) -> None:
+        reset_crew(self.evaluation_crew)
+        reset_crew(self.wireframe_crew)
+
+
+class CrewPool:
+    """
+    A fixed number of pre-built crews, checked out per run.
+
+    Building a crew parses the YAML configuration and creates the LLM
+    objects, agents and tasks; the pool does that at most `size` times and
+    hands the same instances out again after resetting them. Size it to the
+    number of concurrent runs so a checkout only waits when every worker is
+    busy with a crew.
+    """
+
+    def __init__(self, size: int, name: str = "crews", factory=PooledCrew):
+        self.size = max(1, size)
+        self.name = name
+        self.factory = factory
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+
+    def _build(self):
+        started = time.perf_counter()
+        pooled = self.factory()
+        metrics.inc("ux_crew_pool_created_total", pool=self.name)
+        print(f"✓ Crew built for the {self.name} pool in {time.perf_counter() - started:.2f}s")
+        return pooled
+
+    def _reserve(self) -> bool:
+        with self._lock:
+            if self._created >= self.size:
+                return False
+            self._created += 1
+            return True
+
+    def _release_reservation(self) -> None:
+        with self._lock:
+            self._created -= 1
+
+    def warm(self) -> None:
+        """Build crews until the pool is full"""
+        while self._reserve():
+            try:
+                self._idle.put(self._build())
+            except Exception:
+                self._release_reservation()
+                raise
+
+    @contextmanager
+    def checkout(self, timeout: float = None):
+        """
+        Borrow a crew for one run and return it reset afterwards.
+
+        Args:
+            timeout: Seconds to wait for a free crew; defaults to the
+                CREW_POOL_TIMEOUT environment variable, or no limit
+
+        Raises:
+            TimeoutError: If no crew became free in time
+        """
+        if timeout is None and os.getenv("CREW_POOL_TIMEOUT"):
+            timeout = float(os.getenv("CREW_POOL_TIMEOUT"))
+
+        started = time.perf_counter()
+        try:
+            pooled = self._idle.get_nowait()
+        except queue.Empty:
+            pooled = None
+        if pooled is None and self._reserve():
+            try:
+                pooled = self._build()
+            except Exception:
+                self._release_reservation()
+                raise
+        if pooled is None:
+            try:
+                pooled = self._idle.get(timeout=timeout)
+            except queue.Empty:
+                raise TimeoutError(f"No crew free in the {self.name} pool after {timeout}s")
+        metrics.observe("ux_crew_pool_wait_seconds", time.perf_counter() - started, pool=self.name)
+
+        try:
+            pooled.uses += 1
+            yield pooled
+        finally:
+            pooled.reset()
+            self._idle.put(pooled)
+
+    def stats(self) -> dict:
+        idle = self._idle.qsize()
+        return {"size": self.size, "created": self._created, "idle": idle, "in_use": self._created - idle}
@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+"""
+Evaluation of a user flow, an ordered list of screens such as
+onboarding -> login -> home, in batched multi-image requests.
+
+All screens are analysed together, a few per vision request, with the
+earlier screens' summaries passed along as shared context. One heuristic
+request then evaluates the whole flow and returns findings per screen plus
+violations that only show across steps, such as inconsistent navigation
+or status that is lost between screens.
+"""
+import argparse
+import json
+import os
+import time
+from dataclasses import dataclass, field
+
+from google.genai import types
+
+from .compaction import compact_context, minify
+from .gemini_client import GeminiClientProvider, get_client_provider, metered
+from .knowledge import get_heuristics_index
+from .preprocess import PreprocessSettings, decode_image, encode_image
+from .schemas import FlowAnalysis, FlowEvaluation
+from .store import record_evaluation, record_stage, recording_run
+from .routing import CONFIDENCE_NOTE, generate_routed
+from .structured import StructuredOutputError
+from .telemetry import current_span, metrics, span
+
+
+def flow_batch_size() -> int:
+    """Screens sent per vision request, from FLOW_BATCH_SIZE"""
+    return max(1, int(os.getenv("FLOW_BATCH_SIZE", 6)))
+
+
+@dataclass
+class FlowResult:
+    """Outputs of a flow evaluation"""
+
+    screenshots: list
+    analysis: FlowAnalysis
+    evaluation: FlowEvaluation
+    duration: float
+    timings: dict = field(default_factory=dict)
+    usage: dict = field(default_factory=dict)
+
+    @property
+    def raw(self) -> str:
+        """The flow evaluation as JSON, stored as the evaluation report"""
+        return self.evaluation.model_dump_json(indent=2)
+
+
+VISION_PROMPT = """
+Analyze these screens of a mobile app user flow. They are shown in the order
+the user moves through them; each image is preceded by its screen number.
+
+For EACH screen return one entry in "screens" with its "screen_index" and:
+screen_type, components (type, text, position, color, size), layout_structure,
+color_scheme, typography, spacing_and_density, accessibility_observations and
+notable_patterns.
+
+Also list in "navigation_patterns" how the user moves between these screens
+(back buttons, tab bars, progress indicators, headers) and how consistent
+that is.
+
+Return ONLY valid JSON.
+"""
+
+
+def _screen_summary(screen) -> dict:
+    # Shared context handed to later batches: enough to judge consistency
+    return {
+        "screen_index": screen.screen_index,
+        "screen_type": screen.screen_type,
+        "layout_structure": screen.layout_structure,
+        "navigation": [
+            {"type": c.type, "text": c.text, "position": c.position}
+            for c in screen.components
+            if c.position.lower().startswith(("top", "bottom")) or "nav" in c.type.lower() or "tab" in c.type.lower()
+        ],
+    }
+
+
+def _vision_contents(images: dict, total: int, analysed: list) -> list:
+    # images maps screen_index to the image part of the screens still to analyse
+    contents = [VISION_PROMPT]
+    if analysed:
+        contents.append(
+            f"Screens {', '.join(str(s.screen_index) for s in analysed)} of this flow were analysed already:\n"
+            f"{minify([_screen_summary(s) for s in analysed])}\n"
+            f"Continue with screens {', '.join(str(index) for index in images)}."
+        )
+    for index, part in images.items():
+        contents.append(f"Screen {index} of {total}:")
+        contents.append(part)
+    return contents
+
+
+def analyze_flow(screenshots: list, provider: GeminiClientProvider, batch_size: int = None) -> FlowAnalysis:
+    """
+    Analyse all screens of a flow in multi-image vision requests.
+
+    Screens are matched to screenshots by their screen_index. Screens missing
+    from a reply are requested again on their own, at most
+    STRUCTURED_MAX_RETRIES times.
+
+    Args:
+        screenshots: Screenshot paths in flow order
+        provider: Gemini client provider
+        batch_size: Screens per request; defaults to FLOW_BATCH_SIZE
+
+    Returns:
+        FlowAnalysis with one ScreenAnalysis per screenshot
+
+    Raises:
+        StructuredOutputError: If a screen is still missing after the retries
+    """
+    batch_size = batch_size or flow_batch_size()
+    max_retries = int(os.getenv("STRUCTURED_MAX_RETRIES", 1))
+    settings = PreprocessSettings.from_env()
+    screens = []
+    navigation = []
+
+    for start in range(0, len(screenshots), batch_size):
+        pending = {}
+        for index, path in enumerate(screenshots[start:start + batch_size], start=start + 1):
+            prepared = encode_image(decode_image(path), settings)
+            pending[index] = types.Part.from_bytes(data=prepared.data, mime_type=prepared.mime_type)
+
+        found = {}
+        for attempt in range(max_retries + 1):
+            if attempt:
+                metrics.inc("ux_structured_output_total", schema=FlowAnalysis.__name__, outcome="retried")
+                print(f"⚠ Flow analysis is missing screens {list(pending)}, requesting them again")
+            analysed = screens + [found[index] for index in sorted(found)]
+            contents = _vision_contents(pending, len(screenshots), analysed)
+            analysis = generate_routed(provider, stage="vision", contents=contents, schema=FlowAnalysis)
+            for screen in analysis.screens:
+                if pending.pop(screen.screen_index, None) is not None:
+                    found[screen.screen_index] = screen
+            navigation.extend(analysis.navigation_patterns)
+            if not pending:
+                break
+
+        if pending:
+            metrics.inc("ux_structured_output_total", schema=FlowAnalysis.__name__, outcome="failed")
+            raise StructuredOutputError(
+                f"Flow analysis is missing screens {list(pending)} after {max_retries + 1} attempts"
+            )
+        screens.extend(found[index] for index in sorted(found))
+
+    return FlowAnalysis(screens=screens, navigation_patterns=list(dict.fromkeys(navigation)))
+
+
+def evaluate_flow(analysis: FlowAnalysis, provider: GeminiClientProvider) -> FlowEvaluation:
+    """
+    Evaluate a whole flow against Nielsen's heuristics in one request.
+
+    Returns:
+        FlowEvaluation with per-screen findings and cross-screen violations
+    """
+    flow_text = compact_context("flow", vision=analysis.model_dump_json()).texts["vision"]
+    # Knowledge relevant to any screen of the flow
+    retrieval = get_heuristics_index().retrieve_for(analysis.model_dump())
+    heuristics_info = retrieval.text if retrieval.heuristics else "Nielsen's 10 Usability Heuristics"
+    current_span().set(knowledge_tokens=retrieval.tokens, knowledge_entries=retrieval.entries)
+
+    prompt = f"""
+You are a UX evaluation expert. Evaluate this mobile user flow of {len(analysis.screens)} screens
+against Nielsen's 10 Usability Heuristics.
+
+## FLOW ANALYSIS (screens in order):
+{flow_text}
+
+## HEURISTICS TO EVALUATE:
+{heuristics_info}
+
+## OUTPUT FORMAT:
+
+Return ONLY valid JSON:
+
+{{
+  "screens": [
+    {{
+      "screen_index": 1,
+      "violations": [
+        {{
+          "heuristic_id": 1,
+          "heuristic_name": "Visibility of system status",
+          "severity": "high/medium/low",
+          "issue": "Problem on this screen only",
+          "affected_components": ["list"],
+          "improvement_suggestion": "How to fix"
+        }}
+      ],
+      "strengths": [{{"heuristic_name": "Name", "observation": "What works well"}}],
+      "overall_score": 7.5
+    }}
+  ],
+  "cross_screen_violations": [
+    {{
+      "heuristic_id": 4,
+      "heuristic_name": "Consistency and standards",
+      "severity": "high/medium/low",
+      "issue": "Problem that spans several steps, e.g. navigation or progress that changes between screens",
+      "screens": [1, 2],
+      "affected_components": ["list"],
+      "improvement_suggestion": "How to fix"
+    }}
+  ],
+  "overall_score": 7.0,
+  "confidence": <0 to 1>
+}}
+
+{CONFIDENCE_NOTE}
+
+Report a problem under "cross_screen_violations" only if it involves more than one
+screen, and do not repeat it under the individual screens. Return ONLY the JSON.
+"""
+    return generate_routed(provider, stage="heuristics", contents=prompt, schema=FlowEvaluation)
+
+
+def run_flow(screenshots: list, provider: GeminiClientProvider = None, on_event=None) -> FlowResult:
+    """
+    Evaluate an ordered list of screenshots as one user flow.
+
+    Args:
+        screenshots: Screenshot paths in the order the user sees them
+        provider: Gemini client provider, the process-wide one if omitted
+        on_event: Optional callback on_event(event, payload) receiving
+            stage_start and stage_complete events
+
+    Returns:
+        FlowResult with the flow analysis, the evaluation, timings and token usage
+    """
+    if not screenshots:
+        raise ValueError("A flow needs at least one screenshot")
+
+    provider = provider or get_client_provider()
+    started = time.perf_counter()
+    timings = {}
+
+    def stage(name, fn, *args):
+        if on_event is not None:
+            on_event("stage_start", {"stage": name})
+        stage_started = time.perf_counter()
+        result = fn(*args)
+        timings[name] = round(time.perf_counter() - stage_started, 3)
+        record_stage(f"flow_{name}", result.model_dump_json(indent=2))
+        if on_event is not None:
+            on_event("stage_complete", {"stage": name, "duration": timings[name], "data": result.model_dump()})
+        return result
+
+    with metered() as meter, span("pipeline.flow", screens=len(screenshots)), \
+            recording_run(screenshot_path=screenshots[0]):
+        analysis = stage("vision", analyze_flow, screenshots, provider)
+        evaluation = stage("heuristics", evaluate_flow, analysis, provider)
+        current_span().set(cross_screen_violations=len(evaluation.cross_screen_violations))
+
+    return FlowResult(
+        screenshots=list(screenshots),
+        analysis=analysis,
+        evaluation=evaluation,
+        duration=time.perf_counter() - started,
+        timings=timings,
+        usage=meter.as_dict(),
+    )
+
+
+def compare_with_screens(screenshots: list) -> dict:
+    """
+    Evaluate a flow once batched and once screen by screen with the fast
+    pipeline, with the vision cache bypassed, and compare latency and tokens.
+    """
+    from .cache import get_vision_cache
+    from .pipeline import run_fast_pipeline
+
+    flow = run_flow(screenshots)
+
+    cache = get_vision_cache()
+    enabled, cache.enabled = cache.enabled, False
+    started = time.perf_counter()
+    try:
+        with metered() as meter:
+            for path in screenshots:
+                run_fast_pipeline(path, use_cache=False)
+    finally:
+        cache.enabled = enabled
+    separate_duration = time.perf_counter() - started
+
+    return {
+        "flow": {"duration": round(flow.duration, 3), "stages": flow.timings, "tool_gemini": flow.usage},
+        "per_screen": {"duration": round(separate_duration, 3), "tool_gemini": meter.as_dict()},
+        "speedup": round(separate_duration / flow.duration, 2) if flow.duration else None,
+        "tokens_saved": meter.total_tokens - flow.usage["total_tokens"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate an ordered list of screenshots as one user flow")
+    parser.add_argument("screenshots", nargs="+", help="Screenshots in flow order")
+    parser.add_argument("--compare", action="store_true",
+                        help="Also evaluate each screen separately and print a latency/token comparison")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        print(json.dumps(compare_with_screens(args.screenshots), indent=2))
+        return
+
+    with recording_run(screenshot_path=args.screenshots[0]) as run:
+        result = run_flow(args.screenshots)
+        record_evaluation(result.raw)
+    print("\n" + "=" * 70)
+    print(f"✅ FLOW OF {len(args.screenshots)} SCREENS COMPLETE in {result.duration:.1f}s {result.timings}")
+    print(f"Tokens: {result.usage}")
+    print(f"Evaluation: {run.run_id}")
+    print("=" * 70)
+    print(f"\n{result.raw}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import contextvars
+import os
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+import httpx
+from dotenv import load_dotenv
+from google import genai
+from google.genai import types
+
+from .scheduler import QuotaScheduler, estimate_request_tokens, get_scheduler
+from .telemetry import metrics, span
+
+load_dotenv()
+
+_active_meters = contextvars.ContextVar("gemini_usage_meters", default=())
+
+
+class UsageMeter:
+    """Accumulates Gemini token usage for calls made inside `metered()`"""
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+        self.total_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, response) -> None:
+        usage = getattr(response, "usage_metadata", None)
+        with self._lock:
+            self.requests += 1
+            if usage is not None:
+                self.prompt_tokens += usage.prompt_token_count or 0
+                self.response_tokens += usage.candidates_token_count or 0
+                self.total_tokens += usage.total_token_count or 0
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "prompt_tokens": self.prompt_tokens,
+            "response_tokens": self.response_tokens,
+            "total_tokens": self.total_tokens,
+        }
+
+
+@contextmanager
+def metered():
+    """Record token usage of every Gemini call made in this context"""
+    meter = UsageMeter()
+    token = _active_meters.set(_active_meters.get() + (meter,))
+    try:
+        yield meter
+    finally:
+        _active_meters.reset(token)
+
+
+def _record_usage(response) -> None:
+    for meter in _active_meters.get():
+        meter.record(response)
+
+
+def _payload_bytes(contents) -> int:
+    """Approximate request payload size: prompt text plus inline image bytes"""
+    if isinstance(contents, str):
+        return len(contents.encode("utf-8"))
+    if isinstance(contents, (list, tuple)):
+        return sum(_payload_bytes(c) for c in contents)
+    inline = getattr(contents, "inline_data", None)
+    if inline is not None and inline.data:
+        return len(inline.data)
+    text = getattr(contents, "text", None)
+    return len(text.encode("utf-8")) if text else 0
+
+
+@contextmanager
+def _traced_call(model: str, contents, streamed: bool):
+    """Span and metrics around one generate_content call"""
+    bytes_in = _payload_bytes(contents)
+    with span("gemini.generate_content", model=model, streamed=streamed, bytes_in=bytes_in) as call_span:
+        holder = {}
+        try:
+            yield holder
+        except Exception:
+            metrics.inc("ux_gemini_requests_total", model=model, status="error")
+            raise
+
+        response = holder.get("response")
+        usage = getattr(response, "usage_metadata", None)
+        bytes_out = len((response.text or "").encode("utf-8")) if response is not None else 0
+        call_span.set(gemini_requests=1, bytes_out=bytes_out)
+        metrics.inc("ux_gemini_requests_total", model=model, status="ok")
+        metrics.inc("ux_gemini_bytes_total", bytes_in, model=model, direction="in")
+        metrics.inc("ux_gemini_bytes_total", bytes_out, model=model, direction="out")
+        if usage is not None:
+            prompt_tokens = usage.prompt_token_count or 0
+            response_tokens = usage.candidates_token_count or 0
+            call_span.set(
+                prompt_tokens=prompt_tokens,
+                response_tokens=response_tokens,
+                total_tokens=usage.total_token_count or 0,
+            )
+            metrics.inc("ux_gemini_tokens_total", prompt_tokens, model=model, type="prompt")
+            metrics.inc("ux_gemini_tokens_total", response_tokens, model=model, type="response")
+
+
+class StreamedResponse:
+    """The concatenated result of a streamed generate_content call"""
+
+    def __init__(self, text: str, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class GeminiClientProvider:
+    """
+    Owns a single Gemini client with pooled keep-alive connections.
+
+    The sync client and its `aio` counterpart are created lazily on first use
+    and shared by every tool call, so each pipeline stage reuses the same
+    HTTP connections instead of opening new ones. Every call is admitted by
+    the quota scheduler, the process-wide one unless another is given.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        timeout: float = 120.0,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 60.0,
+        base_url: Optional[str] = None,
+        scheduler: Optional[QuotaScheduler] = None,
+    ):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.base_url = base_url
+        self._scheduler = scheduler
+        self._client = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "GeminiClientProvider":
+        return cls(
+            api_key=os.getenv("GEMINI_API_KEY"),
+            timeout=float(os.getenv("GEMINI_TIMEOUT", 120)),
+            max_connections=int(os.getenv("GEMINI_MAX_CONNECTIONS", 20)),
+            max_keepalive_connections=int(os.getenv("GEMINI_MAX_KEEPALIVE", 10)),
+            keepalive_expiry=float(os.getenv("GEMINI_KEEPALIVE_EXPIRY", 60)),
+            base_url=os.getenv("GEMINI_BASE_URL"),
+        )
+
+    def _http_options(self) -> types.HttpOptions:
+        limits = httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        return types.HttpOptions(
+            base_url=self.base_url,
+            timeout=int(self.timeout * 1000),
+            client_args={"limits": limits},
+            async_client_args={"limits": limits},
+        )
+
+    @property
+    def client(self) -> genai.Client:
+        """The shared synchronous client"""
+        with self._lock:
+            if self._client is None:
+                if not self.api_key:
+                    raise ValueError("GEMINI_API_KEY not set in .env")
+                self._client = genai.Client(api_key=self.api_key, http_options=self._http_options())
+            return self._client
+
+    @property
+    def scheduler(self) -> QuotaScheduler:
+        return self._scheduler or get_scheduler()
+
+    @property
+    def aio(self):
+        """The shared asynchronous client, backed by the same connection settings"""
+        return self.client.aio
+
+    def generate_content(self, model: str, contents, on_text=None, **kwargs):
+        """
+        Call models.generate_content on the pooled client.
+
+        When on_text is given the response is streamed through
+        generate_content_stream, on_text is called with every text chunk as
+        it arrives, and the chunks are joined into a StreamedResponse.
+
+        The call waits for quota and is retried on 429, 5xx and network
+        errors; a stream is only retried before it has produced any text.
+        """
+        emitted = []
+
+        def attempt():
+            with _traced_call(model, contents, streamed=on_text is not None) as call:
+                if on_text is None:
+                    response = self.client.models.generate_content(model=model, contents=contents, **kwargs)
+                else:
+                    chunks = []
+                    usage = None
+                    for chunk in self.client.models.generate_content_stream(model=model, contents=contents, **kwargs):
+                        if chunk.text:
+                            chunks.append(chunk.text)
+                            emitted.append(True)
+                            on_text(chunk.text)
+                        usage = chunk.usage_metadata or usage
+                    response = StreamedResponse("".join(chunks), usage)
+                call["response"] = response
+            return response
+
+        tokens = estimate_request_tokens(contents, kwargs.get("config"))
+        response = self.scheduler.call(model, tokens, attempt, retry_allowed=lambda: not emitted)
+        _record_usage(response)
+        return response
+
+    async def agenerate_content(self, model: str, contents, **kwargs):
+        """Call aio.models.generate_content on the pooled client, within the quota"""
+
+        async def attempt():
+            with _traced_call(model, contents, streamed=False) as call:
+                response = await self.aio.models.generate_content(model=model, contents=contents, **kwargs)
+                call["response"] = response
+            return response
+
+        tokens = estimate_request_tokens(contents, kwargs.get("config"))
+        response = await self.scheduler.acall(model, tokens, attempt)
+        _record_usage(response)
+        return response
+
+    def close(self) -> None:
+        """Close pooled connections; the next call opens a fresh client"""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+_default_provider = None
+_default_provider_lock = threading.Lock()
+
+
+def get_client_provider() -> GeminiClientProvider:
+    """Return the process-wide provider, creating it from the environment"""
+    global _default_provider
+    with _default_provider_lock:
+        if _default_provider is None:
+            _default_provider = GeminiClientProvider.from_env()
+        return _default_provider
+
+
+def set_client_provider(provider: GeminiClientProvider) -> None:
+    """Replace the process-wide provider, e.g. in tests or benchmarks"""
+    global _default_provider
+    with _default_provider_lock:
+        _default_provider = provider
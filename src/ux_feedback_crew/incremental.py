@@ -0,0 +1,455 @@
+"""
+Incremental re-evaluation of a new version of an already evaluated screen.
+
+The previous evaluation is found by screen key or perceptual hash. The
+grayscale signature grids of both versions are compared to find the bands
+of the screen that changed; only those bands are re-analysed, in full, only the
+heuristics that can be affected by the changed components are re-checked,
+and the results are merged into the previous report together with a list
+of resolved, introduced and unchanged violations.
+"""
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from google.genai import types
+from PIL import Image, ImageChops
+
+from .compaction import compact_context
+from .gemini_client import GeminiClientProvider, get_client_provider, metered
+from .knowledge import get_heuristics_index
+from .local_analysis import analyze_pixels, apply_measurements, local_analysis_enabled, split_measurements
+from .preprocess import (
+    SIGNATURE_GRID,
+    DecodedImage,
+    PreprocessSettings,
+    decode_image,
+    encode_image,
+    perceptual_hash,
+    signature_grid,
+)
+from .schemas import FeedbackReport, HeuristicEvaluation, MeasuredVisionAnalysis, RegionAnalysis
+from .store import get_store, record_stage, recording_run, remember_screen
+from .routing import generate_routed
+from .telemetry import current_span, metrics, span
+from .tools.heuristic_tool import (
+    build_prompt,
+    generate_evaluation,
+    load_heuristics,
+    merge_evaluations,
+    normalize_text,
+    with_measured_violations,
+)
+from .tools.feedback_tool import run_feedback_generation
+
+metrics.describe("ux_incremental_runs_total", "Incremental evaluations by outcome (unchanged, incremental, full)")
+
+# Screen bands by the share of the height they cover; component positions use the same words
+BANDS = (("top", 0.0, 1 / 3), ("middle", 1 / 3, 2 / 3), ("bottom", 2 / 3, 1.0))
+
+# Other position words the vision model uses for each band
+BAND_SYNONYMS = {
+    "header": "top", "upper": "top",
+    "center": "middle", "centre": "middle", "central": "middle",
+    "footer": "bottom", "lower": "bottom",
+}
+
+# Grayscale difference of a signature cell that counts as changed
+CELL_THRESHOLD = 16
+
+
+def max_changed_fraction() -> float:
+    """Share of changed cells above which a full evaluation is cheaper"""
+    return float(os.getenv("INCREMENTAL_MAX_CHANGED", 0.5))
+
+
+def max_phash_distance() -> int:
+    """Largest perceptual hash distance still treated as the same screen"""
+    return int(os.getenv("INCREMENTAL_MAX_DISTANCE", 10))
+
+
+@dataclass
+class ChangedRegion:
+    """
+    A band of the screen with changed pixels, as a box in original pixels.
+
+    The box spans the whole band rather than the changed cells, so every
+    component in the band is re-detected, not just the ones that changed.
+    """
+
+    band: str
+    box: tuple
+
+
+@dataclass
+class IncrementalResult:
+    """Outputs of an incremental evaluation and how they differ from the previous one"""
+
+    mode: str
+    previous_evaluation_id: Optional[str]
+    vision: str
+    heuristics: str
+    feedback: str
+    duration: float
+    changed_fraction: float = 0.0
+    regions: list = field(default_factory=list)
+    changes: dict = field(default_factory=dict)
+    usage: dict = field(default_factory=dict)
+
+    @property
+    def raw(self) -> str:
+        """The feedback report, matching PipelineResult.raw"""
+        return self.feedback
+
+    def summary(self) -> dict:
+        return {
+            "mode": self.mode,
+            "previous_evaluation_id": self.previous_evaluation_id,
+            "changed_fraction": round(self.changed_fraction, 3),
+            "changed_regions": [region.band for region in self.regions],
+            "resolved": len(self.changes.get("resolved", [])),
+            "introduced": len(self.changes.get("introduced", [])),
+            "unchanged": len(self.changes.get("unchanged", [])),
+            "duration": round(self.duration, 3),
+        }
+
+
+def changed_regions(previous: bytes, current: bytes, size: tuple, grid: tuple = SIGNATURE_GRID):
+    """
+    Compare two signature grids and locate the changed bands.
+
+    Args:
+        previous: Signature grid of the earlier version
+        current: Signature grid of the new version
+        size: Pixel size of the new version, to scale boxes to
+        grid: Columns and rows of both grids
+
+    Returns:
+        (fraction of changed cells, list of ChangedRegion)
+    """
+    columns, rows = grid
+    diff = ImageChops.difference(Image.frombytes("L", grid, previous), Image.frombytes("L", grid, current))
+    cells = list(diff.getdata())
+    changed = [(i % columns, i // columns) for i, value in enumerate(cells) if value > CELL_THRESHOLD]
+
+    width, height = size
+    regions = []
+    for band, start, end in BANDS:
+        if any(start * rows <= y < end * rows for _, y in changed):
+            regions.append(ChangedRegion(band, (0, round(start * height), width, round(end * height))))
+    return len(changed) / len(cells), regions
+
+
+def band_of(component: dict) -> Optional[str]:
+    """The band named by a component's position, or None for e.g. full width"""
+    words = re.findall(r"[a-z]+", str(component.get("position", "")).lower())
+    for band, _, _ in BANDS:
+        if band in words:
+            return band
+    return next((BAND_SYNONYMS[word] for word in words if word in BAND_SYNONYMS), None)
+
+
+def _identity(component: dict) -> tuple:
+    return normalize_text(component.get("type", "")), normalize_text(component.get("text", ""))
+
+
+def _appearance(component: dict) -> tuple:
+    color, size = normalize_text(component.get("color", "")), normalize_text(component.get("size", ""))
+    return (*_identity(component), color, size)
+
+
+def _analyze_regions(decoded: DecodedImage, regions: list, provider: GeminiClientProvider) -> RegionAnalysis:
+    # One request carrying a crop of every changed band
+    settings = PreprocessSettings.from_env()
+    contents = [f"""
+Analyze these changed regions of a mobile UI screenshot. Each image is one
+region; its label says which band of the screen it comes from.
+
+List every UI component visible in the regions. Set each component's
+"position" to the label of the region it appears in (top/middle/bottom).
+
+Return ONLY valid JSON:
+
+{{
+  "components": [
+    {{
+      "type": "button/text_input/image/label/icon/etc",
+      "text": "visible text if any",
+      "position": "top/middle/bottom",
+      "color": "describe color",
+      "size": "small/medium/large"
+    }}
+  ],
+  "accessibility_observations": ["list issues in these regions"]
+}}
+"""]
+    for region in regions:
+        crop = DecodedImage(decoded.image.crop(region.box), decoded.fingerprint, decoded.original_bytes)
+        prepared = encode_image(crop, settings)
+        contents.append(f"Region: {region.band}")
+        contents.append(types.Part.from_bytes(data=prepared.data, mime_type=prepared.mime_type))
+
+    return generate_routed(provider, stage="vision", contents=contents, schema=RegionAnalysis)
+
+
+def _merge_vision(previous: dict, regions: RegionAnalysis, bands: set) -> tuple:
+    """
+    Replace the components of the re-analysed bands with the new ones.
+
+    Components whose position names no band are kept unless they were
+    re-detected, matched on type and text, so they are not duplicated.
+
+    Returns:
+        (merged vision dict, components that were added, removed or changed
+        their color or size)
+    """
+    fresh = [c.model_dump() for c in regions.components]
+    fresh_identities = {_identity(c) for c in fresh}
+    kept, replaced = [], []
+    for component in previous.get("components", []):
+        band = band_of(component)
+        if band in bands or (band is None and _identity(component) in fresh_identities):
+            replaced.append(component)
+        else:
+            kept.append(component)
+
+    # Re-detected components that look the same are not changes
+    before = {_appearance(c) for c in replaced}
+    after = {_appearance(c) for c in fresh}
+    changed = [c for c in replaced if _appearance(c) not in after] + [c for c in fresh if _appearance(c) not in before]
+
+    merged = {
+        **previous,
+        "components": kept + fresh,
+        "accessibility_observations": list(dict.fromkeys(
+            previous.get("accessibility_observations", []) + regions.accessibility_observations
+        )),
+    }
+    return MeasuredVisionAnalysis.model_validate(merged).model_dump(), changed
+
+
+def _component_terms(components: list) -> set:
+    terms = set()
+    for component in components:
+        for value in (component.get("type"), component.get("text")):
+            term = normalize_text(str(value or "").replace("_", " "))
+            if term:
+                terms.add(term)
+    return terms
+
+
+def affected_heuristics(heuristics: list, previous_evaluation: dict, changed_components: list) -> list:
+    """
+    Heuristics whose result can change with the changed components.
+
+    A heuristic is affected if one of its previous violations names a changed
+    component, or if its description, mobile considerations or evaluation
+    criteria mention one of the changed component types.
+    """
+    terms = _component_terms(changed_components)
+    if not terms:
+        return []
+
+    ids = set()
+    for violation in previous_evaluation.get("violations", []):
+        named = " ".join(normalize_text(c) for c in violation.get("affected_components", []))
+        if any(term in named for term in terms):
+            ids.add(violation.get("heuristic_id"))
+
+    component_types = {normalize_text(str(c.get("type", "")).replace("_", " ")) for c in changed_components} - {""}
+    for heuristic in heuristics:
+        text = normalize_text(" ".join([
+            heuristic.get("name", ""),
+            heuristic.get("description", ""),
+            *heuristic.get("mobile_considerations", []),
+            *heuristic.get("evaluation_criteria", []),
+        ]))
+        if any(component_type in text for component_type in component_types):
+            ids.add(heuristic["id"])
+
+    return [h for h in heuristics if h["id"] in ids]
+
+
+def _same_violation(a: dict, b: dict) -> bool:
+    if a.get("heuristic_id") != b.get("heuristic_id"):
+        return False
+    if normalize_text(a.get("issue", "")) == normalize_text(b.get("issue", "")):
+        return True
+    components_a = {normalize_text(c) for c in a.get("affected_components", [])} - {""}
+    components_b = {normalize_text(c) for c in b.get("affected_components", [])} - {""}
+    return bool(components_a & components_b)
+
+
+def diff_violations(previous: list, current: list) -> dict:
+    """Split violations into resolved, introduced and unchanged"""
+    unmatched = list(current)
+    resolved, unchanged = [], []
+    for violation in previous:
+        match = next((v for v in unmatched if _same_violation(violation, v)), None)
+        if match is None:
+            resolved.append(violation)
+        else:
+            unmatched.remove(match)
+            unchanged.append(match)
+    return {"resolved": resolved, "introduced": unmatched, "unchanged": unchanged}
+
+
+def _reevaluate(vision: dict, previous: dict, heuristics: list, provider: GeminiClientProvider) -> dict:
+    vision_text, measurements = split_measurements(json.dumps(vision))
+    if not heuristics:
+        return with_measured_violations(previous, measurements)
+
+    ids = {h["id"] for h in heuristics}
+    names = {normalize_text(h["name"]) for h in heuristics}
+    outside = {
+        "violations": [v for v in previous.get("violations", []) if v.get("heuristic_id") not in ids],
+        "strengths": [
+            s for s in previous.get("strengths", []) if normalize_text(s.get("heuristic_name", "")) not in names
+        ],
+        "overall_score": previous.get("overall_score"),
+    }
+
+    vision_text = compact_context("heuristics", vision=vision_text).texts["vision"]
+    scope = ", ".join(f"#{h['id']} {h['name']}" for h in heuristics)
+    prompt = build_prompt(
+        vision_text,
+        get_heuristics_index().retrieve_for(vision, heuristic_ids=ids).text,
+        f"ONLY these Nielsen heuristics: {scope}. Report violations and strengths for these heuristics only",
+        measurements
+    )
+    partial = generate_evaluation(provider, prompt).model_dump()
+
+    total = max(len(load_heuristics()), len(heuristics) + 1)
+    merged = merge_evaluations([(outside, total - len(heuristics)), (partial, len(heuristics))])
+    return HeuristicEvaluation.model_validate(with_measured_violations(merged, measurements)).model_dump()
+
+
+def _previous_outputs(evaluation: dict) -> Optional[dict]:
+    stages = get_store().stage_outputs(evaluation["evaluation_id"])
+    try:
+        return {
+            "vision": MeasuredVisionAnalysis.model_validate_json(stages["vision"]).model_dump(),
+            "heuristics": HeuristicEvaluation.model_validate_json(stages["heuristics"]).model_dump(),
+            "feedback": FeedbackReport.model_validate_json(evaluation["report"]).model_dump_json(indent=2),
+        }
+    except (KeyError, ValueError):
+        return None
+
+
+def _full_run(screenshot_path: str, provider, previous_id, started, meter, reason: str) -> IncrementalResult:
+    from .pipeline import run_fast_pipeline
+
+    print(f"⚠ Running a full evaluation: {reason}")
+    metrics.inc("ux_incremental_runs_total", outcome="full")
+    result = run_fast_pipeline(screenshot_path, provider)
+    return IncrementalResult(
+        mode="full",
+        previous_evaluation_id=previous_id,
+        vision=result.vision.raw,
+        heuristics=result.heuristics.raw,
+        feedback=result.feedback.raw,
+        duration=time.perf_counter() - started,
+        usage=meter.as_dict(),
+    )
+
+
+def run_incremental(
+    screenshot_path: str,
+    screen_key: str = None,
+    provider: GeminiClientProvider = None
+) -> IncrementalResult:
+    """
+    Evaluate a new version of a screen by updating its previous evaluation.
+
+    Falls back to the fast pipeline when no previous evaluation is found,
+    the screen's proportions changed, or more than INCREMENTAL_MAX_CHANGED
+    of it changed.
+
+    Args:
+        screenshot_path: Path to the new version of the screenshot
+        screen_key: Optional stable identifier of the screen, e.g. "checkout/payment";
+            without it the previous version is found by perceptual hash
+        provider: Gemini client provider, the process-wide one if omitted
+
+    Returns:
+        IncrementalResult with the merged stage outputs and the violation changes
+    """
+    provider = provider or get_client_provider()
+    started = time.perf_counter()
+
+    with metered() as meter, span("pipeline.incremental", screenshot=screenshot_path), \
+            recording_run(screenshot_path=screenshot_path, screen_key=screen_key):
+        decoded = decode_image(screenshot_path)
+        phash = perceptual_hash(decoded.image)
+        signature = signature_grid(decoded.image)
+        remember_screen(decoded.fingerprint, phash, signature, decoded.original_size)
+
+        previous = get_store().find_previous_evaluation(phash, screen_key, max_distance=max_phash_distance())
+        if previous is None:
+            return _full_run(screenshot_path, provider, None, started, meter, "no previous evaluation of this screen")
+        outputs = _previous_outputs(previous)
+        if outputs is None:
+            return _full_run(screenshot_path, provider, previous["evaluation_id"], started, meter,
+                             "the previous evaluation has no structured stage outputs")
+
+        current_span().set(previous_evaluation=previous["evaluation_id"], phash_distance=previous["distance"])
+        width, height = decoded.original_size
+        if previous["width"] and abs(previous["width"] / previous["height"] - width / height) > 0.02:
+            return _full_run(screenshot_path, provider, previous["evaluation_id"], started, meter,
+                             "the screen's proportions changed")
+
+        fraction, regions = changed_regions(previous["signature"], signature, decoded.original_size)
+        current_span().set(changed_fraction=round(fraction, 3), changed_regions=len(regions))
+        if fraction > max_changed_fraction():
+            return _full_run(screenshot_path, provider, previous["evaluation_id"], started, meter,
+                             f"{fraction:.0%} of the screen changed")
+
+        if previous["image_hash"] == decoded.fingerprint or not regions:
+            vision, heuristics, feedback = outputs["vision"], outputs["heuristics"], outputs["feedback"]
+            changes = diff_violations(heuristics["violations"], heuristics["violations"])
+            mode = "unchanged"
+        else:
+            bands = {region.band for region in regions}
+            analysis = _analyze_regions(decoded, regions, provider)
+            vision, changed_components = _merge_vision(outputs["vision"], analysis, bands)
+            if local_analysis_enabled():
+                vision = apply_measurements(vision, analyze_pixels(decoded.image))
+
+            affected = affected_heuristics(load_heuristics(), outputs["heuristics"], changed_components)
+            current_span().set(heuristics=len(affected))
+            heuristics = _reevaluate(vision, outputs["heuristics"], affected, provider)
+            changes = diff_violations(outputs["heuristics"]["violations"], heuristics["violations"])
+
+            # The feedback only needs rewriting if the set of violations moved
+            if changes["resolved"] or changes["introduced"]:
+                feedback = run_feedback_generation(json.dumps(vision), json.dumps(heuristics), provider)
+            else:
+                feedback = outputs["feedback"]
+            mode = "incremental"
+
+        vision_text = json.dumps(vision, indent=2, ensure_ascii=False)
+        heuristics_text = json.dumps(heuristics, indent=2, ensure_ascii=False)
+        record_stage("vision", vision_text, image_hash=decoded.fingerprint)
+        record_stage("heuristics", heuristics_text)
+        if feedback is outputs["feedback"]:
+            record_stage("feedback", feedback)
+        record_stage("changes", json.dumps(changes, indent=2, ensure_ascii=False))
+
+    metrics.inc("ux_incremental_runs_total", outcome=mode)
+    result = IncrementalResult(
+        mode=mode,
+        previous_evaluation_id=previous["evaluation_id"],
+        vision=vision_text,
+        heuristics=heuristics_text,
+        feedback=feedback,
+        duration=time.perf_counter() - started,
+        changed_fraction=fraction,
+        regions=regions,
+        changes=changes,
+        usage=meter.as_dict(),
+    )
+    print(f"✓ Incremental evaluation: {result.summary()}")
+    return result
@@ -0,0 +1,261 @@
+"""
+In-memory index over the heuristics knowledge base.
+
+config/nielsen_heuristics.json is parsed once per process. Every mobile
+consideration, evaluation criterion and mobile guideline becomes an entry
+with its own set of terms. The `retrieval` section of the file maps screen
+types and component types to the terms they make relevant, so a login
+screen with text inputs pulls validation, keyboard and error material while
+a home screen pulls hierarchy and navigation material.
+
+retrieve() ranks the entries against a screen and packs the best ones under
+a token budget. Every heuristic is always listed by id and name, so all ten
+stay in scope even when none of their material made the cut.
+"""
+import json
+import math
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .compaction import estimate_tokens, minify
+from .telemetry import metrics
+
+KB_PATH = Path(__file__).parent / "config" / "nielsen_heuristics.json"
+
+# Words too common in the knowledge base to say anything about relevance
+STOPWORDS = {
+    "the", "and", "for", "are", "there", "with", "what", "when", "that", "this", "from", "users", "user",
+    "use", "clear", "easy", "easily", "all", "any", "can", "how", "into", "its", "not", "only", "their",
+}
+
+# Evaluation criteria first: they are the questions the model answers
+KIND_PRIORITY = {"evaluation_criteria": 0, "mobile_considerations": 1, "guideline": 2}
+
+
+def _stem(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def terms(text: str) -> set:
+    """Normalized, lightly stemmed words of text"""
+    words = re.findall(r"[a-z0-9]+", str(text).lower().replace("_", " "))
+    return {_stem(w) for w in words if len(w) > 2 and w not in STOPWORDS}
+
+
+def knowledge_budget() -> int:
+    """Token budget of the retrieved material, from KNOWLEDGE_BUDGET"""
+    return int(os.getenv("KNOWLEDGE_BUDGET", 700))
+
+
+@dataclass(frozen=True)
+class Entry:
+    """One retrievable line of the knowledge base"""
+
+    kind: str
+    text: str
+    terms: frozenset
+    heuristic_id: Optional[int] = None
+    category: Optional[str] = None
+    order: int = 0
+
+
+@dataclass
+class Retrieval:
+    """Knowledge selected for one evaluation"""
+
+    heuristics: List[dict]
+    guidelines: Dict[str, List[str]] = field(default_factory=dict)
+    query: set = field(default_factory=set)
+    entries: int = 0
+
+    @property
+    def text(self) -> str:
+        """Prompt text: the heuristics, then any relevant mobile guidelines"""
+        text = minify(self.heuristics)
+        if self.guidelines:
+            text += f"\n\nMOBILE GUIDELINES:\n{minify(self.guidelines)}"
+        return text
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+class HeuristicsIndex:
+    """
+    The knowledge base, parsed once and indexed by term.
+
+    Args:
+        data: Parsed contents of nielsen_heuristics.json
+    """
+
+    def __init__(self, data: dict):
+        self.heuristics = data.get("heuristics", [])
+        self.guidelines = data.get("mobile_specific_guidelines", [])
+        retrieval = data.get("retrieval", {})
+        self.screen_types = {key: terms(" ".join(words)) for key, words in retrieval.get("screen_types", {}).items()}
+        self.component_types = {key: terms(" ".join(words)) for key, words in retrieval.get("components", {}).items()}
+
+        self.entries = []
+        for heuristic in self.heuristics:
+            for kind in ("evaluation_criteria", "mobile_considerations"):
+                for text in heuristic.get(kind, []):
+                    self._add(kind, text, heuristic_id=heuristic["id"])
+        for group in self.guidelines:
+            for text in group.get("guidelines", []):
+                self._add("guideline", text, category=group["category"])
+
+        self.by_term = {}
+        for entry in self.entries:
+            for term in entry.terms:
+                self.by_term.setdefault(term, []).append(entry)
+        # Rare terms say more about relevance than ones found everywhere
+        self.weights = {term: math.log(1 + len(self.entries) / len(found)) for term, found in self.by_term.items()}
+
+        self.full_tokens = estimate_tokens(minify(self.heuristics))
+
+    def _add(self, kind: str, text: str, **where) -> None:
+        self.entries.append(Entry(kind, text, frozenset(terms(text)), order=len(self.entries), **where))
+
+    @classmethod
+    def load(cls, path: Path = KB_PATH) -> "HeuristicsIndex":
+        if not Path(path).exists():
+            return cls({})
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def query_terms(self, screen_type: str = "", component_types: Iterable[str] = ()) -> set:
+        """
+        Terms a screen makes relevant.
+
+        A screen type or component type matches a retrieval key when all of
+        the key's words appear in it, so "login/signup" matches both login
+        and signup, and "navigation_bar_item" matches navigation.
+        """
+        query = set()
+        screen = terms(screen_type)
+        for key, words in self.screen_types.items():
+            if terms(key) <= screen:
+                query |= words
+        for component_type in component_types:
+            component = terms(component_type)
+            query |= component
+            for key, words in self.component_types.items():
+                if terms(key) <= component:
+                    query |= words
+        return query
+
+    def retrieve(
+        self,
+        screen_type: str = "",
+        component_types: Iterable[str] = (),
+        heuristic_ids: Iterable[int] = None,
+        budget: int = None
+    ) -> Retrieval:
+        """
+        Select the material relevant to a screen, within a token budget.
+
+        Args:
+            screen_type: screen_type of the vision analysis
+            component_types: Types of the components on the screen
+            heuristic_ids: Restrict the result to these heuristics
+            budget: Token budget; defaults to KNOWLEDGE_BUDGET
+
+        Returns:
+            Retrieval listing every requested heuristic, with the entries
+            that share the most terms with the screen
+        """
+        budget = knowledge_budget() if budget is None else budget
+        ids = set(heuristic_ids) if heuristic_ids is not None else None
+        heuristics = [h for h in self.heuristics if ids is None or h["id"] in ids]
+        query = self.query_terms(screen_type, component_types)
+
+        scores = {}
+        for term in query:
+            for entry in self.by_term.get(term, ()):
+                if entry.heuristic_id is not None and ids is not None and entry.heuristic_id not in ids:
+                    continue
+                scores[entry] = scores.get(entry, 0.0) + self.weights[term]
+        if not scores:
+            # Nothing known about the screen: fall back to the evaluation criteria in file order
+            scores = {
+                e: 0.0 for e in self.entries
+                if e.kind == "evaluation_criteria" and (ids is None or e.heuristic_id in ids)
+            }
+        ranked = sorted(scores, key=lambda e: (-scores[e], KIND_PRIORITY[e.kind], e.order))
+
+        selected = {h["id"]: {"id": h["id"], "name": h["name"]} for h in heuristics}
+        guidelines = {}
+        used = estimate_tokens(minify(list(selected.values())))
+        taken = 0
+        for entry in ranked:
+            # Quotes, comma and, for a new key, the key name itself
+            cost = estimate_tokens(entry.text) + 2
+            if used + cost > budget:
+                continue
+            if entry.heuristic_id is not None:
+                item = selected[entry.heuristic_id]
+                if entry.kind not in item:
+                    cost += 6
+                item.setdefault(entry.kind, []).append(entry.text)
+            else:
+                if entry.category not in guidelines:
+                    cost += estimate_tokens(entry.category) + 2
+                guidelines.setdefault(entry.category, []).append(entry.text)
+            used += cost
+            taken += 1
+
+        return Retrieval(
+            heuristics=list(selected.values()),
+            guidelines=guidelines,
+            query=query,
+            entries=taken,
+        )
+
+    @staticmethod
+    def _describe(vision: dict) -> tuple:
+        # Screen type and component types of a vision analysis, or of every screen of a flow
+        screens = vision.get("screens") or [vision]
+        screen_type = " ".join(str(s.get("screen_type", "")) for s in screens)
+        component_types = [str(c.get("type", "")) for s in screens for c in s.get("components", [])]
+        return screen_type, component_types
+
+    def retrieve_for(self, vision: dict, heuristic_ids: Iterable[int] = None, budget: int = None) -> Retrieval:
+        """retrieve() for a parsed vision analysis, or a flow analysis with several screens"""
+        retrieval = self.retrieve(*self._describe(vision), heuristic_ids, budget)
+        metrics.inc("ux_context_tokens_saved_total", max(0, self.full_tokens - retrieval.tokens), stage="knowledge")
+        return retrieval
+
+    def retrieve_groups(self, vision: dict, group_size: int, budget: int = None) -> List[Retrieval]:
+        """
+        retrieve_for() split into groups of group_size heuristics, for fan-out.
+
+        Each group gets the material of its own heuristics and the guidelines
+        most relevant to the screen, within an equal share of the budget, so
+        the prompts together stay within the budget of a single prompt.
+        """
+        budget = knowledge_budget() if budget is None else budget
+        ids = [h["id"] for h in self.heuristics]
+        groups = [ids[i:i + group_size] for i in range(0, len(ids), group_size)]
+        described = self._describe(vision)
+        retrievals = [self.retrieve(*described, group, budget // max(1, len(groups))) for group in groups]
+        used = sum(r.tokens for r in retrievals)
+        metrics.inc("ux_context_tokens_saved_total", max(0, self.full_tokens - used), stage="knowledge")
+        return retrievals
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_heuristics_index() -> HeuristicsIndex:
+    """Return the process-wide index, parsing the knowledge base on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = HeuristicsIndex.load()
+        return _index
@@ -0,0 +1,375 @@
+"""
+Local pre-analysis of a decoded screenshot with NumPy.
+
+Colors, contrast and visual density can be measured exactly from the pixels,
+so they are computed here before any model call and handed to the vision
+and heuristic prompts as facts:
+
+- the palette, by quantizing every pixel to 4 bits per channel and counting
+  the bins in one pass
+- WCAG contrast ratios of the dominant foreground/background pairs, found
+  per tile as the tile's main color and the smaller colors drawn on it, and
+  whether each pair is text or a shape such as a divider, judged by how
+  long its same-color runs are
+- an edge-density map, from thresholded luminance gradients, and the share
+  of whitespace, i.e. tiles with no edges at all
+"""
+import json
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from .schemas import ContrastPair, Measurements, PaletteColor
+
+# Long edge the screenshot is reduced to before measuring; enough for 12px text
+ANALYSIS_MAX_EDGE = 1024
+
+# Square tile, in analysis pixels, used for the contrast pairs and whitespace
+TILE = 16
+
+PALETTE_SIZE = 12
+
+# Palette colors closer than this (RGB distance) are one color, e.g. steps of a gradient
+MERGE_DISTANCE = 32
+
+# Luminance step (0-255) between neighbouring pixels that counts as an edge
+EDGE_THRESHOLD = 24
+
+BANDS = (("top", 0.0, 1 / 3), ("middle", 1 / 3, 2 / 3), ("bottom", 2 / 3, 1.0))
+
+# WCAG 2.x AA thresholds for normal and for large text; the lower one is also
+# the minimum for UI components and graphics (success criterion 1.4.11)
+AA_NORMAL = 4.5
+AA_LARGE = 3.0
+
+# Same-color run, in analysis pixels, longer than any glyph stroke; ink in such
+# runs belongs to dividers, borders and filled shapes rather than text
+SHAPE_RUN = 48
+
+# Nielsen's ten heuristics have no accessibility heuristic, and filing measured
+# contrast under one of them would skew its violation counts. It is reported
+# under the knowledge base's Color and Contrast guideline instead, with an id
+# outside 1-10 so it never merges with a heuristic the model evaluated
+CONTRAST_HEURISTIC = (0, "Accessibility: color and contrast")
+
+# Start of the issue text of violations derived from measurements, so they can be replaced
+CONTRAST_ISSUE_PREFIX = "Measured contrast"
+
+
+def local_analysis_enabled() -> bool:
+    return os.getenv("LOCAL_ANALYSIS", "true").lower() == "true"
+
+
+def _to_hex(rgb) -> str:
+    return "#{:02x}{:02x}{:02x}".format(*(int(round(c)) for c in rgb))
+
+
+def relative_luminance(rgb: np.ndarray) -> np.ndarray:
+    """WCAG relative luminance of sRGB colors in the last axis, 0-255 per channel"""
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+    return linear @ np.array([0.2126, 0.7152, 0.0722])
+
+
+def contrast_ratio(luminance_a, luminance_b):
+    """WCAG contrast ratio of two relative luminances, 1 to 21"""
+    lighter = np.maximum(luminance_a, luminance_b)
+    darker = np.minimum(luminance_a, luminance_b)
+    return (lighter + 0.05) / (darker + 0.05)
+
+
+def _working_pixels(img: Image.Image) -> np.ndarray:
+    # Box-filter downscale, then crop to whole tiles
+    if max(img.size) > ANALYSIS_MAX_EDGE:
+        img = img.copy()
+        img.thumbnail((ANALYSIS_MAX_EDGE, ANALYSIS_MAX_EDGE), Image.BOX)
+    pixels = np.asarray(img.convert("RGB"), dtype=np.uint8)
+    height, width = (pixels.shape[0] // TILE) * TILE, (pixels.shape[1] // TILE) * TILE
+    return pixels[:height, :width]
+
+
+def quantize(pixels: np.ndarray) -> np.ndarray:
+    """4-bit-per-channel color bin (0-4095) of every pixel of an RGB array"""
+    quantized = (pixels >> 4).astype(np.int32)
+    return (quantized[..., 0] << 8) | (quantized[..., 1] << 4) | quantized[..., 2]
+
+
+def extract_palette(pixels: np.ndarray, size: int = PALETTE_SIZE, min_share: float = 0.001):
+    """
+    Dominant colors of an RGB array by 4-bit-per-channel quantization.
+
+    Bins closer than MERGE_DISTANCE to a more common kept color are folded
+    into it, so gradients and anti-aliasing do not crowd out real colors.
+
+    Returns:
+        (colors, shares): float array of mean RGB per kept color, most common
+        first, and the fraction of pixels in each
+    """
+    flat = pixels.reshape(-1, 3)
+    bins = quantize(flat)
+    counts = np.bincount(bins, minlength=4096)
+    # Mean color of each bin rather than its corner
+    sums = np.stack([np.bincount(bins, weights=flat[:, ch], minlength=4096) for ch in range(3)], axis=1)
+
+    order = np.argsort(counts)[::-1]
+    order = order[counts[order] / len(flat) >= min_share]
+    colors, weights = [], []
+    for b in order:
+        mean = sums[b] / counts[b]
+        if colors:
+            distances = np.sqrt(((np.array(colors) - mean) ** 2).sum(axis=1))
+            nearest = int(distances.argmin())
+            if distances[nearest] < MERGE_DISTANCE:
+                weights[nearest] += counts[b]
+                continue
+        if len(colors) == size:
+            continue
+        colors.append(mean)
+        weights.append(counts[b])
+    weights = np.array(weights, dtype=np.float64)
+    order = np.argsort(weights)[::-1]
+    return np.array(colors)[order], weights[order] / len(flat)
+
+
+def _label(pixels: np.ndarray, colors: np.ndarray) -> np.ndarray:
+    # Index of the nearest palette color of every pixel, looked up per color bin
+    centers = np.indices((16, 16, 16)).reshape(3, -1).T * 16 + 8
+    lookup = ((centers[:, None, :] - colors[None, :, :]) ** 2).sum(axis=2).argmin(axis=1)
+    return lookup[quantize(pixels)]
+
+
+def _tiles(array: np.ndarray) -> np.ndarray:
+    # (rows, cols, TILE, TILE) view of a 2-D array cropped to whole tiles
+    rows, cols = array.shape[0] // TILE, array.shape[1] // TILE
+    return array[:rows * TILE, :cols * TILE].reshape(rows, TILE, cols, TILE).swapaxes(1, 2)
+
+
+def edge_map(pixels: np.ndarray) -> np.ndarray:
+    """Boolean map of pixels whose luminance differs sharply from the right or lower neighbour"""
+    gray = pixels.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    edges = np.zeros(gray.shape, dtype=bool)
+    edges[:, :-1] |= np.abs(np.diff(gray, axis=1)) > EDGE_THRESHOLD
+    edges[:-1, :] |= np.abs(np.diff(gray, axis=0)) > EDGE_THRESHOLD
+    return edges
+
+
+def _run_lengths(labels: np.ndarray) -> np.ndarray:
+    # Length of the longer of the horizontal and vertical same-color runs through each pixel
+    def horizontal(array):
+        starts = np.ones(array.shape, dtype=bool)
+        starts[:, 1:] = array[:, 1:] != array[:, :-1]
+        run_ids = np.cumsum(starts.ravel()) - 1
+        return np.bincount(run_ids)[run_ids].reshape(array.shape)
+    return np.maximum(horizontal(labels), horizontal(labels.T).T)
+
+
+def _contrast_pairs(labels: np.ndarray, edges: np.ndarray, colors: np.ndarray, max_pairs: int = 6) -> List[ContrastPair]:
+    k = len(colors)
+    label_tiles = _tiles(labels).reshape(-1, TILE * TILE)
+    shape_tiles = _tiles(_run_lengths(labels) >= SHAPE_RUN).reshape(-1, TILE * TILE)
+    edge_tiles = _tiles(edges).reshape(-1, TILE * TILE).any(axis=1)
+    rows = labels.shape[0] // TILE
+    tile_rows = np.repeat(np.arange(rows), labels.shape[1] // TILE)
+
+    # Pixel count of every palette color in every tile
+    offsets = np.arange(len(label_tiles))[:, None] * k
+    counts = np.bincount((label_tiles + offsets).ravel(), minlength=len(label_tiles) * k).reshape(-1, k)
+    background = counts.argmax(axis=1)
+
+    # The foreground is the smaller color drawn on the tile's background with the
+    # strongest contrast, i.e. the ink of text or an icon; lighter anti-aliasing
+    # fringes around it are ignored
+    luminance = relative_luminance(colors)
+    contrast = contrast_ratio(luminance[:, None], luminance[None, :])
+    share = counts / (TILE * TILE)
+    candidate = (share >= 0.03) & (share <= 0.45) & edge_tiles[:, None]
+    candidate[np.arange(len(counts)), background] = False
+    score = np.where(candidate, contrast[background], 0.0)
+    tile_index = np.nonzero(score.max(axis=1) > 0)[0]
+    if not len(tile_index):
+        return []
+    foreground = score[tile_index].argmax(axis=1)
+
+    directed = np.bincount(
+        background[tile_index] * k + foreground, weights=counts[tile_index, foreground], minlength=k * k
+    ).reshape(k, k)
+    # A color pair counts once, named in the orientation it mostly appears in
+    weights = np.triu(directed + directed.T, 1).ravel()
+    pair_ids = np.minimum(background[tile_index], foreground) * k + np.maximum(background[tile_index], foreground)
+    total = labels.size
+
+    # Foreground pixels in short runs, i.e. glyph strokes, per pair
+    stroke_pixels = ((label_tiles[tile_index] == foreground[:, None]) & ~shape_tiles[tile_index]).sum(axis=1)
+    strokes = np.bincount(pair_ids, weights=stroke_pixels, minlength=k * k)
+
+    pairs = []
+    for pair_id in np.argsort(weights)[::-1][:max_pairs]:
+        if weights[pair_id] / total < 0.001:
+            break
+        a, b = divmod(int(pair_id), k)
+        bg, fg = (a, b) if directed[a, b] >= directed[b, a] else (b, a)
+        ratio = float(contrast[fg, bg])
+        row = np.bincount(tile_rows[tile_index[pair_ids == pair_id]], minlength=rows).argmax()
+        band = next(name for name, start, end in BANDS if row < end * rows)
+        pairs.append(ContrastPair(
+            foreground=_to_hex(colors[fg]),
+            background=_to_hex(colors[bg]),
+            ratio=round(ratio, 2),
+            share=round(float(weights[pair_id] / total), 4),
+            band=band,
+            passes_aa=ratio >= AA_NORMAL,
+            passes_aa_large=ratio >= AA_LARGE,
+            text=bool(strokes[pair_id] >= 0.5 * weights[pair_id]),
+        ))
+    return pairs
+
+
+def _density_label(whitespace: float) -> str:
+    if whitespace >= 0.55:
+        return "spacious"
+    if whitespace >= 0.3:
+        return "comfortable"
+    return "tight"
+
+
+def analyze_pixels(img: Image.Image) -> Measurements:
+    """
+    Measure palette, contrast pairs and density of a decoded screenshot.
+
+    Args:
+        img: Upright RGB screenshot, e.g. DecodedImage.image
+
+    Returns:
+        Measurements to attach to the vision analysis
+    """
+    pixels = _working_pixels(img)
+    if pixels.size == 0:
+        return Measurements()
+
+    colors, shares = extract_palette(pixels)
+    labels = _label(pixels, colors)
+    edges = edge_map(pixels)
+
+    rows = pixels.shape[0]
+    density_by_band = {
+        name: round(float(edges[int(start * rows):int(end * rows)].mean()), 3)
+        for name, start, end in BANDS
+    }
+    whitespace = float((~_tiles(edges).any(axis=(2, 3))).mean())
+
+    return Measurements(
+        palette=[PaletteColor(hex=_to_hex(c), share=round(float(s), 3)) for c, s in zip(colors, shares)],
+        background=_to_hex(colors[0]),
+        contrast_pairs=_contrast_pairs(labels, edges, colors),
+        edge_density=round(float(edges.mean()), 3),
+        whitespace_ratio=round(whitespace, 3),
+        density_by_band=density_by_band,
+        overall_density=_density_label(whitespace),
+    )
+
+
+def contrast_observations(measurements: Measurements) -> List[str]:
+    """
+    Accessibility observations for measured text pairs below WCAG AA and
+    shapes below the 3:1 minimum for UI components.
+    """
+    observations = []
+    for pair in measurements.contrast_pairs:
+        measured = f"{CONTRAST_ISSUE_PREFIX} {pair.ratio}:1 of {pair.foreground} on {pair.background} ({pair.band})"
+        if pair.text and not pair.passes_aa:
+            observations.append(
+                f"{measured} is below WCAG AA {'for all text' if not pair.passes_aa_large else 'for normal-size text'}"
+            )
+        elif not pair.text and not pair.passes_aa_large:
+            observations.append(
+                f"{measured}, drawn as lines or shapes, is below the WCAG {AA_LARGE}:1 minimum "
+                f"if it marks a control or conveys information"
+            )
+    return observations
+
+
+def apply_measurements(vision: dict, measurements: Measurements) -> dict:
+    """
+    Overwrite the measurable parts of a vision analysis with measured values.
+
+    The color scheme and density come from the pixels, and contrast
+    observations are replaced by the measured ones; everything else the
+    model reported is kept.
+    """
+    text_colors = list(dict.fromkeys(p.foreground for p in measurements.contrast_pairs))
+    observations = [
+        o for o in vision.get("accessibility_observations", [])
+        if "contrast" not in o.lower()
+    ]
+    bands = ", ".join(f"{band} {value:.0%}" for band, value in measurements.density_by_band.items())
+    return {
+        **vision,
+        "color_scheme": {
+            "primary_colors": [c.hex for c in measurements.palette if c.hex != measurements.background][:4],
+            "background": measurements.background,
+            "text_colors": text_colors,
+        },
+        "spacing_and_density": {
+            **vision.get("spacing_and_density", {}),
+            "overall_density": measurements.overall_density,
+            "element_spacing": f"{measurements.whitespace_ratio:.0%} whitespace; edges {bands}",
+        },
+        "accessibility_observations": contrast_observations(measurements) + observations,
+        "measurements": measurements.model_dump(),
+    }
+
+
+def split_measurements(vision_analysis: str) -> Tuple[str, Optional[Measurements]]:
+    """
+    Take the measurements out of a vision analysis JSON string.
+
+    The measured contrast observations are dropped with them, since the
+    heuristic stage reports those as violations itself.
+
+    Returns:
+        (vision analysis text, Measurements or None if it has none)
+    """
+    try:
+        data = json.loads(vision_analysis)
+    except (json.JSONDecodeError, TypeError):
+        return vision_analysis, None
+    if not isinstance(data, dict) or not data.get("measurements"):
+        return vision_analysis, None
+
+    measurements = Measurements.model_validate(data.pop("measurements"))
+    data["accessibility_observations"] = [
+        o for o in data.get("accessibility_observations", [])
+        if not o.startswith(CONTRAST_ISSUE_PREFIX)
+    ]
+    return json.dumps(data, ensure_ascii=False), measurements
+
+
+def contrast_violations(measurements: Measurements) -> List[dict]:
+    """
+    Heuristic violations for measured text pairs below WCAG AA, independent of the model.
+
+    Shapes are left to contrast_observations: the pixels do not tell a
+    decorative divider from the border of a control.
+    """
+    heuristic_id, heuristic_name = CONTRAST_HEURISTIC
+    violations = []
+    for pair in measurements.contrast_pairs:
+        if pair.passes_aa or not pair.text:
+            continue
+        violations.append({
+            "heuristic_id": heuristic_id,
+            "heuristic_name": heuristic_name,
+            "severity": "high" if not pair.passes_aa_large else "medium",
+            "issue": (
+                f"{CONTRAST_ISSUE_PREFIX} {pair.ratio}:1 of {pair.foreground} on {pair.background} "
+                f"in the {pair.band} of the screen is below the WCAG AA minimum of "
+                f"{AA_NORMAL}:1 for text{'' if pair.passes_aa_large else f' and {AA_LARGE}:1 for large text'}"
+            ),
+            "affected_components": [f"{pair.foreground} elements on {pair.background}"],
+            "improvement_suggestion": (
+                f"Darken or lighten {pair.foreground} until it reaches at least {AA_NORMAL}:1 against {pair.background}"
+            ),
+        })
+    return violations
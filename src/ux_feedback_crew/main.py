@@ -1,10 +1,13 @@
 #!/usr/bin/env python
+import time
+
+_STARTED = time.perf_counter()
+
+import os
 import sys
 from pathlib import Path
 from dotenv import load_dotenv
 
-from ux_feedback_crew.crew import UxFeedbackCrew
-
 # Load environment variables
 load_dotenv()
 
@@ -32,17 +35,37 @@ def run():
     print("🚀 UX FEEDBACK CREW - MULTI-AGENT SYSTEM")
     print("=" * 70)
     print(f"\n📸 Analyzing screenshot: {screenshot_path}\n")
-    
+
+    # Hand the run to a warm worker when one is listening
+    from ux_feedback_crew.worker import ping, send
+
+    if ping():
+        startup = time.perf_counter() - _STARTED
+        print(f"⚡ Sending to the warm worker (startup {startup:.2f}s)")
+        result = send({"command": "evaluate", "screenshot": os.path.abspath(screenshot_path), "mode": "crew"})
+        print("\n" + "=" * 70)
+        print(f"✅ ANALYSIS COMPLETE in {result['duration']}s! Evaluation: {result['evaluation_id']}")
+        print("=" * 70)
+        print(f"\n{result['report']}\n")
+        return
+
+    from ux_feedback_crew.crew import UxFeedbackCrew
+    from ux_feedback_crew.store import record_evaluation, recording_run
+    from ux_feedback_crew.telemetry import traced_kickoff
+
     # Initialize and run crew
     inputs = {
         'screenshot_path': screenshot_path
     }
     
-    crew = UxFeedbackCrew().crew()
-    result = crew.kickoff(inputs=inputs)
+    crew = UxFeedbackCrew().evaluation_crew()
+    print(f"⏱ Startup {time.perf_counter() - _STARTED:.2f}s (run `python -m ux_feedback_crew.worker serve` to keep it warm)")
+    with recording_run(screenshot_path=screenshot_path) as run:
+        result = traced_kickoff(crew, "evaluation", inputs=inputs)
+        record_evaluation(result.raw)
     
     print("\n" + "=" * 70)
-    print("✅ ANALYSIS COMPLETE!")
+    print(f"✅ ANALYSIS COMPLETE! Evaluation: {run.run_id}")
     print("=" * 70)
     print(f"\n{result}\n")
 
@@ -51,6 +74,8 @@ def train():
     """
     Train the crew for a given number of iterations.
     """
+    from ux_feedback_crew.crew import UxFeedbackCrew
+
     inputs = {
         'screenshot_path': 'data/screenshots/test_image.png'
     }
@@ -63,5 +88,14 @@ def train():
         raise Exception(f"An error occurred while training the crew: {e}")
 
 
+def batch():
+    """
+    Evaluate every screenshot in a directory or glob with bounded concurrency.
+    """
+    from ux_feedback_crew.batch import main as batch_main
+
+    batch_main(sys.argv[1:])
+
+
 if __name__ == "__main__":
     run()
\ No newline at end of file
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+import argparse
+import json
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .cache import get_vision_cache
+from .gemini_client import GeminiClientProvider, get_client_provider, metered
+from .routing import escalation_listener
+from .store import record_evaluation, recording_run
+from .telemetry import span, traced_kickoff
+from .tools import run_vision_analysis, run_heuristic_evaluation, run_feedback_generation
+
+
+@dataclass
+class StageResult:
+    """Output of one pipeline stage"""
+
+    name: str
+    raw: str
+    duration: float
+    usage: dict
+    data: Optional[dict] = None
+
+    @property
+    def text(self) -> str:
+        """Compact JSON handed to the next stage, or the raw text if unparsable"""
+        if self.data is None:
+            return self.raw
+        return json.dumps(self.data, ensure_ascii=False)
+
+
+@dataclass
+class PipelineResult:
+    """Outputs of the vision -> heuristics -> feedback chain"""
+
+    vision: StageResult
+    heuristics: StageResult
+    feedback: StageResult
+    duration: float
+    usage: dict = field(default_factory=dict)
+
+    @property
+    def raw(self) -> str:
+        """The feedback report, matching CrewOutput.raw of the evaluation crew"""
+        return self.feedback.raw
+
+    def timings(self) -> dict:
+        return {s.name: round(s.duration, 3) for s in (self.vision, self.heuristics, self.feedback)}
+
+
+def _run_stage(name: str, on_event, fn, *args, **kwargs) -> StageResult:
+    # Only stream from Gemini when someone is listening for tokens
+    on_token = None
+    escalations = nullcontext()
+    if on_event is not None:
+        on_event("stage_start", {"stage": name})
+        on_token = lambda text: on_event("token", {"stage": name, "text": text})
+        # Tokens streamed before an escalation belong to the discarded fast output
+        escalations = escalation_listener(lambda payload: on_event("escalated", {"stage": name, **payload}))
+
+    started = time.perf_counter()
+    with metered() as meter, escalations:
+        raw = fn(*args, on_token=on_token, **kwargs)
+    try:
+        data = json.loads(raw)
+    except json.JSONDecodeError:
+        data = None
+    result = StageResult(name=name, raw=raw, duration=time.perf_counter() - started, usage=meter.as_dict(), data=data)
+
+    if on_event is not None:
+        on_event("stage_complete", {
+            "stage": name,
+            "duration": round(result.duration, 3),
+            "usage": result.usage,
+            "data": data if data is not None else raw,
+        })
+    return result
+
+
+def run_fast_pipeline(
+    screenshot_path: str,
+    provider: GeminiClientProvider = None,
+    use_cache: bool = True,
+    on_event=None
+) -> PipelineResult:
+    """
+    Run vision analysis, heuristic evaluation and feedback generation directly,
+    without the agents' reasoning loops. Makes exactly one Gemini call per
+    stage and writes the same output files as the evaluation crew.
+
+    Args:
+        screenshot_path: Path to the screenshot to evaluate
+        provider: Gemini client provider, the process-wide one if omitted
+        use_cache: Allow the vision stage to use the vision cache
+        on_event: Optional callback on_event(event, payload) receiving
+            stage_start, token and stage_complete events as the run progresses
+
+    Returns:
+        PipelineResult with each stage's output, timing and token usage
+    """
+    provider = provider or get_client_provider()
+    started = time.perf_counter()
+
+    with metered() as meter, span("pipeline.fast", screenshot=screenshot_path), recording_run(screenshot_path=screenshot_path):
+        vision = _run_stage("vision", on_event, run_vision_analysis, screenshot_path, provider, use_cache=use_cache)
+        heuristics = _run_stage("heuristics", on_event, run_heuristic_evaluation, vision.text, provider)
+        feedback = _run_stage(
+            "feedback", on_event, run_feedback_generation, vision.text, heuristics.text, provider
+        )
+
+    return PipelineResult(
+        vision=vision,
+        heuristics=heuristics,
+        feedback=feedback,
+        duration=time.perf_counter() - started,
+        usage=meter.as_dict(),
+    )
+
+
+def run_crew_mode(screenshot_path: str) -> dict:
+    """Run the evaluation crew and report its latency and token usage"""
+    from .crew import UxFeedbackCrew
+
+    started = time.perf_counter()
+    with metered() as meter:
+        result = traced_kickoff(UxFeedbackCrew().evaluation_crew(), "evaluation", inputs={'screenshot_path': screenshot_path})
+    duration = time.perf_counter() - started
+
+    agent_usage = result.token_usage
+    return {
+        "duration": round(duration, 3),
+        "agent_llm": {
+            "requests": agent_usage.successful_requests,
+            "prompt_tokens": agent_usage.prompt_tokens,
+            "response_tokens": agent_usage.completion_tokens,
+            "total_tokens": agent_usage.total_tokens,
+        },
+        "tool_gemini": meter.as_dict(),
+        "total_tokens": agent_usage.total_tokens + meter.total_tokens,
+    }
+
+
+def compare_modes(screenshot_path: str) -> dict:
+    """
+    Evaluate the same screenshot in fast and crew mode, with the vision
+    cache bypassed so both pay for every call.
+
+    Returns:
+        Side-by-side latency and token usage of both modes
+    """
+    fast = run_fast_pipeline(screenshot_path, use_cache=False)
+    fast_report = {
+        "duration": round(fast.duration, 3),
+        "stages": fast.timings(),
+        "tool_gemini": fast.usage,
+        "total_tokens": fast.usage["total_tokens"],
+    }
+
+    # Keep the crew's vision tool from reusing an earlier result
+    cache = get_vision_cache()
+    enabled, cache.enabled = cache.enabled, False
+    try:
+        crew = run_crew_mode(screenshot_path)
+    finally:
+        cache.enabled = enabled
+
+    return {
+        "fast": fast_report,
+        "crew": crew,
+        "speedup": round(crew["duration"] / fast.duration, 2) if fast.duration else None,
+        "tokens_saved": crew["total_tokens"] - fast_report["total_tokens"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate a screenshot without the agent loop")
+    parser.add_argument("screenshot", help="Path to the screenshot")
+    parser.add_argument("--compare", action="store_true",
+                        help="Also run the crew and print a latency/token comparison")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Update the previous evaluation of this screen instead of starting over")
+    parser.add_argument("--screen-key", help="Stable identifier of the screen across versions")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        print(json.dumps(compare_modes(args.screenshot), indent=2))
+        return
+
+    if args.incremental:
+        from .incremental import run_incremental
+
+        with recording_run(screenshot_path=args.screenshot, screen_key=args.screen_key) as run:
+            result = run_incremental(args.screenshot, args.screen_key)
+            record_evaluation(result.raw)
+        print("\n" + "=" * 70)
+        print(f"✅ ANALYSIS COMPLETE in {result.duration:.1f}s {result.summary()}")
+        print(f"Tokens: {result.usage}")
+        print(f"Evaluation: {run.run_id}")
+        print("=" * 70)
+        print(f"\n{json.dumps(result.changes, indent=2, ensure_ascii=False)}\n")
+        return
+
+    with recording_run(screenshot_path=args.screenshot, screen_key=args.screen_key) as run:
+        result = run_fast_pipeline(args.screenshot)
+        record_evaluation(result.raw)
+    print("\n" + "=" * 70)
+    print(f"✅ ANALYSIS COMPLETE in {result.duration:.1f}s {result.timings()}")
+    print(f"Tokens: {result.usage}")
+    print(f"Evaluation: {run.run_id}")
+    print("=" * 70)
+    print(f"\n{result.raw}\n")
+
+
+if __name__ == "__main__":
+    main()
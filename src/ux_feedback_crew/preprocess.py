@@ -0,0 +1,158 @@
+import io
+import os
+from dataclasses import dataclass
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+from .cache import image_fingerprint
+
+MIME_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+
+# Columns x rows of the grayscale grid kept to locate changes between versions
+SIGNATURE_GRID = (24, 48)
+
+
+@dataclass(frozen=True)
+class PreprocessSettings:
+    """How screenshots are normalized before being uploaded to Gemini"""
+
+    max_edge: int = 1600
+    format: str = "WEBP"
+    quality: int = 85
+
+    @classmethod
+    def from_env(cls) -> "PreprocessSettings":
+        return cls(
+            max_edge=int(os.getenv("VISION_MAX_EDGE", cls.max_edge)),
+            format=os.getenv("VISION_IMAGE_FORMAT", cls.format).upper(),
+            quality=int(os.getenv("VISION_IMAGE_QUALITY", cls.quality)),
+        )
+
+    @property
+    def tag(self) -> str:
+        """Short identifier used to keep cache entries per settings"""
+        return f"{self.format.lower()}-{self.max_edge}-q{self.quality}"
+
+
+@dataclass
+class DecodedImage:
+    """A screenshot decoded once, upright and in RGB"""
+
+    image: Image.Image
+    fingerprint: str
+    original_bytes: int
+
+    @property
+    def original_size(self) -> tuple:
+        return self.image.size
+
+
+@dataclass
+class PreparedImage:
+    """A normalized screenshot re-encoded into a compact upload payload"""
+
+    decoded: DecodedImage
+    size: tuple
+    data: bytes
+    mime_type: str
+
+    @property
+    def encoded_bytes(self) -> int:
+        return len(self.data)
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.decoded.original_bytes - self.encoded_bytes
+
+
+def decode_image(image_path: str) -> DecodedImage:
+    """
+    Decode a screenshot once and normalize its orientation and color mode.
+
+    Args:
+        image_path: Path to the screenshot
+
+    Returns:
+        DecodedImage with the RGB pixels and their fingerprint
+    """
+    original_bytes = Path(image_path).stat().st_size
+
+    with Image.open(image_path) as src:
+        # Apply EXIF rotation so phone captures arrive upright
+        img = ImageOps.exif_transpose(src)
+
+        # Flatten transparency onto white; lossy formats have no alpha
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        else:
+            img.load()
+
+    return DecodedImage(image=img, fingerprint=image_fingerprint(img), original_bytes=original_bytes)
+
+
+def encode_image(decoded: DecodedImage, settings: PreprocessSettings = None) -> PreparedImage:
+    """
+    Downscale a decoded screenshot and re-encode it for upload.
+
+    Args:
+        decoded: Output of decode_image
+        settings: Preprocessing settings, read from the environment if omitted
+
+    Returns:
+        PreparedImage with the encoded bytes and size stats
+    """
+    settings = settings or PreprocessSettings.from_env()
+    if settings.format not in MIME_TYPES:
+        raise ValueError(f"Unsupported VISION_IMAGE_FORMAT: {settings.format}")
+
+    img = decoded.image
+    if max(img.size) > settings.max_edge:
+        img = img.copy()
+        img.thumbnail((settings.max_edge, settings.max_edge), Image.LANCZOS)
+
+    buffer = io.BytesIO()
+    save_kwargs = {"quality": settings.quality} if settings.format != "PNG" else {"optimize": True}
+    img.save(buffer, format=settings.format, **save_kwargs)
+
+    return PreparedImage(
+        decoded=decoded,
+        size=img.size,
+        data=buffer.getvalue(),
+        mime_type=MIME_TYPES[settings.format],
+    )
+
+
+def perceptual_hash(img: Image.Image) -> str:
+    """
+    64-bit difference hash of a screenshot as 16 hex characters.
+
+    Unlike the pixel fingerprint it barely changes under re-encoding or
+    small edits, so versions of the same screen are a few bits apart.
+    """
+    small = img.convert("L").resize((9, 8), Image.LANCZOS)
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"{bits:016x}"
+
+
+def hamming_distance(hash_a: str, hash_b: str) -> int:
+    """Number of differing bits between two perceptual hashes"""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+
+def signature_grid(img: Image.Image, grid: tuple = SIGNATURE_GRID) -> bytes:
+    """Grayscale cell averages of the screenshot, row by row"""
+    return img.convert("L").resize(grid, Image.BOX).tobytes()
+
+
+def preprocess_image(image_path: str, settings: PreprocessSettings = None) -> PreparedImage:
+    """Decode, normalize and re-encode a screenshot in one step"""
+    return encode_image(decode_image(image_path), settings)
@@ -0,0 +1,194 @@
+"""
+Model selection per pipeline stage, with an optional fast-then-strong cascade.
+
+Each agent in config/agents.yaml carries a `routing` block naming the stage
+its tool serves, the model the agent reasons with, the model its tool calls,
+and optionally a stronger model to escalate to:
+
+    routing:
+      stage: vision
+      agent_model: gemini-2.5-flash
+      model: gemini-2.5-flash
+      escalate_to: gemini-2.5-pro
+      min_confidence: 0.6
+
+Structured stages requested through generate_routed try `model` first. The
+output is escalated to `escalate_to` only when it fails validation or its
+self-reported confidence is below `min_confidence`, so most screens take the
+fast path. Escalations are counted in ux_model_escalations_total.
+"""
+import os
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Dict, Optional, Type, TypeVar
+
+from pydantic import BaseModel
+
+from .gemini_client import GeminiClientProvider
+from .structured import StructuredOutputError, generate_structured
+from .telemetry import current_span, metrics
+
+T = TypeVar("T", bound=BaseModel)
+
+AGENTS_CONFIG = Path(__file__).parent / "config" / "agents.yaml"
+
+metrics.describe("ux_model_route_total", "Routed structured calls by stage and path (fast, escalated)")
+metrics.describe("ux_model_escalations_total", "Calls escalated to the stronger model, by stage and reason")
+
+# Prompt note on the self-reported confidence a cascade escalates on
+CONFIDENCE_NOTE = (
+    '"confidence" is how sure you are of this output, from 0 to 1. Report a low value, '
+    'below 0.5, when the input is unclear, incomplete or cut off and you had to guess; '
+    'report a value near 1 only when everything you return is clearly supported by the input.'
+)
+
+_escalation_listener = ContextVar("model_escalation_listener", default=None)
+
+
+@contextmanager
+def escalation_listener(callback):
+    """
+    Call callback(payload) whenever generate_routed escalates within the block.
+
+    A streaming caller uses this to discard the fast model's text; the
+    escalated output is then streamed to on_text as well.
+    """
+    token = _escalation_listener.set(callback)
+    try:
+        yield
+    finally:
+        _escalation_listener.reset(token)
+
+
+@dataclass(frozen=True)
+class StageRoute:
+    """Models used by one pipeline stage"""
+
+    stage: str
+    model: str
+    agent_model: str
+    escalate_to: Optional[str] = None
+    min_confidence: float = 0.0
+
+    @property
+    def cascades(self) -> bool:
+        return bool(self.escalate_to) and self.escalate_to != self.model
+
+
+# Used for stages agents.yaml does not route; matches the models used before routing existed
+DEFAULT_ROUTES = {
+    "vision": StageRoute("vision", "gemini-2.5-flash", "gemini-2.5-flash"),
+    "heuristics": StageRoute("heuristics", "gemini-2.5-flash", "gemini-2.5-flash"),
+    "feedback": StageRoute("feedback", "gemini-2.5-flash", "gemini-2.5-flash"),
+    "wireframe": StageRoute("wireframe", "gemini-3-flash-preview", "gemini-3-flash-preview"),
+}
+
+_routes = None
+_routes_lock = threading.Lock()
+
+
+def load_routes(path: Path = AGENTS_CONFIG) -> Dict[str, StageRoute]:
+    """
+    Read the routing blocks of agents.yaml, keyed by stage.
+
+    MODEL_<STAGE> and MODEL_<STAGE>_ESCALATE_TO environment variables
+    override the configured models, e.g. MODEL_VISION=gemini-2.5-pro.
+    """
+    import yaml
+
+    routes = dict(DEFAULT_ROUTES)
+    if Path(path).exists():
+        with open(path, "r", encoding="utf-8") as f:
+            agents = yaml.safe_load(f) or {}
+        for name, agent in agents.items():
+            routing = (agent or {}).get("routing")
+            if not routing:
+                continue
+            stage = routing.get("stage", name)
+            default = routes.get(stage, DEFAULT_ROUTES["heuristics"])
+            model = routing.get("model", default.model)
+            routes[stage] = StageRoute(
+                stage=stage,
+                model=model,
+                agent_model=routing.get("agent_model", model),
+                escalate_to=routing.get("escalate_to"),
+                min_confidence=float(routing.get("min_confidence", 0.0)),
+            )
+
+    for stage, route in routes.items():
+        prefix = f"MODEL_{stage.upper()}"
+        routes[stage] = replace(
+            route,
+            model=os.getenv(prefix, route.model),
+            escalate_to=os.getenv(f"{prefix}_ESCALATE_TO", route.escalate_to),
+        )
+    return routes
+
+
+def stage_route(stage: str) -> StageRoute:
+    """Return the route of a stage, loading agents.yaml once per process"""
+    global _routes
+    with _routes_lock:
+        if _routes is None:
+            _routes = load_routes()
+        return _routes.get(stage) or DEFAULT_ROUTES[stage]
+
+
+def cascade_enabled() -> bool:
+    return os.getenv("MODEL_CASCADE", "true").lower() == "true"
+
+
+def generate_routed(
+    provider: GeminiClientProvider,
+    stage: str,
+    contents,
+    schema: Type[T],
+    on_text=None
+) -> T:
+    """
+    generate_structured with the stage's model, escalating when needed.
+
+    When the stage cascades, the fast model gets a single attempt without
+    validation retries; an invalid or low-confidence result is requested
+    again from the escalation model. The escalated attempt is only streamed
+    to on_text inside an escalation_listener block, which is told first.
+
+    Raises:
+        StructuredOutputError: If the final model's output fails validation
+    """
+    route = stage_route(stage)
+    if not (route.cascades and cascade_enabled()):
+        return generate_structured(provider, model=route.model, contents=contents, schema=schema, on_text=on_text)
+
+    try:
+        result = generate_structured(
+            provider, model=route.model, contents=contents, schema=schema, on_text=on_text, max_retries=0
+        )
+    except StructuredOutputError:
+        reason = "invalid"
+    else:
+        confidence = getattr(result, "confidence", None)
+        if confidence is None or confidence >= route.min_confidence:
+            metrics.inc("ux_model_route_total", stage=stage, path="fast")
+            return result
+        reason = "low_confidence"
+
+    metrics.inc("ux_model_route_total", stage=stage, path="escalated")
+    metrics.inc("ux_model_escalations_total", stage=stage, reason=reason)
+    span = current_span()
+    if span is not None:
+        span.add("escalations", 1)
+    print(f"⚠ {stage} escalated from {route.model} to {route.escalate_to} ({reason})")
+    listener = _escalation_listener.get()
+    if listener is not None:
+        listener({"model": route.model, "escalate_to": route.escalate_to, "reason": reason})
+    return generate_structured(
+        provider,
+        model=route.escalate_to,
+        contents=contents,
+        schema=schema,
+        on_text=on_text if listener is not None else None
+    )
@@ -0,0 +1,325 @@
+"""
+Quota-aware scheduling of Gemini calls.
+
+Every call made through GeminiClientProvider, and every CrewAI agent LLM
+call, passes through one process-wide QuotaScheduler. It keeps a
+requests-per-minute and a tokens-per-minute token bucket per model, retries
+429 and 5xx responses with exponential backoff and full jitter, and serves
+two priority lanes: interactive requests (the API) may use the whole budget,
+while batch requests (the batch runner) leave headroom free and yield
+whenever an interactive request is waiting.
+"""
+import asyncio
+import math
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+from google.genai import errors
+
+from .telemetry import current_span, metrics
+
+LANES = ("interactive", "batch")
+
+# Rough prompt cost of one screenshot; settled against the real usage afterwards
+IMAGE_TOKEN_ESTIMATE = 1000
+
+metrics.describe("ux_scheduler_wait_seconds", "Time Gemini calls waited for quota, by model and lane")
+metrics.describe("ux_gemini_throttled_total", "Gemini calls that failed with a retryable status, by model and status")
+
+_lane = ContextVar("gemini_priority_lane", default=None)
+
+
+def current_lane() -> str:
+    return _lane.get() or os.getenv("GEMINI_DEFAULT_LANE", "interactive")
+
+
+@contextmanager
+def priority_lane(lane: str):
+    """Run the Gemini calls made in this context in the given lane"""
+    if lane not in LANES:
+        raise ValueError(f"lane must be one of {LANES}")
+    token = _lane.set(lane)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def estimate_request_tokens(contents, config=None) -> int:
+    """Prompt tokens of contents, about four characters per token, plus the expected response"""
+
+    def prompt_tokens(part) -> int:
+        if isinstance(part, str):
+            return math.ceil(len(part) / 4)
+        if isinstance(part, (list, tuple)):
+            return sum(prompt_tokens(p) for p in part)
+        if getattr(part, "inline_data", None) is not None:
+            return IMAGE_TOKEN_ESTIMATE
+        text = getattr(part, "text", None)
+        return math.ceil(len(text) / 4) if text else 0
+
+    expected = getattr(config, "max_output_tokens", None) or int(os.getenv("GEMINI_EXPECTED_RESPONSE_TOKENS", 1024))
+    return prompt_tokens(contents) + expected
+
+
+class TokenBucket:
+    """A budget per minute that refills continuously; it may go into debt"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, headroom: float, now: float) -> float:
+        """Seconds until amount can be taken while leaving headroom in the bucket"""
+        self._refill(now)
+        missing = min(amount, self.capacity) + headroom - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float) -> None:
+        self.level -= amount
+
+
+class _ModelBudget:
+    def __init__(self, rpm: int, tpm: int):
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.waiting = {lane: 0 for lane in LANES}
+
+
+def _model_env(name: str, model: str, default: int) -> int:
+    # GEMINI_RPM_GEMINI_2_5_FLASH overrides GEMINI_RPM for that model
+    suffix = re.sub(r"[^A-Z0-9]", "_", model.upper())
+    return int(os.getenv(f"{name}_{suffix}", os.getenv(name, default)))
+
+
+def _retryable_status(error: Exception):
+    """HTTP status of a retryable failure, "network" for transport errors, or None"""
+    if isinstance(error, errors.APIError):
+        if error.code == 429 or (error.code or 0) >= 500:
+            return error.code
+        return None
+    if isinstance(error, httpx.TransportError):
+        return "network"
+    # LiteLLM errors from the agents' own LLM calls carry the HTTP status
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int) and (status == 429 or status >= 500):
+        return status
+    return None
+
+
+def _retry_after(error: Exception):
+    # Gemini puts the suggested delay in the 429 body as RetryInfo.retryDelay, e.g. "17s"
+    match = re.search(r"retryDelay'?\"?:\s*'?\"?(\d+(?:\.\d+)?)s", str(getattr(error, "details", "")))
+    return float(match.group(1)) if match else None
+
+
+class QuotaScheduler:
+    """
+    Admission control and retries for Gemini calls.
+
+    Args:
+        rpm: Default requests per minute per model; 0 means unlimited
+        tpm: Default tokens per minute per model; 0 means unlimited
+        batch_share: Share of each budget the batch lane may use; the rest
+            is kept free for interactive requests
+        max_retries: Retries of a call that failed with 429, 5xx or a network error
+        backoff_base: First backoff ceiling in seconds, doubled on each retry
+        backoff_max: Upper bound of the backoff ceiling
+    """
+
+    def __init__(
+        self,
+        rpm: int = 0,
+        tpm: int = 0,
+        batch_share: float = 0.8,
+        max_retries: int = 4,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0
+    ):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.batch_share = batch_share
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._budgets = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "QuotaScheduler":
+        return cls(
+            rpm=int(os.getenv("GEMINI_RPM", 0)),
+            tpm=int(os.getenv("GEMINI_TPM", 0)),
+            batch_share=float(os.getenv("GEMINI_BATCH_SHARE", 0.8)),
+            max_retries=int(os.getenv("GEMINI_MAX_RETRIES", 4)),
+            backoff_base=float(os.getenv("GEMINI_BACKOFF_BASE", 1.0)),
+            backoff_max=float(os.getenv("GEMINI_BACKOFF_MAX", 30.0)),
+        )
+
+    def _budget(self, model: str) -> _ModelBudget:
+        budget = self._budgets.get(model)
+        if budget is None:
+            budget = _ModelBudget(_model_env("GEMINI_RPM", model, self.rpm), _model_env("GEMINI_TPM", model, self.tpm))
+            self._budgets[model] = budget
+        return budget
+
+    def _try_reserve(self, model: str, tokens: int, lane: str) -> float:
+        """Take the quota and return 0, or return how long to wait before trying again"""
+        with self._lock:
+            budget = self._budget(model)
+            if lane == "batch" and budget.waiting["interactive"]:
+                return 0.05
+            now = time.monotonic()
+            wait = 0.0
+            for bucket, amount in ((budget.requests, 1), (budget.tokens, tokens)):
+                if bucket is not None:
+                    headroom = bucket.capacity * (1 - self.batch_share) if lane == "batch" else 0.0
+                    wait = max(wait, bucket.wait_time(amount, headroom, now))
+            if wait > 0:
+                return wait
+            if budget.requests is not None:
+                budget.requests.take(1)
+            if budget.tokens is not None:
+                budget.tokens.take(tokens)
+            return 0.0
+
+    def _waiting(self, model: str, lane: str, delta: int) -> None:
+        with self._lock:
+            self._budget(model).waiting[lane] += delta
+
+    def acquire(self, model: str, tokens: int, lane: str = None) -> float:
+        """Block until the call fits the model's budget; returns the seconds waited"""
+        lane = lane or current_lane()
+        started = time.perf_counter()
+        wait = self._try_reserve(model, tokens, lane)
+        if wait:
+            self._waiting(model, lane, 1)
+            try:
+                while wait:
+                    time.sleep(min(wait, 0.5))
+                    wait = self._try_reserve(model, tokens, lane)
+            finally:
+                self._waiting(model, lane, -1)
+        return self._record_wait(model, lane, time.perf_counter() - started)
+
+    async def acquire_async(self, model: str, tokens: int, lane: str = None) -> float:
+        """acquire for coroutines; waits without blocking the event loop"""
+        lane = lane or current_lane()
+        started = time.perf_counter()
+        wait = self._try_reserve(model, tokens, lane)
+        if wait:
+            self._waiting(model, lane, 1)
+            try:
+                while wait:
+                    await asyncio.sleep(min(wait, 0.5))
+                    wait = self._try_reserve(model, tokens, lane)
+            finally:
+                self._waiting(model, lane, -1)
+        return self._record_wait(model, lane, time.perf_counter() - started)
+
+    def _record_wait(self, model: str, lane: str, waited: float) -> float:
+        metrics.observe("ux_scheduler_wait_seconds", waited, model=model, lane=lane)
+        if waited >= 0.01:
+            span = current_span()
+            if span is not None:
+                span.add("quota_wait", round(waited, 3))
+        return waited
+
+    def settle(self, model: str, estimated: int, response) -> None:
+        """Correct the token bucket by the difference between estimated and actual usage"""
+        usage = getattr(response, "usage_metadata", None)
+        actual = getattr(usage, "total_token_count", None)
+        if actual is None:
+            return
+        with self._lock:
+            bucket = self._budget(model).tokens
+            if bucket is not None:
+                bucket.take(actual - estimated)
+
+    def backoff(self, attempt: int, error: Exception = None) -> float:
+        """Delay before retry number attempt (1-based): full jitter, or the server's hint"""
+        hinted = _retry_after(error) if error is not None else None
+        if hinted is not None:
+            return hinted + random.uniform(0, self.backoff_base)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def _should_retry(self, model: str, error: Exception, attempt: int, retry_allowed) -> bool:
+        status = _retryable_status(error)
+        if status is None:
+            return False
+        metrics.inc("ux_gemini_throttled_total", model=model, status=str(status))
+        if attempt > self.max_retries or (retry_allowed is not None and not retry_allowed()):
+            return False
+        metrics.inc("ux_retries_total", operation="gemini")
+        span = current_span()
+        if span is not None:
+            span.add("retries", 1)
+        return True
+
+    def call(self, model: str, tokens: int, fn, retry_allowed=None):
+        """
+        Run fn() within the model's budget, retrying retryable failures.
+
+        Args:
+            model: Gemini model name the budget belongs to
+            tokens: Estimated tokens of the call
+            fn: Performs the request and returns the response
+            retry_allowed: Optional callable; a failure is only retried while
+                it returns True, e.g. before a stream has emitted any text
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            self.acquire(model, tokens)
+            try:
+                response = fn()
+            except Exception as e:
+                if not self._should_retry(model, e, attempt, retry_allowed):
+                    raise
+                delay = self.backoff(attempt, e)
+                print(f"⚠ Gemini {model} returned {_retryable_status(e)}, retry {attempt} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            self.settle(model, tokens, response)
+            return response
+
+    async def acall(self, model: str, tokens: int, fn):
+        """call for coroutine functions"""
+        attempt = 0
+        while True:
+            attempt += 1
+            await self.acquire_async(model, tokens)
+            try:
+                response = await fn()
+            except Exception as e:
+                if not self._should_retry(model, e, attempt, None):
+                    raise
+                await asyncio.sleep(self.backoff(attempt, e))
+                continue
+            self.settle(model, tokens, response)
+            return response
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> QuotaScheduler:
+    """Return the process-wide scheduler, creating it from the environment"""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = QuotaScheduler.from_env()
+        return _default_scheduler
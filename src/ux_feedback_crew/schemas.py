@@ -0,0 +1,216 @@
+"""
+Typed outputs of the pipeline stages.
+
+These models are sent to Gemini as the response schema, so the model is
+constrained to produce them, and every tool response is validated against
+them before it is stored or handed to the next stage.
+"""
+from typing import Dict, List, Literal, Optional
+
+from pydantic import BaseModel, Field, field_validator
+
+Level = Literal["critical", "high", "medium", "low"]
+
+
+def _lowercase(value):
+    return value.strip().lower() if isinstance(value, str) else value
+
+
+class Component(BaseModel):
+    type: str = Field(description="button/text_input/image/label/icon/etc")
+    text: str = Field(default="", description="visible text if any")
+    position: str = Field(default="", description="top/middle/bottom/etc")
+    color: str = Field(default="", description="describe color")
+    size: str = Field(default="", description="small/medium/large")
+
+
+class ColorScheme(BaseModel):
+    primary_colors: List[str] = Field(default_factory=list)
+    background: str = ""
+    text_colors: List[str] = Field(default_factory=list)
+
+
+class Typography(BaseModel):
+    heading_sizes: str = ""
+    body_text_size: str = ""
+
+
+class SpacingAndDensity(BaseModel):
+    overall_density: str = Field(default="", description="tight/comfortable/spacious")
+    element_spacing: str = ""
+
+
+class ObservedUI(BaseModel):
+    """The part of a vision analysis that cannot be measured from the pixels"""
+
+    screen_type: str = Field(description="login/home/profile/list/etc")
+    components: List[Component]
+    layout_structure: str = ""
+    typography: Typography = Field(default_factory=Typography)
+    accessibility_observations: List[str] = Field(default_factory=list)
+    notable_patterns: List[str] = Field(default_factory=list)
+    confidence: Optional[float] = Field(
+        default=None, ge=0, le=1, description="0 to 1, how certain you are of this output"
+    )
+
+
+class VisionAnalysis(ObservedUI):
+    """Output of the vision analysis stage"""
+
+    color_scheme: ColorScheme = Field(default_factory=ColorScheme)
+    spacing_and_density: SpacingAndDensity = Field(default_factory=SpacingAndDensity)
+
+
+class PaletteColor(BaseModel):
+    hex: str
+    share: float = Field(description="Fraction of the screen in this color")
+
+
+class ContrastPair(BaseModel):
+    foreground: str
+    background: str
+    ratio: float = Field(description="WCAG contrast ratio, 1 to 21")
+    share: float = Field(description="Fraction of the screen drawn in the foreground color on this background")
+    band: str = Field(description="top/middle/bottom, where the pair occurs most")
+    passes_aa: bool = Field(description="At least 4.5:1, enough for normal text")
+    passes_aa_large: bool = Field(description="At least 3:1, enough for large text and UI components")
+    text: bool = Field(
+        default=True, description="Drawn mostly in glyph-sized strokes; false for dividers, borders and filled shapes"
+    )
+
+
+class Measurements(BaseModel):
+    """Facts computed from the pixels by local_analysis, not by the model"""
+
+    palette: List[PaletteColor] = Field(default_factory=list)
+    background: str = ""
+    contrast_pairs: List[ContrastPair] = Field(default_factory=list)
+    edge_density: float = 0.0
+    whitespace_ratio: float = 0.0
+    density_by_band: Dict[str, float] = Field(default_factory=dict)
+    overall_density: str = ""
+
+
+class MeasuredVisionAnalysis(VisionAnalysis):
+    """Vision analysis with the locally measured facts attached"""
+
+    measurements: Optional[Measurements] = None
+
+
+class RegionAnalysis(BaseModel):
+    """Components found in the changed regions of a new screen version"""
+
+    components: List[Component] = Field(default_factory=list)
+    accessibility_observations: List[str] = Field(default_factory=list)
+
+
+class Violation(BaseModel):
+    heuristic_id: int
+    heuristic_name: str
+    severity: Level
+    issue: str
+    affected_components: List[str] = Field(default_factory=list)
+    improvement_suggestion: str = ""
+
+    @field_validator("severity", mode="before")
+    @classmethod
+    def normalize_severity(cls, value):
+        return _lowercase(value)
+
+
+class Strength(BaseModel):
+    heuristic_name: str
+    observation: str
+
+
+class HeuristicEvaluation(BaseModel):
+    """Output of the heuristic evaluation stage"""
+
+    violations: List[Violation] = Field(default_factory=list)
+    strengths: List[Strength] = Field(default_factory=list)
+    overall_score: Optional[float] = Field(default=None, description="0 to 10")
+    confidence: Optional[float] = Field(
+        default=None, ge=0, le=1, description="0 to 1, how certain you are of this output"
+    )
+
+
+class MergedHeuristicEvaluation(HeuristicEvaluation):
+    """Heuristic evaluation merged from fan-out groups"""
+
+    skipped_heuristics: List[str] = Field(
+        default_factory=list, description="Heuristics whose group failed validation and were not evaluated"
+    )
+
+
+class FeedbackItem(BaseModel):
+    id: int
+    title: str
+    priority: Level
+    why_it_matters: str = ""
+    what_to_do: List[str] = Field(default_factory=list)
+    wireframe_changes: str = ""
+
+    @field_validator("priority", mode="before")
+    @classmethod
+    def normalize_priority(cls, value):
+        return _lowercase(value)
+
+
+class QuickWin(BaseModel):
+    change: str
+    impact: str = ""
+    effort: str = ""
+
+
+class FeedbackSummary(BaseModel):
+    total_issues: int = 0
+    high: int = 0
+    medium: int = 0
+    low: int = 0
+
+
+class FeedbackReport(BaseModel):
+    """Output of the feedback generation stage"""
+
+    feedback_items: List[FeedbackItem] = Field(default_factory=list)
+    quick_wins: List[QuickWin] = Field(default_factory=list)
+    summary: FeedbackSummary = Field(default_factory=FeedbackSummary)
+    confidence: Optional[float] = Field(
+        default=None, ge=0, le=1, description="0 to 1, how certain you are of this output"
+    )
+
+
+class ScreenAnalysis(VisionAnalysis):
+    """Vision analysis of one screen of a user flow"""
+
+    screen_index: int = Field(description="1-based position of the screen in the flow")
+
+
+class FlowAnalysis(BaseModel):
+    """Output of the batched vision stage of a user flow"""
+
+    screens: List[ScreenAnalysis]
+    navigation_patterns: List[str] = Field(default_factory=list)
+
+
+class ScreenFindings(HeuristicEvaluation):
+    """Heuristic findings that concern a single screen of a flow"""
+
+    screen_index: int
+
+
+class CrossScreenViolation(Violation):
+    """A violation that only shows across steps, such as inconsistent navigation"""
+
+    screens: List[int] = Field(default_factory=list, description="screen_index of every screen involved")
+
+
+class FlowEvaluation(BaseModel):
+    """Output of the flow heuristic stage"""
+
+    screens: List[ScreenFindings] = Field(default_factory=list)
+    cross_screen_violations: List[CrossScreenViolation] = Field(default_factory=list)
+    overall_score: Optional[float] = Field(default=None, description="0 to 10")
+    confidence: Optional[float] = Field(
+        default=None, ge=0, le=1, description="0 to 1, how certain you are of this output"
+    )
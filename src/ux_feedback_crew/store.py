@@ -0,0 +1,542 @@
+import contextvars
+import json
+import os
+import socket
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    step TEXT,
+    result TEXT,
+    error TEXT,
+    extra TEXT,
+    worker TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+
+CREATE TABLE IF NOT EXISTS stage_outputs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL,
+    image_hash TEXT,
+    stage TEXT NOT NULL,
+    content TEXT NOT NULL,
+    valid INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS stage_outputs_run ON stage_outputs (run_id, stage);
+CREATE INDEX IF NOT EXISTS stage_outputs_image ON stage_outputs (image_hash, stage, created_at);
+
+CREATE TABLE IF NOT EXISTS evaluations (
+    evaluation_id TEXT PRIMARY KEY,
+    image_hash TEXT,
+    screenshot_path TEXT,
+    report TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS evaluations_image ON evaluations (image_hash, created_at);
+
+CREATE TABLE IF NOT EXISTS wireframes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    evaluation_id TEXT NOT NULL,
+    html TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS wireframes_evaluation ON wireframes (evaluation_id, created_at);
+"""
+
+# Columns added after the first release of a table: (table, column, type)
+MIGRATIONS = [
+    ("evaluations", "phash", "TEXT"),
+    ("evaluations", "screen_key", "TEXT"),
+    ("evaluations", "signature", "BLOB"),
+    ("evaluations", "width", "INTEGER"),
+    ("evaluations", "height", "INTEGER"),
+    ("jobs", "coalesce_key", "TEXT"),
+]
+
+POST_MIGRATION_SCHEMA = """
+CREATE INDEX IF NOT EXISTS evaluations_screen_key ON evaluations (screen_key, created_at);
+CREATE INDEX IF NOT EXISTS jobs_coalesce_key ON jobs (coalesce_key, status);
+"""
+
+# Owner of the jobs this process creates
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def worker_alive(worker: str) -> bool:
+    """Whether the process behind a job's worker id is still running"""
+    host, _, pid = (worker or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        # Owned by another host; assume it is still running
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ResultStore:
+    """
+    SQLite store for jobs, stage outputs, evaluations and wireframes.
+
+    Runs in WAL mode so API workers, batch threads and separate processes
+    can write concurrently while readers see a consistent snapshot. Each
+    thread gets its own connection.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 30.0):
+        self.path = Path(path)
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        self._migrate()
+
+    def _migrate(self) -> None:
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        for table, column, column_type in MIGRATIONS:
+            columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+        conn.executescript(POST_MIGRATION_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    # Jobs
+
+    @staticmethod
+    def _job_from_row(row: sqlite3.Row) -> dict:
+        job = {
+            "job_id": row["job_id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "progress": row["progress"],
+            "step": row["step"],
+            "result": json.loads(row["result"]) if row["result"] is not None else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+        return {**job, **json.loads(row["extra"] or "{}")}
+
+    def insert_job(self, job_id: str, kind: str, status: str, worker: str = None, **extra) -> None:
+        """Create a job record; extra fields are returned alongside the columns"""
+        now = _now()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, kind, status, extra, worker, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, status, json.dumps(extra), worker, now, now)
+            )
+
+    def update_job(self, job_id: str, **fields) -> None:
+        """Update job columns; result is stored as JSON"""
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"], ensure_ascii=False)
+        fields["updated_at"] = _now()
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._transaction() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        row = self._connect().execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._job_from_row(row) if row else None
+
+    def count_jobs(self, statuses: tuple = None) -> dict:
+        """Number of jobs per status, optionally restricted to some statuses"""
+        query = "SELECT status, COUNT(*) AS n FROM jobs"
+        params = ()
+        if statuses:
+            query += f" WHERE status IN ({', '.join('?' for _ in statuses)})"
+            params = tuple(statuses)
+        rows = self._connect().execute(query + " GROUP BY status", params).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def find_coalesced_job(self, coalesce_key: str, reuse_window: float) -> Optional[dict]:
+        """
+        The job to share instead of starting a new one with this coalesce key.
+
+        That is a queued or running job, or one that completed within the
+        last reuse_window seconds. Failed jobs are never shared.
+        """
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=reuse_window)).isoformat()
+        row = self._connect().execute(
+            "SELECT * FROM jobs WHERE coalesce_key = ? AND (status IN ('queued', 'running') "
+            "OR (status = 'completed' AND updated_at >= ?)) ORDER BY created_at DESC LIMIT 1",
+            (coalesce_key, cutoff)
+        ).fetchone()
+        return self._job_from_row(row) if row else None
+
+    def claim_job(
+        self,
+        job_id: str,
+        kind: str,
+        coalesce_key: str,
+        reuse_window: float,
+        status: str = "queued",
+        worker: str = None,
+        **extra
+    ) -> Optional[dict]:
+        """
+        Create a job unless find_coalesced_job returns one, in one transaction.
+
+        Returns:
+            The job to share, or None when job_id was created
+        """
+        with self._transaction() as conn:
+            # Same thread, so this reads through the open transaction's connection
+            existing = self.find_coalesced_job(coalesce_key, reuse_window)
+            if existing is not None:
+                return existing
+            now = _now()
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, kind, status, extra, worker, coalesce_key, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, status, json.dumps(extra), worker, coalesce_key, now, now)
+            )
+        return None
+
+    def claim_uploaded_job(self, job_id: str, kind: str, worker: str = None) -> bool:
+        """
+        Queue the job record of an uploaded screenshot as a job of this kind.
+
+        Returns:
+            False if there is no such record or its upload was already claimed
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET kind = ?, status = 'queued', progress = 0, worker = ?, updated_at = ? "
+                "WHERE job_id = ? AND status = 'uploaded'",
+                (kind, worker, _now(), job_id)
+            )
+        return cursor.rowcount == 1
+
+    def fail_orphaned_jobs(self, worker_alive, error: str) -> int:
+        """
+        Mark queued and running jobs as failed when their worker has exited.
+
+        Args:
+            worker_alive: Callable taking a job's worker id and returning
+                whether that worker is still running
+            error: Error message recorded on the failed jobs
+
+        Returns:
+            Number of jobs marked as failed
+        """
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT job_id, worker FROM jobs WHERE status IN ('queued', 'running')"
+            ).fetchall()
+            orphaned = [row["job_id"] for row in rows if not worker_alive(row["worker"])]
+            conn.executemany(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE job_id = ?",
+                [(error, _now(), job_id) for job_id in orphaned]
+            )
+        return len(orphaned)
+
+    # Stage outputs
+
+    def save_stage_output(self, run_id: str, stage: str, content: str, image_hash: str = None) -> bool:
+        """Store a stage's output and return whether it is valid JSON"""
+        try:
+            json.loads(content)
+            valid = True
+        except json.JSONDecodeError:
+            valid = False
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO stage_outputs (run_id, image_hash, stage, content, valid, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, image_hash, stage, content, int(valid), _now())
+            )
+        return valid
+
+    def stage_outputs(self, run_id: str) -> dict:
+        """Latest output of each stage of a run"""
+        rows = self._connect().execute(
+            "SELECT stage, content FROM stage_outputs WHERE run_id = ? ORDER BY id",
+            (run_id,)
+        ).fetchall()
+        return {row["stage"]: row["content"] for row in rows}
+
+    def stage_outputs_after(self, last_id: int, stages: tuple, limit: int = 500) -> list:
+        """Valid stage outputs saved after the row last_id, oldest first"""
+        rows = self._connect().execute(
+            f"SELECT id, run_id, stage, content, created_at FROM stage_outputs "
+            f"WHERE id > ? AND valid = 1 AND stage IN ({', '.join('?' for _ in stages)}) "
+            f"ORDER BY id LIMIT ?",
+            (last_id, *stages, limit)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def latest_stage_output(self, image_hash: str, stage: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT content FROM stage_outputs WHERE image_hash = ? AND stage = ? AND valid = 1 "
+            "ORDER BY created_at DESC, id DESC LIMIT 1",
+            (image_hash, stage)
+        ).fetchone()
+        return row["content"] if row else None
+
+    # Evaluations
+
+    def save_evaluation(
+        self,
+        evaluation_id: str,
+        report: str,
+        image_hash: str = None,
+        screenshot_path: str = None,
+        phash: str = None,
+        screen_key: str = None,
+        signature: bytes = None,
+        size: tuple = None
+    ) -> None:
+        width, height = size or (None, None)
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO evaluations (evaluation_id, image_hash, screenshot_path, report, "
+                "phash, screen_key, signature, width, height, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (evaluation_id, image_hash, screenshot_path, report,
+                 phash, screen_key, signature, width, height, _now())
+            )
+
+    @staticmethod
+    def _evaluation_from_row(row: sqlite3.Row, with_signature: bool = False) -> dict:
+        evaluation = dict(row)
+        if not with_signature:
+            evaluation.pop("signature", None)
+        return evaluation
+
+    def get_evaluation(self, evaluation_id: str, with_signature: bool = False) -> Optional[dict]:
+        row = self._connect().execute(
+            "SELECT * FROM evaluations WHERE evaluation_id = ?", (evaluation_id,)
+        ).fetchone()
+        return self._evaluation_from_row(row, with_signature) if row else None
+
+    def latest_evaluation(self, image_hash: str) -> Optional[dict]:
+        """The most recent evaluation of a screen"""
+        row = self._connect().execute(
+            "SELECT * FROM evaluations WHERE image_hash = ? ORDER BY created_at DESC LIMIT 1",
+            (image_hash,)
+        ).fetchone()
+        return self._evaluation_from_row(row) if row else None
+
+    def find_previous_evaluation(
+        self,
+        phash: str,
+        screen_key: str = None,
+        max_distance: int = 10,
+        candidates: int = 200
+    ) -> Optional[dict]:
+        """
+        Find the evaluation of an earlier version of a screen.
+
+        With a screen_key the latest evaluation under that key is returned.
+        Otherwise the most recent evaluations are compared by perceptual hash
+        and the closest one within max_distance bits wins.
+
+        Returns:
+            The evaluation including its signature and a "distance" field, or None
+        """
+        from .preprocess import hamming_distance
+
+        conn = self._connect()
+        if screen_key:
+            row = conn.execute(
+                "SELECT * FROM evaluations WHERE screen_key = ? AND signature IS NOT NULL "
+                "ORDER BY created_at DESC LIMIT 1",
+                (screen_key,)
+            ).fetchone()
+            if row is None:
+                return None
+            evaluation = self._evaluation_from_row(row, with_signature=True)
+            evaluation["distance"] = hamming_distance(phash, row["phash"])
+            return evaluation
+
+        rows = conn.execute(
+            "SELECT * FROM evaluations WHERE phash IS NOT NULL AND signature IS NOT NULL "
+            "ORDER BY created_at DESC LIMIT ?",
+            (candidates,)
+        ).fetchall()
+        best, best_distance = None, max_distance + 1
+        for row in rows:
+            distance = hamming_distance(phash, row["phash"])
+            if distance < best_distance:
+                best, best_distance = row, distance
+        if best is None:
+            return None
+        evaluation = self._evaluation_from_row(best, with_signature=True)
+        evaluation["distance"] = best_distance
+        return evaluation
+
+    # Wireframes
+
+    def save_wireframe(self, evaluation_id: str, html: str) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO wireframes (evaluation_id, html, created_at) VALUES (?, ?, ?)",
+                (evaluation_id, html, _now())
+            )
+
+    def latest_wireframe(self, evaluation_id: str) -> Optional[dict]:
+        row = self._connect().execute(
+            "SELECT * FROM wireframes WHERE evaluation_id = ? ORDER BY id DESC LIMIT 1",
+            (evaluation_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> ResultStore:
+    """Return the process-wide store, configured from the environment"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultStore(os.getenv("RESULT_STORE_PATH", "data/results.db"))
+        return _store
+
+
+class Run:
+    """Identity shared by the stage outputs of one evaluation"""
+
+    def __init__(
+        self,
+        run_id: str = None,
+        image_hash: str = None,
+        screenshot_path: str = None,
+        screen_key: str = None
+    ):
+        self.run_id = run_id or str(uuid.uuid4())
+        self.image_hash = image_hash
+        self.screenshot_path = screenshot_path
+        self.screen_key = screen_key
+        # Perceptual hash, grayscale grid and pixel size of the screenshot
+        self.phash = None
+        self.signature = None
+        self.size = None
+
+
+_current_run = contextvars.ContextVar("ux_current_run", default=None)
+
+
+@contextmanager
+def recording_run(run_id: str = None, screenshot_path: str = None, screen_key: str = None):
+    """
+    Group the stage outputs saved in this context under one run id.
+
+    Nested calls without an explicit run_id join the enclosing run.
+    """
+    active = _current_run.get()
+    if active is not None and run_id is None:
+        active.screenshot_path = active.screenshot_path or screenshot_path
+        active.screen_key = active.screen_key or screen_key
+        yield active
+        return
+
+    run = Run(run_id, screenshot_path=screenshot_path, screen_key=screen_key)
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+
+
+def current_run() -> Run:
+    """The active run, or a fresh standalone one when called outside recording_run"""
+    return _current_run.get() or Run()
+
+
+def remember_screen(image_hash: str, phash: str, signature: bytes, size: tuple) -> None:
+    """Attach the screenshot's identity to the active run for its evaluation record"""
+    run = _current_run.get()
+    if run is None or run.phash is not None:
+        return
+    run.image_hash = run.image_hash or image_hash
+    run.phash, run.signature, run.size = phash, signature, size
+
+
+def record_stage(stage: str, content: str, image_hash: str = None) -> bool:
+    """
+    Save a tool's output under the active run.
+
+    Args:
+        stage: Stage name such as "vision" or "feedback"
+        content: The stage's output text
+        image_hash: Fingerprint of the analysed screenshot, remembered on the
+            run so later stages and the evaluation are indexed by it
+
+    Returns:
+        Whether the output is valid JSON
+    """
+    run = current_run()
+    if image_hash and run.image_hash is None:
+        run.image_hash = image_hash
+
+    valid = get_store().save_stage_output(run.run_id, stage, content, run.image_hash)
+    if valid:
+        print(f"✓ {stage.capitalize()} output saved to run {run.run_id}")
+    else:
+        print(f"⚠ JSON validation error in {stage} output, saved raw text to run {run.run_id}")
+    return valid
+
+
+def record_evaluation(report: str) -> Run:
+    """Save the final feedback report as the evaluation of the active run"""
+    run = current_run()
+    get_store().save_evaluation(
+        run.run_id,
+        report,
+        image_hash=run.image_hash,
+        screenshot_path=run.screenshot_path,
+        phash=run.phash,
+        screen_key=run.screen_key,
+        signature=run.signature,
+        size=run.size,
+    )
+    return run
@@ -0,0 +1,123 @@
+import os
+import re
+from typing import Type, TypeVar
+
+from google.genai import types
+from pydantic import BaseModel, ValidationError
+
+from .gemini_client import GeminiClientProvider
+from .telemetry import current_span, metrics
+
+T = TypeVar("T", bound=BaseModel)
+
+metrics.describe(
+    "ux_structured_output_total",
+    "Structured stage outputs by schema and outcome (valid, repaired, retried, failed)"
+)
+
+_FENCE = re.compile(r"^```[a-zA-Z]*\s*|\s*```$")
+
+
+class StructuredOutputError(ValueError):
+    """Raised when a response still fails validation after every repair attempt"""
+
+
+def extract_code_block(text: str, language: str = None) -> str:
+    """
+    Return the contents of the first fenced code block, or the stripped text.
+
+    Args:
+        text: Model response
+        language: Only accept fences tagged with this language, e.g. "html"
+    """
+    pattern = rf"```{re.escape(language)}\s*(.*?)```" if language else r"```[a-zA-Z]*\s*(.*?)```"
+    match = re.search(pattern, text, re.DOTALL)
+    return match.group(1).strip() if match else text.strip()
+
+
+def _local_repair(text: str) -> str:
+    # Drop markdown fences and anything around the outermost JSON object
+    text = _FENCE.sub("", text.strip())
+    start, end = text.find("{"), text.rfind("}")
+    return text[start:end + 1] if start != -1 and end > start else text
+
+
+def generate_structured(
+    provider: GeminiClientProvider,
+    model: str,
+    contents,
+    schema: Type[T],
+    on_text=None,
+    max_retries: int = None
+) -> T:
+    """
+    Request output matching schema in JSON mode and validate it in one place.
+
+    A response that fails validation is first repaired locally by stripping
+    fences and surrounding text. If that fails too, the request is repeated
+    with the validation error appended, at most max_retries times. Every
+    outcome is counted in ux_structured_output_total.
+
+    Args:
+        provider: Gemini client provider
+        model: Gemini model name
+        contents: Prompt contents, as for generate_content
+        schema: Pydantic model the response must match
+        on_text: Optional callback receiving streamed text of the first attempt
+        max_retries: Extra requests after a failed validation; defaults to
+            the STRUCTURED_MAX_RETRIES environment variable
+
+    Returns:
+        The validated model instance
+
+    Raises:
+        StructuredOutputError: If no attempt produced valid output
+    """
+    if max_retries is None:
+        max_retries = int(os.getenv("STRUCTURED_MAX_RETRIES", 1))
+
+    config = types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=schema,
+    )
+    prompt = list(contents) if isinstance(contents, (list, tuple)) else [contents]
+    name = schema.__name__
+    error = None
+
+    for attempt in range(max_retries + 1):
+        if attempt:
+            metrics.inc("ux_structured_output_total", schema=name, outcome="retried")
+            span = current_span()
+            if span is not None:
+                span.add("retries", 1)
+            prompt = [
+                *prompt,
+                f"Your previous reply did not match the required JSON schema:\n{error}\n\n"
+                f"Previous reply:\n{text}\n\nReturn only the corrected JSON."
+            ]
+
+        response = provider.generate_content(
+            model=model,
+            contents=prompt,
+            on_text=on_text if attempt == 0 else None,
+            config=config
+        )
+        text = response.text or ""
+
+        try:
+            result = schema.model_validate_json(text)
+            metrics.inc("ux_structured_output_total", schema=name, outcome="valid")
+            return result
+        except ValidationError:
+            pass
+
+        try:
+            result = schema.model_validate_json(_local_repair(text))
+            metrics.inc("ux_structured_output_total", schema=name, outcome="repaired")
+            return result
+        except ValidationError as e:
+            error = e
+            print(f"⚠ {name} failed validation (attempt {attempt + 1}): {e.error_count()} errors")
+
+    metrics.inc("ux_structured_output_total", schema=name, outcome="failed")
+    raise StructuredOutputError(f"{name} output failed validation after {max_retries + 1} attempts: {error}")
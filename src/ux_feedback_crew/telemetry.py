@@ -0,0 +1,258 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+# Numeric span attributes that are summed into the parent span when a span ends
+ROLLUP_KEYS = (
+    "gemini_requests",
+    "prompt_tokens",
+    "response_tokens",
+    "total_tokens",
+    "bytes_in",
+    "bytes_out",
+    "retries",
+    "agent_iterations",
+    "context_tokens_saved",
+)
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current_span = contextvars.ContextVar("ux_current_span", default=None)
+
+
+class MetricsRegistry:
+    """Thread-safe counters and histograms rendered in Prometheus text format"""
+
+    def __init__(self):
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._help = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            buckets, total, count = self._histograms.get(key, ([0] * len(DURATION_BUCKETS), 0.0, 0))
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    buckets[i] += 1
+            self._histograms[key] = (buckets, total + value, count + 1)
+
+    def register_collector(self, collector) -> None:
+        """Add a callable returning (name, labels dict, value) gauges read at render time"""
+        self._collectors.append(collector)
+
+    @staticmethod
+    def _labels(labels, extra: dict = None) -> str:
+        pairs = list(labels) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pairs) + "}"
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+
+        for name in sorted({name for name, _ in counters}):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{self._labels(labels)} {value:g}")
+
+        for name in sorted({name for name, _ in histograms}):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, bucket_count in zip(DURATION_BUCKETS, buckets):
+                    lines.append(f"{name}_bucket{self._labels(labels, {'le': f'{bound:g}'})} {bucket_count}")
+                lines.append(f"{name}_bucket{self._labels(labels, {'le': '+Inf'})} {count}")
+                lines.append(f"{name}_sum{self._labels(labels)} {total:g}")
+                lines.append(f"{name}_count{self._labels(labels)} {count}")
+
+        gauges = defaultdict(list)
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                gauges[name].append((tuple(sorted(labels.items())), value))
+        for name in sorted(gauges):
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in gauges[name]:
+                lines.append(f"{name}{self._labels(labels)} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+metrics.describe("ux_span_duration_seconds", "Duration of traced pipeline spans")
+metrics.describe("ux_span_errors_total", "Traced spans that ended with an exception")
+metrics.describe("ux_gemini_requests_total", "Gemini generate_content calls by model and status")
+metrics.describe("ux_gemini_tokens_total", "Gemini tokens by model and direction")
+metrics.describe("ux_gemini_bytes_total", "Request and response payload bytes sent to and received from Gemini")
+metrics.describe("ux_agent_iterations_total", "CrewAI agent reasoning steps")
+metrics.describe("ux_agent_llm_tokens_total", "Tokens used by the CrewAI agents' own LLM calls")
+metrics.describe("ux_retries_total", "Retried operations")
+
+
+class Span:
+    """A timed unit of work with attributes, linked to its parent by trace and span ids"""
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, **attributes):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.start_time = time.time()
+        self.duration = None
+        self.status = "ok"
+        self.error = None
+        self.attributes = dict(attributes)
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def set(self, **attributes) -> None:
+        with self._lock:
+            self.attributes.update(attributes)
+
+    def add(self, key: str, value: float) -> None:
+        with self._lock:
+            self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def finish(self, error: BaseException = None) -> None:
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.status = "error"
+            self.error = f"{type(error).__name__}: {error}"
+
+        if self.parent is not None:
+            for key in ROLLUP_KEYS:
+                if key in self.attributes:
+                    self.parent.add(key, self.attributes[key])
+
+    def as_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration": round(self.duration, 6) if self.duration is not None else None,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class JsonlExporter:
+    """Appends finished spans to a JSONL file"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.as_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self.path.parent.mkdir(exist_ok=True, parents=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+
+
+_exporters = []
+if os.getenv("TRACE_JSONL_PATH"):
+    _exporters.append(JsonlExporter(os.getenv("TRACE_JSONL_PATH")))
+
+
+def add_exporter(exporter) -> None:
+    """Register an object with an export(span) method"""
+    _exporters.append(exporter)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Trace a block as a child of the current span"""
+    new_span = Span(name, parent=_current_span.get(), **attributes)
+    token = _current_span.set(new_span)
+    error = None
+    try:
+        yield new_span
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        _current_span.reset(token)
+        new_span.finish(error)
+        metrics.observe("ux_span_duration_seconds", new_span.duration, span=name)
+        if error is not None:
+            metrics.inc("ux_span_errors_total", span=name)
+        for exporter in _exporters:
+            try:
+                exporter.export(new_span)
+            except Exception as e:
+                print(f"⚠ Trace export failed: {e}")
+
+
+def traced(name: str):
+    """Decorator running the function inside span(name)"""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def record_agent_step(step) -> None:
+    """CrewAI step_callback counting agent reasoning iterations"""
+    metrics.inc("ux_agent_iterations_total")
+    active = current_span()
+    if active is not None:
+        active.add("agent_iterations", 1)
+
+
+def traced_kickoff(crew, name: str, inputs: dict = None):
+    """Kick off a crew inside a span and record the agents' own token usage"""
+    with span(f"crew.{name}") as kickoff_span:
+        result = crew.kickoff(inputs=inputs)
+        usage = getattr(result, "token_usage", None)
+        if usage is not None:
+            kickoff_span.set(
+                agent_llm_requests=usage.successful_requests,
+                agent_prompt_tokens=usage.prompt_tokens,
+                agent_response_tokens=usage.completion_tokens,
+            )
+            metrics.inc("ux_agent_llm_tokens_total", usage.prompt_tokens, crew=name, type="prompt")
+            metrics.inc("ux_agent_llm_tokens_total", usage.completion_tokens, crew=name, type="response")
+        return result
@@ -1,11 +1,37 @@
-from .vision_tool import analyze_ui_screenshot
-from .heuristic_tool import evaluate_heuristics
-from .feedback_tool import generate_feedback
-from .wireframe_tool import create_wireframe
-
-__all__ = [
-    'analyze_ui_screenshot',
-    'evaluate_heuristics', 
-    'generate_feedback',
-    'create_wireframe'
-]
\ No newline at end of file
+"""
+Gemini-backed tools of the UX feedback crew.
+
+Names are resolved on first access, so importing a run_* function loads only
+its own module, and CrewAI is imported only when a CrewAI tool is built.
+"""
+import importlib
+
+_EXPORTS = {
+    'analyze_ui_screenshot': 'vision_tool',
+    'evaluate_heuristics': 'heuristic_tool',
+    'generate_feedback': 'feedback_tool',
+    'create_wireframe': 'wireframe_tool',
+    'build_vision_tool': 'vision_tool',
+    'build_heuristic_tool': 'heuristic_tool',
+    'build_feedback_tool': 'feedback_tool',
+    'build_wireframe_tool': 'wireframe_tool',
+    'run_vision_analysis': 'vision_tool',
+    'run_heuristic_evaluation': 'heuristic_tool',
+    'run_feedback_generation': 'feedback_tool',
+    'run_wireframe_generation': 'wireframe_tool',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,14 +1,21 @@
-from crewai.tools import tool
-from google import genai
-import os
-import json
 from pathlib import Path
 from datetime import datetime
-from dotenv import load_dotenv
 
+from ..compaction import compact_context
+from ..gemini_client import GeminiClientProvider, get_client_provider
+from ..schemas import FeedbackReport
+from ..store import current_run, record_stage
+from ..routing import CONFIDENCE_NOTE, generate_routed
+from ..telemetry import traced
 
-@tool("generate_feedback")
-def generate_feedback(vision_analysis: str, heuristic_evaluation: str) -> str:
+
+@traced("tool.feedback")
+def run_feedback_generation(
+    vision_analysis: str,
+    heuristic_evaluation: str,
+    provider: GeminiClientProvider = None,
+    on_token=None
+) -> str:
     """
     Converts technical heuristic violations into developer-friendly,
     actionable feedback with priorities and improvement suggestions.
@@ -16,17 +23,19 @@ def generate_feedback(vision_analysis: str, heuristic_evaluation: str) -> str:
     Args:
         vision_analysis: JSON string of vision analysis
         heuristic_evaluation: JSON string of heuristic evaluation
+        provider: Gemini client provider, the process-wide one if omitted
+        on_token: Optional callback receiving response text chunks as they stream
         
     Returns:
         JSON string with actionable feedback items and priorities
     """
 
-    load_dotenv()
-    
-    # Configure Gemini client
-    api_key = os.getenv('GEMINI_API_KEY')
-    client = genai.Client(api_key=api_key)
-    
+    provider = provider or get_client_provider()
+
+    # Only the fields feedback needs, minified and fitted to the budget
+    context = compact_context("feedback", vision=vision_analysis, heuristics=heuristic_evaluation).texts
+    vision_analysis, heuristic_evaluation = context["vision"], context["heuristics"]
+
     prompt = f"""
 Transform these UX violations into actionable developer feedback.
 
@@ -63,58 +72,67 @@ Return ONLY JSON:
     "high": 2,
     "medium": 2,
     "low": 1
-  }}
+  }},
+  "confidence": <0 to 1>
 }}
 
+{CONFIDENCE_NOTE}
+
 Return ONLY the JSON.
 """
     
-    response = client.models.generate_content(
-        model='gemini-2.5-flash',
-        contents=prompt
+    report = generate_routed(
+        provider,
+        stage="feedback",
+        contents=prompt,
+        schema=FeedbackReport,
+        on_text=on_token
     )
-    
-    # Clean response
-    result_text = response.text.strip()
-    if result_text.startswith("```json"):
-        result_text = result_text[7:]
-    elif result_text.startswith("```"):
-        result_text = result_text[3:]
-    if result_text.endswith("```"):
-        result_text = result_text[:-3]
-    
-    result_text = result_text.strip()
-    
-    # Save to both JSON and Markdown
+    result_text = report.model_dump_json(indent=2)
+
+    # Store the JSON under the current run, then render a readable copy
+    record_stage("feedback", result_text)
     output_dir = Path("data/outputs")
     output_dir.mkdir(exist_ok=True, parents=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    
-    # Save JSON version
-    json_path = output_dir / f"feedback_{timestamp}.json"
-    try:
-        json_data = json.loads(result_text)
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(json_data, f, indent=2, ensure_ascii=False)
-        print(f"✓ Feedback JSON saved to: {json_path}")
-        
-        # Convert to Markdown
-        md_path = output_dir / f"feedback_{timestamp}.md"
-        markdown_content = convert_feedback_to_markdown(json_data)
-        with open(md_path, 'w', encoding='utf-8') as f:
-            f.write(markdown_content)
-        print(f"✓ Feedback Markdown saved to: {md_path}")
-        
-    except json.JSONDecodeError as e:
-        print(f"⚠ JSON validation error: {e}")
-        # Save raw text
-        with open(json_path, 'w', encoding='utf-8') as f:
-            f.write(result_text)
-    
+    md_path = output_dir / f"feedback_{current_run().run_id}.md"
+    markdown_content = convert_feedback_to_markdown(report.model_dump())
+    with open(md_path, 'w', encoding='utf-8') as f:
+        f.write(markdown_content)
+    print(f"✓ Feedback Markdown saved to: {md_path}")
+
     return result_text
 
 
+def build_feedback_tool(provider: GeminiClientProvider = None):
+    """Create the generate_feedback tool bound to a client provider"""
+    from crewai.tools import tool
+
+    @tool("generate_feedback")
+    def generate_feedback(vision_analysis: str, heuristic_evaluation: str) -> str:
+        """
+        Converts technical heuristic violations into developer-friendly,
+        actionable feedback with priorities and improvement suggestions.
+
+        Args:
+            vision_analysis: JSON string of vision analysis
+            heuristic_evaluation: JSON string of heuristic evaluation
+
+        Returns:
+            JSON string with actionable feedback items and priorities
+        """
+        return run_feedback_generation(vision_analysis, heuristic_evaluation, provider)
+
+    return generate_feedback
+
+
+def __getattr__(name):
+    # The default tool object needs CrewAI, so it is built on first access
+    if name == "generate_feedback":
+        globals()[name] = build_feedback_tool()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def convert_feedback_to_markdown(feedback_data: dict) -> str:
     """Convert feedback JSON to formatted Markdown"""
     
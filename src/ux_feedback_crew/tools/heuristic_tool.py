@@ -1,48 +1,64 @@
-from crewai.tools import tool
-from google import genai
+import contextvars
 import json
 import os
-from pathlib import Path
-from datetime import datetime
-from dotenv import load_dotenv
+import re
+from concurrent.futures import ThreadPoolExecutor
 
+from ..compaction import compact_context
+from ..gemini_client import GeminiClientProvider, get_client_provider
+from ..knowledge import get_heuristics_index
+from ..local_analysis import CONTRAST_ISSUE_PREFIX, contrast_violations, split_measurements
+from ..routing import CONFIDENCE_NOTE, generate_routed
+from ..schemas import HeuristicEvaluation, Measurements, MergedHeuristicEvaluation
+from ..store import record_stage
+from ..structured import StructuredOutputError
+from ..telemetry import current_span, traced
 
-@tool("evaluate_heuristics")
-def evaluate_heuristics(vision_analysis: str) -> str:
+SEVERITY_RANK = {"critical": 3, "high": 2, "medium": 1, "low": 0}
+
+
+def load_heuristics() -> list:
+    """The heuristics of the knowledge base, parsed once per process"""
+    return get_heuristics_index().heuristics
+
+
+def _parse_vision(vision_analysis: str) -> dict:
+    try:
+        parsed = json.loads(vision_analysis)
+    except (TypeError, ValueError):
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def _measured_facts(measurements: Measurements = None) -> str:
+    if measurements is None:
+        return ""
+    failing = sum(pair.text and not pair.passes_aa for pair in measurements.contrast_pairs)
+    return f"""
+## MEASURED FACTS:
+Colors, contrast and density were measured from the pixels. {failing} text color pairs fail
+WCAG AA contrast; they are reported separately, so do not list contrast violations,
+but count them in overall_score.
+"""
+
+
+def build_prompt(vision_analysis: str, heuristics_info: str, scope: str, measurements: Measurements = None) -> str:
     """
-    Evaluates UI designs against Nielsen's 10 Usability Heuristics and
-    mobile UX best practices.
-    
+    Evaluation prompt for the heuristics in heuristics_info.
+
     Args:
-        vision_analysis: JSON string of vision analysis results
-        
-    Returns:
-        JSON string with violations, severity scores, and overall UX score
+        vision_analysis: Compacted vision analysis JSON
+        heuristics_info: The heuristics, and any guidelines, to evaluate
+        scope: What the UI is evaluated against, named in the prompt
+        measurements: Pixel measurements; the prompt then leaves contrast
+            violations to contrast_violations
     """
-
-    load_dotenv()
-    
-    # Configure Gemini client
-    api_key = os.getenv('GEMINI_API_KEY')
-    client = genai.Client(api_key=api_key)
-    
-    # Load heuristics knowledge base
-    heuristics_path = Path(__file__).parent.parent / "config" / "nielsen_heuristics.json"
-    
-    if heuristics_path.exists():
-        with open(heuristics_path, 'r') as f:
-            heuristics_data = json.load(f)
-        heuristics_info = json.dumps(heuristics_data['heuristics'][:5], indent=2)
-    else:
-        heuristics_info = "Nielsen's 10 Usability Heuristics"
-    
-    # Evaluation prompt
-    prompt = f"""
-You are a UX evaluation expert. Evaluate this mobile UI against Nielsen's 10 Usability Heuristics.
+    return f"""
+You are a UX evaluation expert. Evaluate this mobile UI against {scope}.
 
 ## UI ANALYSIS:
 {vision_analysis}
-
+{_measured_facts(measurements)}
 ## HEURISTICS TO EVALUATE:
 {heuristics_info}
 
@@ -67,45 +83,262 @@ Return ONLY valid JSON:
       "observation": "What works well"
     }}
   ],
-  "overall_score": 7.5
+  "overall_score": 7.5,
+  "confidence": <0 to 1>
 }}
 
+{CONFIDENCE_NOTE}
+
 Return ONLY the JSON.
 """
-    
-    response = client.models.generate_content(
-        model='gemini-2.5-flash',
-        contents=prompt
+
+
+def generate_evaluation(provider: GeminiClientProvider, prompt: str, on_token=None) -> HeuristicEvaluation:
+    """Run an evaluation prompt on the heuristics stage's model route"""
+    return generate_routed(
+        provider,
+        stage="heuristics",
+        contents=prompt,
+        schema=HeuristicEvaluation,
+        on_text=on_token
     )
-    
-    # Clean response
-    result_text = response.text.strip()
-    if result_text.startswith("```json"):
-        result_text = result_text[7:]
-    elif result_text.startswith("```"):
-        result_text = result_text[3:]
-    if result_text.endswith("```"):
-        result_text = result_text[:-3]
-    
-    result_text = result_text.strip()
-    
-    # Save to JSON file
-    output_dir = Path("data/outputs")
-    output_dir.mkdir(exist_ok=True, parents=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_path = output_dir / f"heuristic_evaluation_{timestamp}.json"
-    
-    try:
-        # Parse to validate JSON and pretty print
-        json_data = json.loads(result_text)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(json_data, f, indent=2, ensure_ascii=False)
-        print(f"✓ Heuristic evaluation saved to: {output_path}")
-    except json.JSONDecodeError as e:
-        print(f"⚠ JSON validation error: {e}")
-        # Save raw text anyway
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(result_text)
-    
-    return result_text
\ No newline at end of file
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase text without punctuation, for matching names and issues"""
+    return re.sub(r"[^a-z0-9 ]", "", str(text).lower()).strip()
+
+
+def merge_evaluations(partials: list) -> dict:
+    """
+    Merge per-heuristic evaluations into one document.
+
+    Violations are deduplicated on heuristic and issue text, or on heuristic
+    and affected components, keeping the most severe copy. The overall score
+    is the mean of the partial scores weighted by how many heuristics each
+    partial covered.
+
+    Args:
+        partials: (evaluation dict, number of heuristics covered) pairs
+
+    Returns:
+        Dict with violations, strengths and overall_score
+    """
+    violations = []
+    seen = {}
+    strengths = []
+    seen_strengths = set()
+    weighted_score = 0.0
+    weight = 0
+
+    for evaluation, covered in partials:
+        for violation in evaluation.get("violations", []):
+            components = tuple(sorted(normalize_text(c) for c in violation.get("affected_components", [])))
+            keys = [
+                (violation.get("heuristic_id"), normalize_text(violation.get("issue", ""))),
+                (violation.get("heuristic_id"), components),
+            ]
+            existing = next((seen[k] for k in keys if k in seen and k[1]), None)
+            if existing is None:
+                violations.append(violation)
+                for k in keys:
+                    seen[k] = len(violations) - 1
+            else:
+                current = violations[existing]
+                rank = SEVERITY_RANK.get(str(violation.get("severity", "")).lower(), 0)
+                if rank > SEVERITY_RANK.get(str(current.get("severity", "")).lower(), 0):
+                    violations[existing] = violation
+
+        for strength in evaluation.get("strengths", []):
+            key = (normalize_text(strength.get("heuristic_name", "")), normalize_text(strength.get("observation", "")))
+            if key not in seen_strengths:
+                seen_strengths.add(key)
+                strengths.append(strength)
+
+        score = evaluation.get("overall_score")
+        if isinstance(score, (int, float)):
+            weighted_score += score * covered
+            weight += covered
+
+    violations.sort(key=lambda v: (
+        -SEVERITY_RANK.get(str(v.get("severity", "")).lower(), 0),
+        v.get("heuristic_id") or 0
+    ))
+
+    return {
+        "violations": violations,
+        "strengths": strengths,
+        "overall_score": round(weighted_score / weight, 1) if weight else None,
+    }
+
+
+def with_measured_violations(evaluation: dict, measurements: Measurements = None) -> dict:
+    """
+    Replace the contrast violations of an evaluation with the measured ones.
+
+    Keys merge_evaluations does not build, such as confidence and
+    skipped_heuristics, are carried over from the evaluation.
+
+    Args:
+        evaluation: Evaluation dict, e.g. from merge_evaluations
+        measurements: Measurements of the screen; without them the evaluation
+            is returned unchanged
+    """
+    if measurements is None:
+        return evaluation
+    kept = {
+        **evaluation,
+        "violations": [
+            v for v in evaluation.get("violations", [])
+            if not str(v.get("issue", "")).startswith(CONTRAST_ISSUE_PREFIX)
+        ],
+    }
+    # Weighted zero so the measured partial leaves the overall score alone
+    merged = merge_evaluations([(kept, 1), ({"violations": contrast_violations(measurements)}, 0)])
+    return {**evaluation, **merged}
+
+
+def _evaluate_fanout(
+    vision_analysis: str,
+    retrievals: list,
+    provider: GeminiClientProvider,
+    max_concurrency: int,
+    measurements: Measurements = None
+) -> str:
+    # One group per retrieval, e.g. from HeuristicsIndex.retrieve_groups
+    groups = [retrieval.heuristics for retrieval in retrievals]
+
+    def evaluate_group(retrieval):
+        names = ", ".join(f"#{h['id']} {h['name']}" for h in retrieval.heuristics)
+        prompt = build_prompt(
+            vision_analysis,
+            retrieval.text,
+            f"ONLY these Nielsen heuristics: {names}. Report violations and strengths for these heuristics only",
+            measurements
+        )
+        return generate_evaluation(provider, prompt).model_dump(), len(retrieval.heuristics)
+
+    partials = []
+    skipped = []
+    error = None
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        # Copy the context so usage meters see calls made on worker threads
+        futures = [executor.submit(contextvars.copy_context().run, evaluate_group, r) for r in retrievals]
+        for group, future in zip(groups, futures):
+            try:
+                partials.append(future.result())
+            except StructuredOutputError as e:
+                error = e
+                skipped.extend(f"#{h['id']} {h['name']}" for h in group)
+                print(f"⚠ Skipping heuristic group {', '.join(str(h['id']) for h in group)}: {e}")
+
+    if not partials:
+        raise StructuredOutputError(f"All {len(groups)} heuristic groups failed validation: {error}")
+
+    span = current_span()
+    if span is not None and skipped:
+        span.set(skipped_heuristics=len(skipped))
+    merged = with_measured_violations(merge_evaluations(partials), measurements)
+    return MergedHeuristicEvaluation.model_validate(
+        {**merged, "skipped_heuristics": skipped}
+    ).model_dump_json(indent=2)
+
+
+@traced("tool.heuristics")
+def run_heuristic_evaluation(
+    vision_analysis: str,
+    provider: GeminiClientProvider = None,
+    fanout: bool = None,
+    on_token=None
+) -> str:
+    """
+    Evaluates UI designs against Nielsen's 10 Usability Heuristics and
+    mobile UX best practices.
+
+    Args:
+        vision_analysis: JSON string of vision analysis results
+        provider: Gemini client provider, the process-wide one if omitted
+        fanout: Evaluate heuristic groups as concurrent requests and merge them;
+            defaults to the HEURISTIC_FANOUT environment variable
+        on_token: Optional callback receiving response text chunks as they
+            stream; ignored in fan-out mode
+
+    Returns:
+        JSON string with violations, severity scores, and overall UX score
+    """
+
+    provider = provider or get_client_provider()
+    # Measured contrast becomes violations directly instead of being judged by the model
+    vision_analysis, measurements = split_measurements(vision_analysis)
+    if fanout is None:
+        fanout = os.getenv("HEURISTIC_FANOUT", "false").lower() == "true"
+
+    # Only the knowledge relevant to this screen type and its components goes in the prompt
+    index = get_heuristics_index()
+    vision = _parse_vision(vision_analysis)
+    fanout = bool(fanout and index.heuristics)
+    if fanout:
+        retrievals = index.retrieve_groups(vision, group_size=int(os.getenv("HEURISTIC_GROUP_SIZE", 2)))
+    else:
+        retrievals = [index.retrieve_for(vision)]
+    vision_analysis = compact_context("heuristics", vision=vision_analysis).texts["vision"]
+
+    current_span().set(
+        fanout=fanout,
+        heuristics=sum(len(r.heuristics) for r in retrievals),
+        knowledge_tokens=sum(r.tokens for r in retrievals),
+        knowledge_entries=sum(r.entries for r in retrievals)
+    )
+    if fanout:
+        result_text = _evaluate_fanout(
+            vision_analysis,
+            retrievals,
+            provider,
+            max_concurrency=int(os.getenv("HEURISTIC_MAX_CONCURRENCY", 5)),
+            measurements=measurements
+        )
+    else:
+        if retrievals[0].heuristics:
+            heuristics_info = retrievals[0].text
+        else:
+            heuristics_info = "Nielsen's 10 Usability Heuristics"
+        prompt = build_prompt(vision_analysis, heuristics_info, "Nielsen's 10 Usability Heuristics", measurements)
+        evaluation = generate_evaluation(provider, prompt, on_token)
+        if measurements is not None:
+            evaluation = HeuristicEvaluation.model_validate(
+                with_measured_violations(evaluation.model_dump(), measurements)
+            )
+        result_text = evaluation.model_dump_json(indent=2)
+
+    record_stage("heuristics", result_text)
+
+    return result_text
+
+
+def build_heuristic_tool(provider: GeminiClientProvider = None):
+    """Create the evaluate_heuristics tool bound to a client provider"""
+    from crewai.tools import tool
+
+    @tool("evaluate_heuristics")
+    def evaluate_heuristics(vision_analysis: str) -> str:
+        """
+        Evaluates UI designs against Nielsen's 10 Usability Heuristics and
+        mobile UX best practices.
+
+        Args:
+            vision_analysis: JSON string of vision analysis results
+
+        Returns:
+            JSON string with violations, severity scores, and overall UX score
+        """
+        return run_heuristic_evaluation(vision_analysis, provider)
+
+    return evaluate_heuristics
+
+
+def __getattr__(name):
+    # The default tool object needs CrewAI, so it is built on first access
+    if name == "evaluate_heuristics":
+        globals()[name] = build_heuristic_tool()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,46 +1,37 @@
-from crewai.tools import tool
-from google import genai
+from google.genai import types
 from dotenv import load_dotenv
-from PIL import Image
-from pathlib import Path
-from datetime import datetime
-import os
-import io
-import json
+
+from ..cache import get_vision_cache
+from ..gemini_client import GeminiClientProvider, get_client_provider
+from ..local_analysis import analyze_pixels, apply_measurements, local_analysis_enabled
+from ..preprocess import PreprocessSettings, decode_image, encode_image, perceptual_hash, signature_grid
+from ..routing import CONFIDENCE_NOTE, generate_routed, stage_route
+from ..schemas import MeasuredVisionAnalysis, Measurements, ObservedUI, VisionAnalysis
+from ..store import record_stage, remember_screen
+from ..telemetry import current_span, traced
 
 # Load environment variables at the top
 load_dotenv()
 
+# Bump whenever the prompt below changes so stale cache entries are ignored
+PROMPT_VERSION = "5"
 
-@tool("analyze_ui_screenshot")
-def analyze_ui_screenshot(image_path: str) -> str:
-    """
-    Analyzes a mobile UI screenshot and extracts detailed information about
-    components, layout, colors, typography, and accessibility.
-
-    Args:
-        image_path: Path to the mobile UI screenshot to analyze
-
-    Returns:
-        JSON string with comprehensive UI analysis
-    """
-
-    # Configure Gemini client
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY not set in .env")
-    client = genai.Client(api_key=api_key)
 
-    # Load image
-    img = Image.open(image_path)
-    img_byte_arr = io.BytesIO()
-    img.save(img_byte_arr, format=img.format or "PNG")
-    img_bytes = img_byte_arr.getvalue()
+# Fields the model only has to estimate when there are no local measurements
+ESTIMATED_FIELDS = """  "color_scheme": {
+    "primary_colors": ["list of main colors"],
+    "background": "background color",
+    "text_colors": ["list of text colors"]
+  },
+  "spacing_and_density": {
+    "overall_density": "tight/comfortable/spacious",
+    "element_spacing": "describe spacing"
+  },
+"""
 
-    # Prompt for Gemini
-    prompt = """
+PROMPT_TEMPLATE = """
 Analyze this mobile UI screenshot and extract detailed information.
-
+<facts>
 Return ONLY valid JSON with this structure:
 
 {
@@ -55,63 +46,144 @@ Return ONLY valid JSON with this structure:
     }
   ],
   "layout_structure": "describe overall layout",
-  "color_scheme": {
-    "primary_colors": ["list of main colors"],
-    "background": "background color",
-    "text_colors": ["list of text colors"]
-  },
-  "typography": {
+<estimated>  "typography": {
     "heading_sizes": "describe sizes",
     "body_text_size": "describe size"
   },
-  "spacing_and_density": {
-    "overall_density": "tight/comfortable/spacious",
-    "element_spacing": "describe spacing"
-  },
   "accessibility_observations": ["list issues"],
-  "notable_patterns": ["list UI patterns"]
+  "notable_patterns": ["list UI patterns"],
+  "confidence": <0 to 1>
 }
+
+""" + CONFIDENCE_NOTE + "\n"
+
+
+def _build_prompt(measurements: Measurements = None) -> str:
+    if measurements is None:
+        return PROMPT_TEMPLATE.replace("<facts>", "").replace("<estimated>", ESTIMATED_FIELDS)
+
+    # Colors, contrast and density are filled in from the measurements afterwards
+    palette = ", ".join(color.hex for color in measurements.palette)
+    facts = f"""
+Measured palette, most used first: {palette}. Use these hex values for component
+colors. Contrast and density are measured separately; do not report them.
 """
+    return PROMPT_TEMPLATE.replace("<facts>", facts).replace("<estimated>", "")
+
+
+@traced("tool.vision")
+def run_vision_analysis(
+    image_path: str,
+    provider: GeminiClientProvider = None,
+    use_cache: bool = True,
+    on_token=None
+) -> str:
+    """
+    Analyzes a mobile UI screenshot and extracts detailed information about
+    components, layout, colors, typography, and accessibility.
+
+    Args:
+        image_path: Path to the mobile UI screenshot to analyze
+        provider: Gemini client provider, the process-wide one if omitted
+        use_cache: Look up and store the result in the vision cache
+        on_token: Optional callback receiving response text chunks as they stream
+
+    Returns:
+        JSON string with comprehensive UI analysis
+    """
+
+    # Decode the screenshot once; everything below reuses these pixels
+    settings = PreprocessSettings.from_env()
+    decoded = decode_image(image_path)
+    remember_screen(
+        decoded.fingerprint,
+        perceptual_hash(decoded.image),
+        signature_grid(decoded.image),
+        decoded.original_size
+    )
 
-    # Gemini model call
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
+    # Serve repeat screenshots from the cache before touching the API
+    measured = local_analysis_enabled()
+    cache = get_vision_cache()
+    cache_key = cache.make_key(
+        decoded.fingerprint,
+        f"{PROMPT_VERSION}{'m' if measured else ''}:{settings.tag}",
+        stage_route("vision").model
+    )
+    cached = cache.get(cache_key) if use_cache else None
+    current_span().set(cache_hit=cached is not None, image_original_bytes=decoded.original_bytes)
+    if cached is not None:
+        print(f"✓ Vision analysis served from cache: {cache_key[:12]}")
+        record_stage("vision", cached, image_hash=decoded.fingerprint)
+        return cached
+
+    provider = provider or get_client_provider()
+
+    # Downscale and re-encode to cut upload bytes
+    prepared = encode_image(decoded, settings)
+    current_span().set(image_encoded_bytes=prepared.encoded_bytes)
+    print(
+        f"✓ Image prepared: {decoded.original_size[0]}x{decoded.original_size[1]} -> "
+        f"{prepared.size[0]}x{prepared.size[1]} {settings.format}, "
+        f"{decoded.original_bytes} -> {prepared.encoded_bytes} bytes "
+        f"(saved {prepared.bytes_saved})"
+    )
+
+    # Palette, contrast and density are measured locally and given as facts
+    measurements = analyze_pixels(decoded.image) if measured else None
+    if measurements is not None:
+        failing = sum(pair.text and not pair.passes_aa for pair in measurements.contrast_pairs)
+        current_span().set(palette=len(measurements.palette), contrast_failures=failing)
+    prompt = _build_prompt(measurements)
+
+    # Gemini model call, constrained to the VisionAnalysis schema, or to the
+    # fields left to the model once the rest is measured
+    analysis = generate_routed(
+        provider,
+        stage="vision",
         contents=[
             prompt,
-            Image.open(image_path)
-        ]
+            types.Part.from_bytes(data=prepared.data, mime_type=prepared.mime_type)
+        ],
+        schema=VisionAnalysis if measurements is None else ObservedUI,
+        on_text=on_token
     )
+    if measurements is not None:
+        analysis = MeasuredVisionAnalysis.model_validate(apply_measurements(analysis.model_dump(), measurements))
+    result_text = analysis.model_dump_json(indent=2)
+
+    # Store under the current run, indexed by the screenshot fingerprint
+    record_stage("vision", result_text, image_hash=decoded.fingerprint)
+    if use_cache:
+        cache.put(cache_key, result_text)
+
+    return result_text
+
+
+def build_vision_tool(provider: GeminiClientProvider = None):
+    """Create the analyze_ui_screenshot tool bound to a client provider"""
+    from crewai.tools import tool
+
+    @tool("analyze_ui_screenshot")
+    def analyze_ui_screenshot(image_path: str) -> str:
+        """
+        Analyzes a mobile UI screenshot and extracts detailed information about
+        components, layout, colors, typography, and accessibility.
+
+        Args:
+            image_path: Path to the mobile UI screenshot to analyze
+
+        Returns:
+            JSON string with comprehensive UI analysis
+        """
+        return run_vision_analysis(image_path, provider)
+
+    return analyze_ui_screenshot
+
 
-    # Extract text output
-    result_text = response.text.strip()
-
-    # Remove markdown code blocks if present
-    if result_text.startswith("```json"):
-        result_text = result_text[7:]
-    elif result_text.startswith("```"):
-        result_text = result_text[3:]
-    if result_text.endswith("```"):
-        result_text = result_text[:-3]
-
-    result_text = result_text.strip()
-    
-    # Save to JSON file
-    output_dir = Path("data/outputs")
-    output_dir.mkdir(exist_ok=True, parents=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_path = output_dir / f"vision_analysis_{timestamp}.json"
-    
-    try:
-        # Parse to validate JSON and pretty print
-        json_data = json.loads(result_text)
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(json_data, f, indent=2, ensure_ascii=False)
-        print(f"✓ Vision analysis saved to: {output_path}")
-    except json.JSONDecodeError as e:
-        print(f"⚠ JSON validation error: {e}")
-        # Save raw text anyway
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(result_text)
-    
-    return result_text
\ No newline at end of file
+def __getattr__(name):
+    # The default tool object needs CrewAI, so it is built on first access
+    if name == "analyze_ui_screenshot":
+        globals()[name] = build_vision_tool()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,14 +1,18 @@
-from crewai.tools import tool
-from google import genai
-import os
-import webbrowser
-from pathlib import Path
-from datetime import datetime
-from dotenv import load_dotenv
 
+from ..compaction import compact_context
+from ..gemini_client import GeminiClientProvider, get_client_provider
+from ..routing import stage_route
+from ..store import current_run, get_store
+from ..structured import extract_code_block
+from ..telemetry import traced
 
-@tool("create_wireframe")
-def create_wireframe(vision_analysis: str, feedback_result: str) -> str:
+
+@traced("tool.wireframe")
+def run_wireframe_generation(
+    vision_analysis: str,
+    feedback_result: str,
+    provider: GeminiClientProvider = None
+) -> str:
     """
     Generates improved UI wireframes in HTML/CSS based on feedback.
     Creates interactive, exportable designs showing improvements.
@@ -16,17 +20,18 @@ def create_wireframe(vision_analysis: str, feedback_result: str) -> str:
     Args:
         vision_analysis: JSON string of vision analysis
         feedback_result: JSON string of feedback
+        provider: Gemini client provider, the process-wide one if omitted
         
     Returns:
-        String with path to generated wireframe file
+        Confirmation naming the evaluation the wireframe is stored under
     """
-    
-    load_dotenv()
 
-    # Configure Gemini client
-    api_key = os.getenv('GEMINI_API_KEY')
-    client = genai.Client(api_key=api_key)
-    
+    provider = provider or get_client_provider()
+
+    # Only the fields the redesign needs, minified and fitted to the budget
+    context = compact_context("wireframe", vision=vision_analysis, feedback=feedback_result).texts
+    vision_analysis, feedback_result = context["vision"], context["feedback"]
+
     prompt = f"""
 Create an improved mobile UI wireframe in HTML/CSS.
 
@@ -48,33 +53,47 @@ Return ONLY the complete HTML code between ```html and ```.
 Make it look professional and implement all suggested improvements.
 """
     
-    response = client.models.generate_content(
-        model='gemini-3-flash-preview',
+    response = provider.generate_content(
+        model=stage_route("wireframe").model,
         contents=prompt
     )
     
     # Extract HTML
-    html_code = response.text.strip()
-    if "```html" in html_code:
-        start = html_code.find("```html") + 7
-        end = html_code.find("```", start)
-        html_code = html_code[start:end].strip()
-    
-    # Save HTML
-    output_dir = Path("data/outputs")
-    output_dir.mkdir(exist_ok=True, parents=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_path = output_dir / f"wireframe_{timestamp}.html"
-    
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(html_code)
-    
-    # Automatically open the HTML file in the default browser
-    try:
-        webbrowser.open(f'file://{output_path.absolute()}')
-        print(f"✓ Wireframe opened in browser: {output_path}")
-    except Exception as e:
-        print(f"⚠ Could not auto-open browser: {e}")
+    html_code = extract_code_block(response.text, "html")
     
-    return f"Wireframe generated and saved to: {output_path}"
\ No newline at end of file
+    # Store the HTML against the evaluation being redesigned; the API serves it from there
+    run = current_run()
+    get_store().save_wireframe(run.run_id, html_code)
+    print(f"✓ Wireframe stored for evaluation {run.run_id}")
+
+    return f"Wireframe generated and stored for evaluation {run.run_id}"
+
+
+def build_wireframe_tool(provider: GeminiClientProvider = None):
+    """Create the create_wireframe tool bound to a client provider"""
+    from crewai.tools import tool
+
+    @tool("create_wireframe")
+    def create_wireframe(vision_analysis: str, feedback_result: str) -> str:
+        """
+        Generates improved UI wireframes in HTML/CSS based on feedback.
+        Creates interactive, exportable designs showing improvements.
+
+        Args:
+            vision_analysis: JSON string of vision analysis
+            feedback_result: JSON string of feedback
+
+        Returns:
+            Confirmation naming the evaluation the wireframe is stored under
+        """
+        return run_wireframe_generation(vision_analysis, feedback_result, provider)
+
+    return create_wireframe
+
+
+def __getattr__(name):
+    # The default tool object needs CrewAI, so it is built on first access
+    if name == "create_wireframe":
+        globals()[name] = build_wireframe_tool()
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+"""
+Warm, long-running evaluation worker on a local socket.
+
+Starting the CLI costs several seconds of imports (CrewAI, google-genai)
+plus parsing the agent and task configuration and building the crews.
+`serve` pays that once and keeps the crew, its LLM objects and the Gemini
+client alive; the other commands are thin clients that only import the
+standard library, send one JSON request over the socket and print the
+reply together with how long the client took to start.
+
+    python -m ux_feedback_crew.worker serve &
+    python -m ux_feedback_crew.worker evaluate data/screenshots/test_image.png --mode fast
+    python -m ux_feedback_crew.worker status
+    python -m ux_feedback_crew.worker stop
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+
+_STARTED = time.perf_counter()
+
+MODES = ("fast", "crew", "incremental")
+
+
+def socket_path() -> str:
+    """Path of the worker's Unix socket, from UX_WORKER_SOCKET"""
+    return os.getenv("UX_WORKER_SOCKET", "data/worker.sock")
+
+
+class WorkerError(RuntimeError):
+    """Raised by the client when the worker rejects or fails a request"""
+
+
+class WarmWorker:
+    """
+    Evaluation state kept alive between requests.
+
+    Fast, incremental and flow runs execute concurrently on the server's
+    request threads. Crew runs check a warm crew out of a pool of
+    WORKER_CREWS crews, since a crew's agents and tasks hold per-run state.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.warmup = {}
+        self.jobs = 0
+        self._jobs_lock = threading.Lock()
+        self.crews = None
+
+    def warm_up(self) -> dict:
+        """Import the pipelines, parse the crew configuration and build the crews"""
+        started = time.perf_counter()
+        from . import flow, incremental, pipeline  # noqa: F401
+        from .gemini_client import get_client_provider
+
+        get_client_provider()
+        self.warmup["imports"] = round(time.perf_counter() - started, 3)
+
+        started = time.perf_counter()
+        from .crew_pool import CrewPool
+
+        self.crews = CrewPool(size=int(os.getenv("WORKER_CREWS", 1)), name="worker")
+        self.crews.warm()
+        self.warmup["crews"] = round(time.perf_counter() - started, 3)
+        self.warmup["total"] = round(self.warmup["imports"] + self.warmup["crews"], 3)
+        return self.warmup
+
+    def status(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self.started, 1),
+            "warmup": self.warmup,
+            "jobs": self.jobs,
+            "crews": self.crews.stats() if self.crews else None,
+        }
+
+    def handle(self, request: dict) -> dict:
+        command = request.get("command")
+        if command == "status":
+            return self.status()
+        if command == "evaluate":
+            return self._counted(self.evaluate, request["screenshot"], request.get("mode", "fast"),
+                                 request.get("screen_key"))
+        if command == "flow":
+            return self._counted(self.evaluate_flow, request["screenshots"])
+        raise ValueError(f"Unknown command: {command!r}")
+
+    def _counted(self, fn, *args) -> dict:
+        with self._jobs_lock:
+            self.jobs += 1
+        started = time.perf_counter()
+        result = fn(*args)
+        return {**result, "duration": round(time.perf_counter() - started, 3)}
+
+    def evaluate(self, screenshot: str, mode: str = "fast", screen_key: str = None) -> dict:
+        from .store import record_evaluation, recording_run
+
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+
+        with recording_run(screenshot_path=screenshot, screen_key=screen_key) as run:
+            if mode == "fast":
+                from .pipeline import run_fast_pipeline
+
+                result = run_fast_pipeline(screenshot)
+                extra = {"timings": result.timings(), "usage": result.usage}
+            elif mode == "incremental":
+                from .incremental import run_incremental
+
+                result = run_incremental(screenshot, screen_key)
+                extra = {**result.summary(), "changes": result.changes, "usage": result.usage}
+            else:
+                from .telemetry import traced_kickoff
+
+                with self.crews.checkout() as pooled:
+                    result = traced_kickoff(pooled.evaluation_crew, "evaluation", inputs={'screenshot_path': screenshot})
+                extra = {}
+            record_evaluation(result.raw)
+
+        return {"evaluation_id": run.run_id, "image_hash": run.image_hash, "report": result.raw, **extra}
+
+    def evaluate_flow(self, screenshots: list) -> dict:
+        from .flow import run_flow
+        from .store import record_evaluation, recording_run
+
+        with recording_run(screenshot_path=screenshots[0]) as run:
+            result = run_flow(screenshots)
+            record_evaluation(result.raw)
+        return {"evaluation_id": run.run_id, "report": result.raw, "timings": result.timings, "usage": result.usage}
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    # One JSON request line in, one JSON reply line out
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+            if request.get("command") == "stop":
+                reply = {"ok": True, "result": {"stopping": True}}
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+            else:
+                reply = {"ok": True, "result": self.server.worker.handle(request)}
+        except Exception as e:
+            reply = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        self.wfile.write(json.dumps(reply, ensure_ascii=False).encode("utf-8") + b"\n")
+
+
+class _WorkerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(path: str = None) -> None:
+    """Warm up and answer requests on the Unix socket until stopped"""
+    path = path or socket_path()
+    if Path(path).exists():
+        if ping(path):
+            print(f"❌ Error: A worker is already listening on {path}")
+            return
+        # Left behind by a worker that did not shut down cleanly
+        os.unlink(path)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+    worker = WarmWorker()
+    warmup = worker.warm_up()
+    print(f"✓ Worker warm in {warmup['total']}s (imports {warmup['imports']}s, crews {warmup['crews']}s)")
+
+    server = _WorkerServer(path, _RequestHandler)
+    server.worker = worker
+    print(f"✓ Listening on {path} (pid {os.getpid()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        Path(path).unlink(missing_ok=True)
+        print("✓ Worker stopped")
+
+
+def send(request: dict, path: str = None, timeout: float = None) -> dict:
+    """
+    Send one request to the worker and return its result.
+
+    Raises:
+        OSError: If no worker is listening on the socket
+        WorkerError: If the worker failed the request
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path or socket_path())
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as reply_file:
+            reply = json.loads(reply_file.readline() or b"null")
+    if not reply or not reply.get("ok"):
+        raise WorkerError(reply.get("error") if reply else "Worker closed the connection")
+    return reply["result"]
+
+
+def ping(path: str = None) -> bool:
+    """Whether a worker answers on the socket"""
+    if not hasattr(socket, "AF_UNIX") or not Path(path or socket_path()).exists():
+        return False
+    try:
+        send({"command": "status"}, path, timeout=2)
+        return True
+    except (OSError, WorkerError, ValueError):
+        return False
+
+
+def startup_seconds() -> float:
+    """Time from loading this module to now, the client's own startup cost"""
+    return round(time.perf_counter() - _STARTED, 3)
+
+
+def _print_result(result: dict, startup: float) -> None:
+    report = result.pop("report", None)
+    print("\n" + "=" * 70)
+    print(f"✅ ANALYSIS COMPLETE in {result.pop('duration')}s (client startup {startup}s)")
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    print("=" * 70)
+    if report is not None:
+        print(f"\n{report}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm evaluation worker and its client")
+    parser.add_argument("--socket", default=None, help="Unix socket path (default: UX_WORKER_SOCKET)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("serve", help="Start the worker in the foreground")
+    evaluate = commands.add_parser("evaluate", help="Evaluate one screenshot on the worker")
+    evaluate.add_argument("screenshot")
+    evaluate.add_argument("--mode", choices=MODES, default=os.getenv("PIPELINE_MODE", "fast"))
+    evaluate.add_argument("--screen-key", help="Stable identifier of the screen for incremental mode")
+    flow = commands.add_parser("flow", help="Evaluate screenshots as one user flow on the worker")
+    flow.add_argument("screenshots", nargs="+")
+    commands.add_parser("status", help="Show the worker's warm-up time and job count")
+    commands.add_parser("stop", help="Stop the worker")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.socket)
+        return
+
+    if args.command == "evaluate":
+        request = {
+            "command": "evaluate",
+            "screenshot": os.path.abspath(args.screenshot),
+            "mode": args.mode,
+            "screen_key": args.screen_key,
+        }
+    elif args.command == "flow":
+        request = {"command": "flow", "screenshots": [os.path.abspath(p) for p in args.screenshots]}
+    else:
+        request = {"command": args.command}
+
+    startup = startup_seconds()
+    try:
+        result = send(request, args.socket)
+    except OSError:
+        print(f"❌ Error: No worker on {args.socket or socket_path()}; start one with "
+              f"`python -m ux_feedback_crew.worker serve`")
+        sys.exit(1)
+    except WorkerError as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+    if args.command in ("evaluate", "flow"):
+        _print_result(result, startup)
+    else:
+        print(json.dumps({**result, "client_startup": startup}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "src")]
+
+# Modules read these on import, so they are set before any test imports them
+_data = tempfile.mkdtemp(prefix="ux-tests-")
+os.environ.setdefault("RESULT_STORE_PATH", os.path.join(_data, "results.db"))
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_data, "uploads"))
+os.environ.setdefault("VISION_CACHE_ENABLED", "false")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("CREW_POOL_PREWARM", "false")
+os.environ.setdefault("CREWAI_DISABLE_TELEMETRY", "true")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """A fresh result store, installed as the process-wide one"""
+    from ux_feedback_crew import store as store_module
+
+    fresh = store_module.ResultStore(str(tmp_path / "results.db"))
+    monkeypatch.setattr(store_module, "_store", fresh)
+    return fresh
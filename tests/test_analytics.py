@@ -0,0 +1,89 @@
+import json
+import time
+
+import pytest
+
+from ux_feedback_crew import analytics as analytics_module
+from ux_feedback_crew.analytics import AnalyticsStore, BackgroundIndexer
+
+
+def _save_run(store, run_id, screen_type, score, violations, priorities=()):
+    store.save_stage_output(run_id, "vision", json.dumps({"screen_type": screen_type}))
+    store.save_stage_output(run_id, "heuristics", json.dumps({"overall_score": score, "violations": violations}))
+    store.save_stage_output(run_id, "feedback", json.dumps({"feedback_items": [{"priority": p} for p in priorities]}))
+
+
+def _violation(heuristic_id, severity, *components):
+    return {
+        "heuristic_id": heuristic_id, "heuristic_name": f"Heuristic {heuristic_id}",
+        "severity": severity, "affected_components": list(components),
+    }
+
+
+@pytest.fixture
+def analytics(tmp_path, monkeypatch):
+    fresh = AnalyticsStore(str(tmp_path / "analytics.db"))
+    monkeypatch.setattr(analytics_module, "_analytics", fresh)
+    return fresh
+
+
+def test_report_aggregates_indexed_runs(store, analytics):
+    _save_run(store, "run-1", "Login", 6.0, [
+        _violation(1, "high", "Sign-in button", "Password field"),
+        _violation(4, "low", "Footer"),
+    ], priorities=["high", "low"])
+    _save_run(store, "run-2", "login", 8.0, [_violation(1, "critical", "sign-in button")], priorities=["critical"])
+    _save_run(store, "run-3", "home", 9.0, [])
+
+    assert analytics.index_store(store) == 9
+    report = analytics.report(screen_type="login")
+
+    assert report["summary"]["runs"] == 2
+    assert report["summary"]["mean_score"] == 7.0
+    assert report["summary"]["high_priority_items"] == 2
+    assert [(h["heuristic_id"], h["violations"], h["runs"]) for h in report["heuristics"]] == [(1, 2, 2), (4, 1, 1)]
+    assert [(c["component"], c["occurrences"]) for c in report["components"]] == [
+        ("sign-in button", 2), ("password field", 1)
+    ]
+    assert sum(period["runs"] for period in report["score_trend"]) == 2
+
+
+def test_indexing_resumes_after_the_last_output(store, analytics):
+    _save_run(store, "run-1", "login", 6.0, [_violation(1, "high")])
+    analytics.index_store(store)
+    store.save_stage_output("run-1", "heuristics", json.dumps({"overall_score": 7.5, "violations": []}))
+
+    assert analytics.index_store(store) == 1
+    assert analytics.summary()["mean_score"] == 7.5
+    assert analytics.top_heuristics() == []
+
+
+def test_idle_pass_opens_no_write_transaction(store, analytics, tmp_path, monkeypatch):
+    _save_run(store, "run-1", "login", 6.0, [])
+    outputs = tmp_path / "outputs"
+    outputs.mkdir()
+    (outputs / "vision_analysis_20260101_120000.json").write_text(json.dumps({"screen_type": "home"}))
+    analytics.index_store(store)
+    assert analytics.index_files(str(outputs)) == 1
+
+    def no_writes():
+        raise AssertionError("write transaction opened with nothing to index")
+
+    monkeypatch.setattr(analytics, "_transaction", no_writes)
+    assert analytics.index_store(store) == 0
+    assert analytics.index_files(str(outputs)) == 0
+
+
+def test_background_indexer_picks_up_notified_evaluations(store, analytics, tmp_path):
+    indexer = BackgroundIndexer(interval=60)
+    indexer.start(str(tmp_path / "outputs"))
+    try:
+        _save_run(store, "run-1", "login", 6.0, [])
+        indexer.notify()
+        deadline = time.monotonic() + 5
+        while analytics.summary()["runs"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        indexer.stop()
+
+    assert analytics.summary()["runs"] == 1
@@ -0,0 +1,68 @@
+import threading
+
+from app.jobs import JobQueue
+from ux_feedback_crew.coalesce import JOINED, REUSED, coalesce_key, pipeline_config, run_once
+from ux_feedback_crew.store import record_evaluation, recording_run
+
+REPORT = '{"feedback_items": []}'
+
+
+def _evaluate(started: threading.Event, release: threading.Event):
+    # Stands in for batch.evaluate_screenshot_fast
+    def evaluate():
+        with recording_run(screenshot_path="shot.png") as run:
+            run.image_hash = "abc"
+            started.set()
+            release.wait(5)
+            record_evaluation(REPORT)
+        return REPORT
+    return evaluate
+
+
+def test_api_joins_batch_job_and_gets_its_evaluation(store):
+    key = coalesce_key("abc", pipeline_config("fast"))
+    queue = JobQueue(max_workers=1, max_pending=10, store=store)
+    started, release = threading.Event(), threading.Event()
+    outcome = {}
+
+    batch = threading.Thread(target=lambda: outcome.update(batch=run_once(key, "batch", _evaluate(started, release))))
+    batch.start()
+    assert started.wait(5)
+
+    job_id, joined = queue.submit_once("evaluation", key, lambda update: None)
+    assert joined == JOINED
+    release.set()
+    batch.join(5)
+    assert outcome["batch"] == (REPORT, None)
+
+    # The shared job id is the evaluation id, with the API's result shape
+    job = store.get_job(job_id)
+    assert job["status"] == "completed"
+    assert job["result"] == {"evaluation_id": job_id, "image_hash": "abc", "evaluation": REPORT}
+    evaluation = store.get_evaluation(job_id)
+    assert evaluation["report"] == REPORT
+    assert evaluation["screenshot_path"] == "shot.png"
+
+    assert queue.submit_once("evaluation", key, lambda update: None) == (job_id, REUSED)
+    queue.shutdown()
+
+
+def test_batch_reuses_api_job(store):
+    key = coalesce_key("def", pipeline_config("fast"))
+    store.claim_job("api-job", "evaluation", key, 300)
+    store.update_job("api-job", status="completed", result={"evaluation_id": "api-job", "evaluation": REPORT})
+
+    assert run_once(key, "batch", lambda: "not called") == (REPORT, REUSED)
+
+
+def test_failed_job_is_not_shared(store):
+    key = coalesce_key("ghi", pipeline_config("fast"))
+
+    def fail():
+        raise ValueError("boom")
+
+    try:
+        run_once(key, "batch", fail)
+    except ValueError:
+        pass
+    assert run_once(key, "batch", lambda: REPORT) == (REPORT, None)
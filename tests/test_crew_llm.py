@@ -0,0 +1,20 @@
+import litellm
+from crewai import LLM
+
+from ux_feedback_crew import scheduler
+from ux_feedback_crew.crew import gemini_llm
+
+
+def test_agent_llm_calls_are_retried_by_the_scheduler(monkeypatch):
+    monkeypatch.setattr(scheduler, "_default_scheduler", scheduler.QuotaScheduler(backoff_base=0.001))
+    replies = [litellm.RateLimitError("quota", llm_provider="gemini", model="gemini-2.5-flash"), "done"]
+
+    def call(self, messages, *args, **kwargs):
+        reply = replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    monkeypatch.setattr(LLM, "call", call)
+    assert gemini_llm("gemini-2.5-flash").call("Plan the next step") == "done"
+    assert replies == []
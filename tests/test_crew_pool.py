@@ -0,0 +1,34 @@
+from pathlib import Path
+
+import pytest
+
+from benchmarks.fake_gemini import FakeGemini, FakeGeminiConfig
+
+SCREENSHOT = Path(__file__).resolve().parent.parent / "data" / "screenshots" / "test_image.png"
+
+
+@pytest.fixture
+def pool(monkeypatch, tmp_path, store):
+    """A one-crew pool whose agents and tools talk to a local fake Gemini"""
+    from ux_feedback_crew.crew_pool import CrewPool, PooledCrew
+    from ux_feedback_crew.gemini_client import GeminiClientProvider
+
+    screenshot = str(SCREENSHOT)
+    with FakeGemini(FakeGeminiConfig(latency=0, jitter=0)) as fake:
+        monkeypatch.setenv("GEMINI_BASE_URL", fake.base_url)
+        monkeypatch.setenv("CREWAI_TESTING", "true")
+        monkeypatch.chdir(tmp_path)
+        provider = GeminiClientProvider.from_env()
+        yield CrewPool(1, factory=lambda: PooledCrew(provider)), screenshot
+
+
+def test_pooled_crew_records_stages_on_every_kickoff(pool, store):
+    from ux_feedback_crew.store import recording_run
+
+    crew_pool, screenshot = pool
+    for _ in range(2):
+        with crew_pool.checkout() as pooled, recording_run() as run:
+            pooled.evaluation_crew.kickoff(inputs={"screenshot_path": screenshot})
+
+        assert {"vision", "heuristics", "feedback"} <= set(store.stage_outputs(run.run_id))
+        assert run.image_hash is not None
@@ -0,0 +1,43 @@
+import pytest
+from PIL import Image
+
+from ux_feedback_crew import flow
+from ux_feedback_crew.schemas import FlowAnalysis
+from ux_feedback_crew.structured import StructuredOutputError
+
+
+@pytest.fixture
+def screenshots(tmp_path):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"screen{i}.png"
+        Image.new("RGB", (40, 80), (i * 80, 100, 200)).save(path)
+        paths.append(str(path))
+    return paths
+
+
+def _replies(monkeypatch, *replies):
+    requests = []
+
+    def generate_routed(provider, stage, contents, schema):
+        requests.append([c for c in contents if isinstance(c, str) and c.startswith("Screen ")])
+        screens = [{"screen_index": index, "screen_type": f"screen {index}", "components": []} for index in replies[len(requests) - 1]]
+        return FlowAnalysis.model_validate({"screens": screens})
+
+    monkeypatch.setattr(flow, "generate_routed", generate_routed)
+    return requests
+
+
+def test_screens_are_matched_by_index_and_missing_ones_requested_again(monkeypatch, screenshots):
+    requests = _replies(monkeypatch, [3, 1], [2])
+    analysis = flow.analyze_flow(screenshots, provider=None, batch_size=3)
+
+    assert [(s.screen_index, s.screen_type) for s in analysis.screens] == [(1, "screen 1"), (2, "screen 2"), (3, "screen 3")]
+    assert requests[1] == ["Screen 2 of 3:"]
+
+
+def test_screen_still_missing_after_retry_fails(monkeypatch, screenshots):
+    monkeypatch.setenv("STRUCTURED_MAX_RETRIES", "1")
+    _replies(monkeypatch, [1, 2], [1])
+    with pytest.raises(StructuredOutputError):
+        flow.analyze_flow(screenshots, provider=None, batch_size=3)
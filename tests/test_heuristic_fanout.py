@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from ux_feedback_crew.knowledge import HeuristicsIndex, Retrieval
+from ux_feedback_crew.schemas import HeuristicEvaluation
+from ux_feedback_crew.structured import StructuredOutputError
+from ux_feedback_crew.tools import heuristic_tool
+
+HEURISTICS = [{"id": i, "name": f"Heuristic {i}"} for i in range(1, 5)]
+GROUPS = [Retrieval(heuristics=HEURISTICS[:2]), Retrieval(heuristics=HEURISTICS[2:])]
+
+
+def _generate_failing(failing_ids):
+    def generate(provider, prompt, on_token=None):
+        if any(f"#{i} " in prompt for i in failing_ids):
+            raise StructuredOutputError("invalid")
+        return HeuristicEvaluation(overall_score=8.0)
+    return generate
+
+
+def test_fanout_lists_skipped_heuristics(monkeypatch):
+    monkeypatch.setattr(heuristic_tool, "generate_evaluation", _generate_failing({3}))
+    result = json.loads(heuristic_tool._evaluate_fanout("{}", GROUPS, None, max_concurrency=2))
+
+    assert result["skipped_heuristics"] == ["#3 Heuristic 3", "#4 Heuristic 4"]
+    assert result["overall_score"] == 8.0
+
+
+def test_fanout_fails_when_every_group_fails(monkeypatch):
+    monkeypatch.setattr(heuristic_tool, "generate_evaluation", _generate_failing({1, 3}))
+    with pytest.raises(StructuredOutputError):
+        heuristic_tool._evaluate_fanout("{}", GROUPS, None, max_concurrency=2)
+
+
+def test_groups_get_their_guidelines_within_a_share_of_the_budget():
+    index = HeuristicsIndex({
+        "heuristics": [
+            {"id": 1, "name": "Error prevention", "evaluation_criteria": ["Are input fields validated inline?"]},
+            {"id": 2, "name": "Consistency", "evaluation_criteria": ["Do similar buttons look similar?"]},
+        ],
+        "mobile_specific_guidelines": [
+            {"category": "Touch Targets", "guidelines": ["Button touch targets are at least 44x44 points"]},
+        ],
+    })
+    vision = {"screen_type": "login", "components": [{"type": "button"}, {"type": "text_input"}]}
+    groups = index.retrieve_groups(vision, group_size=1, budget=200)
+
+    assert [[h["id"] for h in g.heuristics] for g in groups] == [[1], [2]]
+    assert all("Touch Targets" in g.guidelines for g in groups)
+    assert all(g.tokens <= 100 for g in groups)
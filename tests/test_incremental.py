@@ -0,0 +1,60 @@
+from ux_feedback_crew.incremental import _merge_vision, band_of, changed_regions
+from ux_feedback_crew.schemas import RegionAnalysis
+
+PREVIOUS = {
+    "screen_type": "home",
+    "components": [
+        {"type": "label", "text": "Welcome", "position": "top", "color": "black", "size": "large"},
+        {"type": "button", "text": "Buy", "position": "middle left", "color": "orange", "size": "medium"},
+        {"type": "image", "text": "", "position": "middle right", "color": "blue", "size": "large"},
+        {"type": "card", "text": "Offer", "position": "center", "color": "white", "size": "large"},
+        {"type": "banner", "text": "Sale", "position": "full width", "color": "red", "size": "large"},
+    ],
+}
+
+
+def test_changed_regions_cover_whole_bands():
+    columns, rows = 4, 6
+    previous = bytes(columns * rows)
+    current = bytearray(previous)
+    current[2 * columns + 1] = 255  # one cell in the middle band
+    fraction, regions = changed_regions(previous, bytes(current), (400, 600), grid=(columns, rows))
+
+    assert fraction == 1 / 24
+    assert [(r.band, r.box) for r in regions] == [("middle", (0, 200, 400, 400))]
+
+
+def test_band_of_reads_position_words():
+    assert band_of({"position": "Middle-left"}) == "middle"
+    assert band_of({"position": "center"}) == "middle"
+    assert band_of({"position": "footer"}) == "bottom"
+    assert band_of({"position": "full width"}) is None
+
+
+def test_merge_keeps_band_and_reports_only_changed_components():
+    regions = RegionAnalysis.model_validate({"components": [
+        {"type": "button", "text": "Buy", "position": "middle", "color": "green", "size": "medium"},
+        {"type": "image", "text": "", "position": "middle", "color": "blue", "size": "large"},
+        {"type": "card", "text": "Offer", "position": "middle", "color": "white", "size": "large"},
+    ]})
+    merged, changed = _merge_vision(PREVIOUS, regions, {"middle"})
+
+    # The unchanged image was re-detected with the rest of the band
+    assert [(c["type"], c["position"]) for c in merged["components"]] == [
+        ("label", "top"),
+        ("banner", "full width"),
+        ("button", "middle"),
+        ("image", "middle"),
+        ("card", "middle"),
+    ]
+    assert [(c["type"], c["color"]) for c in changed] == [("button", "orange"), ("button", "green")]
+
+
+def test_merge_does_not_duplicate_band_less_components():
+    regions = RegionAnalysis.model_validate({"components": [
+        {"type": "banner", "text": "Sale", "position": "top", "color": "red", "size": "large"},
+    ]})
+    merged, changed = _merge_vision(PREVIOUS, regions, {"top"})
+
+    assert [c["type"] for c in merged["components"]].count("banner") == 1
+    assert [c["type"] for c in changed] == ["label"]
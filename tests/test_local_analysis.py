@@ -0,0 +1,53 @@
+import numpy as np
+from PIL import Image
+
+from ux_feedback_crew.local_analysis import (
+    CONTRAST_HEURISTIC,
+    analyze_pixels,
+    contrast_observations,
+    contrast_violations,
+)
+from ux_feedback_crew.tools.heuristic_tool import with_measured_violations
+
+DIVIDER = (201, 203, 212)
+GREY_TEXT = (150, 150, 150)
+
+
+def _screen() -> Image.Image:
+    # White screen with light grey full-width dividers and rows of grey glyph-like strokes
+    pixels = np.full((640, 320, 3), 255, dtype=np.uint8)
+    for top in (100, 300, 500):
+        pixels[top:top + 5] = DIVIDER
+    for top in range(140, 280, 24):
+        for left in range(20, 300, 10):
+            pixels[top:top + 12, left:left + 2] = GREY_TEXT
+            pixels[top + 5:top + 7, left:left + 6] = GREY_TEXT
+    return Image.fromarray(pixels)
+
+
+def test_dividers_are_shapes_and_not_violations():
+    measurements = analyze_pixels(_screen())
+    pairs = {pair.foreground: pair for pair in measurements.contrast_pairs}
+
+    assert pairs["#c9cbd4"].text is False
+    assert pairs["#969696"].text is True
+    assert [v["affected_components"] for v in contrast_violations(measurements)] == [["#969696 elements on #ffffff"]]
+    assert any("#c9cbd4" in o and "3.0:1" in o for o in contrast_observations(measurements))
+
+
+def test_measured_violations_keep_the_evaluation_fields():
+    evaluation = {
+        "violations": [{"heuristic_id": 4, "heuristic_name": "Consistency and standards", "severity": "low",
+                        "issue": "Measured contrast is too low", "affected_components": []}],
+        "strengths": [],
+        "overall_score": 7.0,
+        "confidence": 0.4,
+        "skipped_heuristics": ["#9 Heuristic 9"],
+    }
+    result = with_measured_violations(evaluation, analyze_pixels(_screen()))
+
+    assert (result["confidence"], result["skipped_heuristics"]) == (0.4, ["#9 Heuristic 9"])
+    assert result["overall_score"] == 7.0
+    assert [(v["heuristic_id"], v["heuristic_name"]) for v in result["violations"]] == [
+        CONTRAST_HEURISTIC
+    ]
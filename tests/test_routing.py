@@ -0,0 +1,42 @@
+from types import SimpleNamespace
+
+from ux_feedback_crew import routing
+from ux_feedback_crew.routing import StageRoute, escalation_listener, generate_routed
+from ux_feedback_crew.schemas import HeuristicEvaluation
+
+FAST = '{"overall_score": 6, "confidence": 0.2}'
+STRONG = '{"overall_score": 5, "confidence": 0.9}'
+
+
+class Provider:
+    def generate_content(self, model, contents, on_text=None, config=None):
+        text = FAST if model == "fast" else STRONG
+        if on_text is not None:
+            on_text(text)
+        return SimpleNamespace(text=text)
+
+
+def _cascade(monkeypatch):
+    route = StageRoute("heuristics", "fast", "fast", escalate_to="strong", min_confidence=0.5)
+    monkeypatch.setattr(routing, "stage_route", lambda stage: route)
+    monkeypatch.setenv("MODEL_CASCADE", "true")
+
+
+def test_escalation_is_announced_before_the_escalated_stream(monkeypatch):
+    _cascade(monkeypatch)
+    events = []
+    with escalation_listener(lambda payload: events.append(("escalated", payload["reason"]))):
+        result = generate_routed(
+            Provider(), "heuristics", "prompt", HeuristicEvaluation, on_text=lambda t: events.append(("token", t))
+        )
+
+    assert result.overall_score == 5
+    assert events == [("token", FAST), ("escalated", "low_confidence"), ("token", STRONG)]
+
+
+def test_escalated_output_is_not_streamed_without_a_listener(monkeypatch):
+    _cascade(monkeypatch)
+    tokens = []
+    generate_routed(Provider(), "heuristics", "prompt", HeuristicEvaluation, on_text=tokens.append)
+
+    assert tokens == [FAST]
@@ -0,0 +1,96 @@
+import pytest
+from google.genai import errors
+
+from ux_feedback_crew import scheduler
+from ux_feedback_crew.scheduler import QuotaScheduler, TokenBucket
+
+MODEL = "gemini-test"
+
+
+class FakeClock:
+    """Stands in for the time module; sleeping advances the clock"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    perf_counter = monotonic
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(scheduler, "time", fake)
+    return fake
+
+
+def test_bucket_refills_at_its_per_minute_rate(clock):
+    bucket = TokenBucket(60)
+    bucket.take(60)
+
+    assert bucket.wait_time(1, 0, clock.now) == 1.0
+    clock.now = 0.5
+    assert bucket.wait_time(1, 0, clock.now) == 0.5
+    clock.now = 600
+    assert bucket.wait_time(1, 0, clock.now) == 0.0
+    assert bucket.level == 60
+
+
+def test_batch_lane_leaves_headroom_for_interactive(clock):
+    quota = QuotaScheduler(rpm=10, batch_share=0.8)
+
+    assert [quota._try_reserve(MODEL, 0, "batch") for _ in range(8)] == [0.0] * 8
+    assert quota._try_reserve(MODEL, 0, "batch") > 0
+    assert [quota._try_reserve(MODEL, 0, "interactive") for _ in range(2)] == [0.0, 0.0]
+    assert quota._try_reserve(MODEL, 0, "interactive") > 0
+
+
+def test_batch_lane_yields_to_waiting_interactive_requests(clock):
+    quota = QuotaScheduler(rpm=10)
+    quota._waiting(MODEL, "interactive", 1)
+
+    assert quota._try_reserve(MODEL, 0, "batch") > 0
+    quota._waiting(MODEL, "interactive", -1)
+    assert quota._try_reserve(MODEL, 0, "batch") == 0.0
+
+
+def test_acquire_waits_for_the_refill(clock):
+    quota = QuotaScheduler(rpm=60)
+    for _ in range(60):
+        quota.acquire(MODEL, 0, "interactive")
+
+    assert quota.acquire(MODEL, 0, "interactive") == pytest.approx(1.0)
+    assert clock.now == pytest.approx(1.0)
+
+
+def test_retry_waits_for_the_suggested_delay(clock):
+    quota = QuotaScheduler(backoff_base=1.0)
+    throttled = errors.APIError(429, {"error": {
+        "code": 429, "message": "Quota exceeded", "status": "RESOURCE_EXHAUSTED",
+        "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "17s"}],
+    }})
+    responses = [throttled, "ok"]
+
+    def call():
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    assert quota.call(MODEL, 0, call) == "ok"
+    assert len(clock.sleeps) == 1
+    assert 17 <= clock.sleeps[0] < 18
+
+
+def test_backoff_without_a_hint_grows_to_the_cap():
+    quota = QuotaScheduler(backoff_base=1.0, backoff_max=4.0)
+
+    for attempt, ceiling in ((1, 1.0), (2, 2.0), (3, 4.0), (6, 4.0)):
+        assert all(0 <= quota.backoff(attempt) <= ceiling for _ in range(50))
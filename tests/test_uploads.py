@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import io
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.api import evaluation_results
+from app.jobs import JobQueue, QueueFullError
+from app.uploads import UPLOAD_DIR, UploadLimitMiddleware
+
+
+class FullQueue:
+    def submit(self, *args, **kwargs):
+        raise QueueFullError("Job queue is full")
+
+    submit_once = submit
+
+
+def _png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), (255, 0, 0)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_rejected_submission_keeps_the_shared_upload(monkeypatch):
+    monkeypatch.setattr(evaluation_results, "job_queue", FullQueue())
+    app = FastAPI()
+    app.include_router(evaluation_results.router)
+    client = TestClient(app)
+
+    data = _png()
+    response = client.post("/evaluate-ui/", files={"file": ("shot.png", data, "image/png")})
+
+    assert response.status_code == 503
+    assert (UPLOAD_DIR / f"{hashlib.sha256(data).hexdigest()}.png").exists()
+
+
+def _post_in_chunks(middleware, chunks: int, chunk: bytes, headers=()):
+    """Send a multipart POST through the middleware; returns (status, chunks read)"""
+    scope = {
+        "type": "http", "method": "POST", "path": "/evaluate-ui/", "query_string": b"",
+        "headers": [(b"content-type", b"multipart/form-data; boundary=x"), *headers],
+    }
+    part = b'--x\r\nContent-Disposition: form-data; name="file"; filename="shot.png"\r\n\r\n'
+    read = 0
+    sent = []
+
+    async def receive():
+        nonlocal read
+        read += 1
+        body = part + chunk if read == 1 else chunk
+        return {"type": "http.request", "body": body, "more_body": read < chunks}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(middleware(scope, receive, send))
+    return sent[0]["status"], read
+
+
+def _router_app():
+    app = FastAPI()
+    app.include_router(evaluation_results.router)
+    return app
+
+
+def test_oversized_upload_is_cut_off_before_the_body_is_read():
+    middleware = UploadLimitMiddleware(_router_app(), max_bytes=1024)
+    status, read = _post_in_chunks(middleware, chunks=1000, chunk=b"x" * 1024)
+
+    assert status == 413
+    assert read < 100
+
+
+def test_oversized_content_length_is_refused_without_reading():
+    middleware = UploadLimitMiddleware(_router_app(), max_bytes=1024)
+    status, read = _post_in_chunks(
+        middleware, chunks=1000, chunk=b"x" * 1024, headers=[(b"content-length", b"1024000")]
+    )
+
+    assert status == 413
+    assert read == 0
+
+
+class SilentlyFailedQueue:
+    """A queue whose job failed before it could emit an error event"""
+
+    def submit(self, *args, **kwargs):
+        return "job-1"
+
+    def get(self, job_id):
+        return {"status": "failed", "error": "Screenshot could not be decoded"}
+
+
+def test_stream_ends_with_the_job_error_when_no_event_arrives(monkeypatch):
+    monkeypatch.setattr(evaluation_results, "job_queue", SilentlyFailedQueue())
+    monkeypatch.setenv("STREAM_POLL_SECONDS", "0.01")
+    client = TestClient(_router_app())
+
+    response = client.post("/evaluate-ui/stream", files={"file": ("shot.png", _png(), "image/png")})
+
+    assert response.text.endswith(
+        'event: error\ndata: {"detail": "Screenshot could not be decoded"}\n\n'
+    )
+
+
+def test_upload_is_evaluated_once_under_its_job_id(store, tmp_path, monkeypatch):
+    queue = JobQueue(max_workers=1, max_pending=10, store=store)
+    monkeypatch.setattr(evaluation_results, "job_queue", queue)
+    monkeypatch.setattr(
+        evaluation_results, "run_evaluation",
+        lambda update, path, mode, screen_key: {"path": str(path), "mode": mode}
+    )
+    screenshot = tmp_path / "shot.png"
+    screenshot.write_bytes(_png())
+    job_id = queue.create("upload", status="uploaded", path=str(screenshot), content_hash="abc")
+    client = TestClient(_router_app())
+
+    response = client.post(f"/uploads/{job_id}/evaluate?mode=fast")
+    assert response.status_code == 202
+    assert response.json()["evaluation_id"] == job_id
+
+    deadline = time.monotonic() + 5
+    while queue.get(job_id)["status"] != "completed" and time.monotonic() < deadline:
+        time.sleep(0.01)
+    job = queue.get(job_id)
+    assert (job["kind"], job["result"]) == ("evaluation", {"path": str(screenshot), "mode": "fast"})
+
+    assert client.post(f"/uploads/{job_id}/evaluate").status_code == 409
+    assert client.post("/uploads/unknown/evaluate").status_code == 404
+    queue.shutdown()
@@ -0,0 +1,62 @@
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from app.api import wireframe_generation
+
+EVALUATION = {"evaluation_id": "eval-1", "report": "{}"}
+
+
+@pytest.fixture
+def kickoff(monkeypatch):
+    @contextmanager
+    def checkout():
+        yield SimpleNamespace(wireframe_crew=None)
+
+    calls = []
+    monkeypatch.setattr(wireframe_generation, "crew_pool", SimpleNamespace(checkout=checkout))
+    monkeypatch.setattr(wireframe_generation, "traced_kickoff", lambda crew, name, inputs: calls.pop(0)())
+    return calls
+
+
+def test_regenerate_fails_when_no_new_wireframe_is_saved(store, kickoff):
+    store.save_wireframe("eval-1", "<html>old</html>")
+    kickoff.append(lambda: None)
+
+    with pytest.raises(RuntimeError):
+        wireframe_generation.run_wireframe(lambda *args: None, EVALUATION)
+
+
+def test_regenerate_returns_the_new_wireframe(store, kickoff):
+    store.save_wireframe("eval-1", "<html>old</html>")
+    kickoff.append(lambda: store.save_wireframe("eval-1", "<html>new</html>"))
+
+    result = wireframe_generation.run_wireframe(lambda *args: None, EVALUATION)
+    assert result["etag"] == wireframe_generation._etag("<html>new</html>")
+
+
+def test_stored_feedback_and_vision_reach_the_wireframe_task(store, monkeypatch):
+    from ux_feedback_crew.crew import UxFeedbackCrew
+
+    crew = UxFeedbackCrew().wireframe_crew()
+
+    @contextmanager
+    def checkout():
+        yield SimpleNamespace(wireframe_crew=crew)
+
+    def kickoff(crew, name, inputs):
+        # What CrewAI does with the inputs before the agent sees the task
+        crew._interpolate_inputs(inputs)
+        store.save_wireframe("eval-1", "<html>new</html>")
+
+    monkeypatch.setattr(wireframe_generation, "crew_pool", SimpleNamespace(checkout=checkout))
+    monkeypatch.setattr(wireframe_generation, "traced_kickoff", kickoff)
+    store.save_stage_output("eval-1", "vision", '{"screen_type": "login"}')
+
+    evaluation = {"evaluation_id": "eval-1", "report": '{"summary": "Enlarge the sign-in button"}'}
+    wireframe_generation.run_wireframe(lambda *args: None, evaluation)
+
+    description = crew.tasks[0].description
+    assert "Enlarge the sign-in button" in description
+    assert '"screen_type": "login"' in description